@@ -1,3 +1,34 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from data.models import AllData, Currency, Status
+from utils.testing import QueryBudgetMixin
+from .models import User, EmailActivation
+
+
+class RegisterTest(TestCase):
+    def test_register_creates_user_and_draft(self):
+        currency = Currency.objects.create(code='USD', name='US Dollar')
+        response = APIClient().post('/accounts/register', {
+            'email': 'new@example.com', 'password': 'secret', 'tin': '123456789',
+        })
+        self.assertEqual(response.status_code, 200, response.content)
+
+        user = User.objects.get(email='new@example.com')
+        self.assertFalse(user.is_active)
+        self.assertFalse(user.is_physic)
+        self.assertTrue(user.check_password('secret'))
+        self.assertTrue(EmailActivation.objects.filter(user=user).exists())
+        draft = AllData.objects.select_related('financial_data').get(user=user)
+        self.assertEqual(draft.status, Status.DRAFT)
+        self.assertEqual(draft.financial_data.currency, currency)
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    def test_profile_urls(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='owner@example.com', password='secret',
+                                                                tin='123456789'))
+        for url, budget in [('/accounts/user-profile', 1), ('/accounts/user-status', 1)]:
+            with self.subTest(url):
+                self.assertQueryBudget(url, budget)
@@ -1,5 +1,6 @@
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
+from django.db import transaction
 from django.shortcuts import render, get_object_or_404
 
 from django.utils.timezone import now
@@ -21,7 +22,7 @@ from .serializers import (
 
 from .models import User, EmailActivation
 from .serializers import RegisterSerializer, LogoutSerializer
-from data.models import MainData, InformativeData, FinancialData, AllData, Currency
+from data.drafts import provision_draft
 
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
@@ -44,41 +45,29 @@ class RegisterView(generics.CreateAPIView):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
-            user.set_password(user.password)
-            user.is_active = False
-            if user.tin != '':
-                user.is_physic = False
-            user.save()
-
-            main_data = MainData.objects.create(
-                user=user,
-            )
-            informative_data = InformativeData.objects.create(
-                user=user,
-            )
-            financial_data = FinancialData.objects.create(
-                user=user, currency=Currency.objects.first()
-            )
-            AllData.objects.create(
-                main_data=main_data,
-                informative_data=informative_data,
-                financial_data=financial_data,
-                user=user
-            )
-
-            # It'll be used in cellery START
-            domain = get_current_site(self.request).domain
-            uid = urlsafe_base64_encode(force_bytes(user.id))
-            token = account_activation_token.make_token(user)
-            resend_url_token = account_activation_token.make_token(user)
-
-            EmailActivation.objects.create(
-                user=user,
-                email=user.email,
-                token=token,
-                resend_url_token=resend_url_token
-            )
+            # Foydalanuvchi, uning qoralamasi va tasdiqlash tokeni bitta tranzaksiyada yaratiladi
+            with transaction.atomic():
+                user = User(**serializer.validated_data)
+                user.set_password(user.password)
+                user.is_active = False
+                if user.tin != '':
+                    user.is_physic = False
+                user.save()
+
+                provision_draft(user)
+
+                # It'll be used in cellery START
+                domain = get_current_site(self.request).domain
+                uid = urlsafe_base64_encode(force_bytes(user.id))
+                token = account_activation_token.make_token(user)
+                resend_url_token = account_activation_token.make_token(user)
+
+                EmailActivation.objects.create(
+                    user=user,
+                    email=user.email,
+                    token=token,
+                    resend_url_token=resend_url_token
+                )
 
             mail_subject = 'Verify your email address'
             message = f'Click here for confirm your registration.\nhttp://{domain}/accounts/email-activation/{uid}/{token}'
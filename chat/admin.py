@@ -1,11 +1,35 @@
 from django.contrib import admin
 
 from chat.models import Chat, Message, GroupChat, GroupMessage, GroupMessageRead, Notification
+from utils.admin import LargeTableAdminMixin
 
 admin.site.register(Chat)
-admin.site.register(Message)
 admin.site.register(GroupChat)
 admin.site.register(GroupMessage)
-admin.site.register(GroupMessageRead)
-admin.site.register(Notification)
 
+
+@admin.register(Message)
+class MessageAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'chat', 'sender', 'created_at', 'is_read', 'is_deleted')
+    # Chat.__str__ shows both users
+    list_select_related = ('chat__user1', 'chat__user2', 'sender')
+    raw_id_fields = ('chat', 'parent')
+    autocomplete_fields = ('sender',)
+    ordering = ('-id',)
+
+
+@admin.register(GroupMessageRead)
+class GroupMessageReadAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'message', 'user', 'is_read')
+    list_select_related = ('message__sender', 'user')
+    raw_id_fields = ('message',)
+    autocomplete_fields = ('user',)
+    ordering = ('-id',)
+
+
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'user', 'group_id', 'created_at', 'is_read')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    ordering = ('-id',)
@@ -1,3 +1,17 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from accounts.models import User
+from utils.testing import QueryBudgetMixin
+from .models import Notification
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    def test_notification_urls(self):
+        user = User.objects.create_user(email='owner@example.com', password='secret', tin='123456789')
+        notifications = [Notification.objects.create(user=user, message=f'Xabar {index}', group_id=1)
+                         for index in range(5)]
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.assertQueryBudget('/chat/notifications/', 1)
+        self.assertQueryBudget(f'/chat/notifications/{notifications[0].pk}/read', 2, method='post')
@@ -1,6 +1,14 @@
 from django.contrib import admin
 from django import forms
 from django.contrib.admin import ModelAdmin
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from accounts.models import User
+from utils.admin import LargeTableAdminMixin
+from .imports import describe, import_listings, read_rows
+from .moderation import set_status
 
 from .models import (
     MainData, InformativeData, FinancialData, ObjectPhoto, Status, AllData,
@@ -9,10 +17,73 @@ from .models import (
 )
 
 
-class AllDataAdmin(admin.ModelAdmin):
-    list_display = ('user', 'date_created', 'status', 'top')
+class ListingImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV or XLSX with the columns of the listing export')
+    user = forms.EmailField(required=False, help_text='Owner of the listings, you by default')
+    status = forms.ChoiceField(choices=Status.choices, initial=Status.APPROVED,
+                               help_text='For the rows without a status column')
+    dry_run = forms.BooleanField(required=False, help_text='Only validate the rows')
+
+    def clean_user(self):
+        email = self.cleaned_data['user']
+        if email and not User.objects.filter(email=email).exists():
+            raise forms.ValidationError('No user with this e-mail')
+        return email
+
+
+class AllDataAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'enterprise_name', 'user', 'date_created', 'status', 'top')
+    list_display_links = ('id', 'enterprise_name')
     list_editable = ('top',)
-    ordering = ('-date_created',)
+    # Both are the leading columns of an index
+    list_filter = ('status', 'date_created')
+    list_select_related = ('user', 'main_data')
+    raw_id_fields = ('main_data', 'informative_data', 'financial_data')
+    autocomplete_fields = ('user',)
+    ordering = ('-date_created', '-id')
+    actions = ('approve', 'reject')
+    change_list_template = 'admin/data/alldata/change_list.html'
+
+    @admin.display(description='Enterprise name', ordering='main_data__enterprise_name')
+    def enterprise_name(self, obj):
+        return obj.main_data.enterprise_name
+
+    @admin.action(description='Approve selected listings', permissions=['change'])
+    def approve(self, request, queryset):
+        self.message_user(request, f'{set_status(queryset, Status.APPROVED)} listings approved')
+
+    @admin.action(description='Reject selected listings', permissions=['change'])
+    def reject(self, request, queryset):
+        self.message_user(request, f'{set_status(queryset, Status.REJECTED)} listings rejected')
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view),
+                 name=f'{self.opts.app_label}_{self.opts.model_name}_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """Bulk import of listings from a spreadsheet (data.imports)."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        report = None
+        form = ListingImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            data = form.cleaned_data
+            owner = User.objects.get(email=data['user']) if data['user'] else request.user
+            report = import_listings(read_rows(data['file'], data['file'].name), owner, data['status'],
+                                     dry_run=data['dry_run'])
+            if not data['dry_run']:
+                self.message_user(request, f'{report.created} listings created, {len(report.errors)} rows skipped')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import listings',
+            'form': form,
+            'report': report,
+            'errors': [(line, describe(errors)) for line, errors in report.errors[:500]] if report else [],
+        }
+        return TemplateResponse(request, 'admin/data/alldata/import.html', context)
 
 
 class AllDataReady(AllData):
@@ -47,10 +118,33 @@ class AreaDataAdmin(admin.ModelAdmin):
     fields = ['location_uz', 'location_ru', 'location_en', 'lat', 'long',]
 
 
-admin.site.register(MainData)
-admin.site.register(FinancialData)
+@admin.register(MainData)
+class MainDataAdmin(LargeTableAdminMixin, ModelAdmin):
+    list_display = ('id', 'enterprise_name', 'category', 'location', 'user')
+    list_select_related = ('category', 'location', 'user')
+    autocomplete_fields = ('user',)
+    ordering = ('-id',)
+
+
+@admin.register(FinancialData)
+class FinancialDataAdmin(LargeTableAdminMixin, ModelAdmin):
+    list_display = ('id', 'investment_direction', 'major_shareholders', 'currency', 'user')
+    list_select_related = ('currency', 'user')
+    autocomplete_fields = ('user',)
+    ordering = ('-id',)
+
+
+@admin.register(InvestorInfo)
+class InvestorInfoAdmin(LargeTableAdminMixin, ModelAdmin):
+    list_display = ('id', 'user_name', 'email', 'status', 'date_created', 'investor', 'all_data')
+    list_filter = ('date_created',)
+    list_select_related = ('investor', 'all_data__main_data')
+    raw_id_fields = ('all_data',)
+    autocomplete_fields = ('investor',)
+    ordering = ('-date_created', '-id')
+
+
 admin.site.register(ObjectPhoto)
-admin.site.register(InvestorInfo)
 admin.site.register(Devices)
 
 # admin.site.register(SmartNote)
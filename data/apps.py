@@ -5,3 +5,5 @@ class DataConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'data'
 
+    def ready(self):
+        import data.signals
@@ -0,0 +1,160 @@
+import json
+import re
+
+import redis
+from django.db import transaction
+
+from .counters import get_redis
+from .models import AllData, Category, Status
+
+# Sorted set of "<term>\0<entry>" members, all with score 0, so ZRANGEBYLEX finds every term starting with a prefix.
+# An entry is 'l<AllData id>' for approved listings and 'c<Category id>' for categories.
+INDEX_KEY = 'einvestment:autocomplete'
+# Entry -> JSON label returned to the client
+LABELS_KEY = 'einvestment:autocomplete:labels'
+# Entry -> JSON list of its members in INDEX_KEY, to remove them when the entry changes
+MEMBERS_KEY = 'einvestment:autocomplete:members'
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 20
+APOSTROPHES = re.compile(r"[ʻʼ‘’`]")
+SPACES = re.compile(r'\s+')
+
+
+def normalize(text):
+    return SPACES.sub(' ', APOSTROPHES.sub("'", text or '').lower()).strip()
+
+
+def terms(text):
+    """The text and the tail of it starting at each further word, so that 'Toshkent Textile' is found by 'tex'."""
+    words = normalize(text).split(' ')
+    return {' '.join(words[index:]) for index in range(len(words)) if words[index]}
+
+
+def _listing_entry(all_data_id, enterprise_name):
+    return f'l{all_data_id}', {'type': 'listing', 'id': all_data_id, 'name': enterprise_name}, terms(enterprise_name)
+
+
+def _category_entry(category):
+    names = {'uz': category.category_uz, 'ru': category.category_ru, 'en': category.category_en}
+    return (f'c{category.pk}', {'type': 'category', 'id': category.pk, 'name': names},
+            set().union(*map(terms, names.values())))
+
+
+def _write(pipe, entry, label, entry_terms, old_members):
+    if old_members:
+        pipe.zrem(INDEX_KEY, *json.loads(old_members))
+    members = [f'{term}\0{entry}' for term in entry_terms]
+    if members:
+        pipe.zadd(INDEX_KEY, dict.fromkeys(members, 0))
+        pipe.hset(LABELS_KEY, entry, json.dumps(label))
+        pipe.hset(MEMBERS_KEY, entry, json.dumps(members))
+    else:
+        pipe.hdel(LABELS_KEY, entry)
+        pipe.hdel(MEMBERS_KEY, entry)
+
+
+def _replace(entry, label=None, entry_terms=()):
+    # Errors are ignored: the nightly rebuild_autocomplete cron restores whatever was missed
+    try:
+        client = get_redis()
+        old_members = client.hget(MEMBERS_KEY, entry)
+        pipe = client.pipeline()
+        _write(pipe, entry, label, entry_terms, old_members)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def index_listing(all_data_id, enterprise_name):
+    _replace(*_listing_entry(all_data_id, enterprise_name))
+
+
+def remove_listing(all_data_id):
+    _replace(f'l{all_data_id}')
+
+
+def index_category(category):
+    _replace(*_category_entry(category))
+
+
+def remove_category(category_id):
+    _replace(f'c{category_id}')
+
+
+# For callers inside a transaction: Redis is written once the rows are committed, never for a rollback,
+# and not while the transaction is still open
+
+def index_listing_on_commit(all_data_id, enterprise_name):
+    transaction.on_commit(lambda: index_listing(all_data_id, enterprise_name))
+
+
+def remove_listing_on_commit(all_data_id):
+    transaction.on_commit(lambda: remove_listing(all_data_id))
+
+
+def index_category_on_commit(category):
+    # The names as saved, not as they may be by the time of the commit
+    entry = _category_entry(category)
+    transaction.on_commit(lambda: _replace(*entry))
+
+
+def remove_category_on_commit(category_id):
+    transaction.on_commit(lambda: remove_category(category_id))
+
+
+def rebuild():
+    """Build the whole index under temporary keys and swap it in, so lookups never see a partial index."""
+    client = get_redis()
+    keys = {key: f'{key}:rebuild' for key in (INDEX_KEY, LABELS_KEY, MEMBERS_KEY)}
+    client.delete(*keys.values())
+    entries = [_category_entry(category) for category in Category.objects.all()]
+    listings = AllData.objects.filter(status=Status.APPROVED).values_list('id', 'main_data__enterprise_name')
+    entries.extend(_listing_entry(pk, name) for pk, name in listings.iterator(chunk_size=2000))
+
+    indexed = 0
+    for start in range(0, len(entries), 1000):
+        pipe = client.pipeline(transaction=False)
+        for entry, label, entry_terms in entries[start:start + 1000]:
+            members = [f'{term}\0{entry}' for term in entry_terms]
+            if members:
+                indexed += 1
+                pipe.zadd(keys[INDEX_KEY], dict.fromkeys(members, 0))
+                pipe.hset(keys[LABELS_KEY], entry, json.dumps(label))
+                pipe.hset(keys[MEMBERS_KEY], entry, json.dumps(members))
+        pipe.execute()
+
+    pipe = client.pipeline()
+    for key, rebuild_key in keys.items():
+        pipe.delete(key)
+        if indexed:
+            pipe.rename(rebuild_key, key)
+    pipe.execute()
+    return indexed
+
+
+def suggest(prefix, limit=DEFAULT_LIMIT):
+    """Up to `limit` listings and categories with a word starting with `prefix`, in alphabetical order."""
+    prefix = normalize(prefix).encode()
+    if not prefix:
+        return []
+    client = get_redis()
+    # 0xff never occurs in UTF-8, so it sorts after every member starting with the prefix
+    members = client.zrangebylex(INDEX_KEY, b'[' + prefix, b'(' + prefix + b'\xff', start=0, num=limit * 4)
+    entries = list(dict.fromkeys(member.rsplit(b'\0', 1)[1] for member in members))[:limit]
+    if not entries:
+        return []
+    return [json.loads(label) for label in client.hmget(LABELS_KEY, entries) if label is not None]
+
+
+def suggest_from_database(prefix, limit=DEFAULT_LIMIT):
+    """Same answer from the database, only used while Redis is unavailable."""
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    categories = Category.objects.filter(category__istartswith=prefix)[:limit]
+    listings = AllData.objects.filter(
+        status=Status.APPROVED, main_data__enterprise_name__istartswith=prefix,
+    ).values_list('id', 'main_data__enterprise_name')[:limit]
+    results = [_category_entry(category)[1] for category in categories]
+    results += [{'type': 'listing', 'id': pk, 'name': name} for pk, name in listings]
+    return results[:limit]
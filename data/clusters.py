@@ -0,0 +1,114 @@
+import math
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import AllData, MapCluster, Status
+
+# From this zoom level on the map shows individual listings instead of clusters
+MAX_CLUSTER_ZOOM = 15
+# Clusters at zoom z are the tiles of zoom z + CELL_BITS: 4x4 cells (about 64px) per 256px map tile
+CELL_BITS = 2
+MAX_MERCATOR_LAT = 85.05112878
+# A response has at most this many cells each way (64px each) and at most MAX_MAP_POINTS listings;
+# a larger bbox gets the clusters of a lower zoom instead
+MAX_BBOX_CELLS = 64
+MAX_MAP_POINTS = 1000
+
+
+def cell(lat, long, zoom):
+    """Web Mercator (x, y) of the cluster cell containing the point at `zoom`."""
+    size = 2 ** (zoom + CELL_BITS)
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, float(lat)))
+    x = int((float(long) + 180) / 360 * size)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * size)
+    return min(max(x, 0), size - 1), min(max(y, 0), size - 1)
+
+
+def _cells_filter(lat, long):
+    return reduce(or_, [Q(zoom=zoom, x=x, y=y) for zoom in range(MAX_CLUSTER_ZOOM)
+                        for x, y in [cell(lat, long, zoom)]])
+
+
+@transaction.atomic
+def add_point(lat, long):
+    cells = [MapCluster(zoom=zoom, x=x, y=y) for zoom in range(MAX_CLUSTER_ZOOM)
+             for x, y in [cell(lat, long, zoom)]]
+    MapCluster.objects.bulk_create(cells, ignore_conflicts=True)
+    MapCluster.objects.filter(_cells_filter(lat, long)).update(
+        count=F('count') + 1, lat_sum=F('lat_sum') + float(lat), long_sum=F('long_sum') + float(long))
+
+
+@transaction.atomic
+def remove_point(lat, long):
+    cells = _cells_filter(lat, long)
+    MapCluster.objects.filter(cells).update(
+        count=F('count') - 1, lat_sum=F('lat_sum') - float(lat), long_sum=F('long_sum') - float(long))
+    MapCluster.objects.filter(cells, count__lte=0).delete()
+
+
+@transaction.atomic
+def rebuild_clusters():
+    """Recompute every zoom level from the approved listings, correcting any drift of the incremental updates."""
+    points = AllData.objects.filter(status=Status.APPROVED).values_list('main_data__lat', 'main_data__long')
+    clusters = defaultdict(lambda: [0, 0.0, 0.0])
+    for lat, long in points.iterator(chunk_size=2000):
+        for zoom in range(MAX_CLUSTER_ZOOM):
+            cluster = clusters[(zoom, *cell(lat, long, zoom))]
+            cluster[0] += 1
+            cluster[1] += float(lat)
+            cluster[2] += float(long)
+
+    MapCluster.objects.all().delete()
+    MapCluster.objects.bulk_create([
+        MapCluster(zoom=zoom, x=x, y=y, count=count, lat_sum=lat_sum, long_sum=long_sum)
+        for (zoom, x, y), (count, lat_sum, long_sum) in clusters.items()
+    ], batch_size=2000)
+
+
+def _x_ranges(min_x, max_x, zoom):
+    """Cell x ranges from min_x to max_x: two of them for a bbox across the antimeridian (min_long > max_long)."""
+    if min_x <= max_x:
+        return [(min_x, max_x)]
+    return [(min_x, 2 ** (zoom + CELL_BITS) - 1), (0, max_x)]
+
+
+def fitting_zoom(min_lat, min_long, max_lat, max_long, zoom):
+    """The highest zoom up to `zoom` at which the bbox spans at most MAX_BBOX_CELLS cells each way."""
+    for zoom in range(min(zoom, MAX_CLUSTER_ZOOM - 1), 0, -1):
+        (min_x, min_y), (max_x, max_y) = cell(max_lat, min_long, zoom), cell(min_lat, max_long, zoom)
+        width = sum(last - first + 1 for first, last in _x_ranges(min_x, max_x, zoom))
+        if width <= MAX_BBOX_CELLS and max_y - min_y + 1 <= MAX_BBOX_CELLS:
+            return zoom
+    return 0
+
+
+def clusters_in_bbox(min_lat, min_long, max_lat, max_long, zoom):
+    # Mercator y grows southwards, so the northern edge gives the smallest y
+    min_x, min_y = cell(max_lat, min_long, zoom)
+    max_x, max_y = cell(min_lat, max_long, zoom)
+    columns = reduce(or_, [Q(x__range=x_range) for x_range in _x_ranges(min_x, max_x, zoom)])
+    rows = MapCluster.objects.filter(columns, zoom=zoom, y__range=(min_y, max_y), count__gt=0)
+    return [
+        {'lat': lat_sum / count, 'long': long_sum / count, 'count': count}
+        for count, lat_sum, long_sum in rows.values_list('count', 'lat_sum', 'long_sum')
+    ]
+
+
+def points_in_bbox(min_lat, min_long, max_lat, max_long):
+    """The approved listings in the bbox, or None if there are more than MAX_MAP_POINTS of them."""
+    if min_long <= max_long:
+        longs = Q(main_data__long__range=(min_long, max_long))
+    else:
+        # Across the antimeridian
+        longs = Q(main_data__long__gte=min_long) | Q(main_data__long__lte=max_long)
+    rows = AllData.objects.filter(
+        longs,
+        status=Status.APPROVED,
+        main_data__lat__range=(min_lat, max_lat),
+    ).values_list('id', 'main_data__lat', 'main_data__long')[:MAX_MAP_POINTS + 1]
+    points = [{'id': pk, 'lat': lat, 'long': long} for pk, lat, long in rows]
+    return points if len(points) <= MAX_MAP_POINTS else None
@@ -0,0 +1,87 @@
+import time
+import uuid
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, When, Value, F, IntegerField
+from django.utils import timezone
+
+from . import leaderboards
+from .models import AllData, ViewCountFlush
+
+# Redis hash of AllData id -> views not yet written to AllData.view_count
+PENDING_KEY = 'einvestment:alldata:views'
+# The hash being written by flush_views(); RENAME moves it here so new views go to a fresh hash meanwhile
+FLUSHING_KEY = 'einvestment:alldata:views:flushing'
+# Id of the hash being written, recorded as a ViewCountFlush in the transaction that applies it
+FLUSHING_ID_KEY = 'einvestment:alldata:views:flushing:id'
+FLUSH_BATCH_SIZE = 500
+# After a Redis error views are counted in the database for this many seconds, instead of every view
+# waiting for the connect timeout first
+REDIS_RETRY_AFTER = 30
+
+_client = None
+_redis_down_until = 0
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(f'{settings.REDIS_URL}/1', socket_timeout=1, socket_connect_timeout=1)
+    return _client
+
+
+def record_view(all_data_id):
+    """Count a detail view without touching the database; flush_views() writes the totals in batches."""
+    global _redis_down_until
+    if time.monotonic() >= _redis_down_until:
+        try:
+            get_redis().hincrby(PENDING_KEY, all_data_id, 1)
+            return
+        except redis.RedisError:
+            _redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+    # Still atomic, just not buffered
+    AllData.objects.filter(pk=all_data_id).update(view_count=F('view_count') + 1)
+
+
+def flush_views():
+    """
+    Add the buffered views to AllData.view_count, a batch of listings per UPDATE. Returns the number of views.
+
+    The hash being flushed has an id, recorded as a ViewCountFlush in the same transaction as the UPDATEs. If
+    the hash cannot be deleted afterwards, the next flush finds its id applied and only deletes it.
+    """
+    client = get_redis()
+    # A flush that failed half way left its hash behind: finish that one first
+    if not client.exists(FLUSHING_KEY):
+        try:
+            client.rename(PENDING_KEY, FLUSHING_KEY)
+        except redis.ResponseError:
+            # Nothing was viewed since the last flush
+            return 0
+    # NX: a flush that stopped after naming the hash keeps its name
+    client.set(FLUSHING_ID_KEY, str(uuid.uuid4()), nx=True)
+    batch_id = client.get(FLUSHING_ID_KEY).decode()
+
+    counts = [(int(pk), int(views)) for pk, views in client.hgetall(FLUSHING_KEY).items()]
+    with transaction.atomic():
+        applied = ViewCountFlush.objects.filter(batch=batch_id).exists()
+        if not applied:
+            for start in range(0, len(counts), FLUSH_BATCH_SIZE):
+                batch = counts[start:start + FLUSH_BATCH_SIZE]
+                AllData.objects.filter(pk__in=[pk for pk, _ in batch]).update(view_count=F('view_count') + Case(
+                    *[When(pk=pk, then=Value(views)) for pk, views in batch],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                ))
+            ViewCountFlush.objects.create(batch=batch_id)
+            # Only the batches whose hash may still be around are needed
+            ViewCountFlush.objects.filter(applied_at__lt=timezone.now() - timedelta(days=7)).delete()
+    client.delete(FLUSHING_KEY, FLUSHING_ID_KEY)
+    if applied:
+        return 0
+    if counts:
+        leaderboards.refresh('most-viewed')
+    return sum(views for _, views in counts)
@@ -1,23 +1,37 @@
-import requests
-from datetime import datetime
+from django.utils import timezone
 
-from .models import Currency, CurrencyPrice
+from .clusters import rebuild_clusters
+from .counters import flush_views
+from . import autocomplete, leaderboards, uploads
+from .currency_feeds import get_feed, ingest
 
 
 def my_scheduled_currency():
-    response = requests.get('https://nbu.uz/en/exchange-rates/json/')
-
-    if response.status_code == 200:
-        if response.json():
-            list1 = []
-            currency_data = [entry for entry in response.json() if entry['code'] == 'USD' or entry['code'] == 'GBP' or entry['code'] == 'EUR']
-            gbp = Currency.objects.get_or_create(code='GBP', name="British Pound")
-            usd = Currency.objects.get_or_create(code='USD', name="US Dollar")
-            eur = Currency.objects.get_or_create(code='GBP', name="EURO")
-            for data in currency_data:
-                if data['code'] == 'GBP':
-                    CurrencyPrice.objects.create(code=data['code'], name=data['title'], cb_price=data['cb_price'], currency=gbp))
-                if data['code'] == 'USD':
-                    CurrencyPrice.objects.create(code=data['code'], name=data['title'], cb_price=data['cb_price'], currency=usd))
-                if data['code'] == 'EUR':
-                    CurrencyPrice.objects.create(code=data['code'], name=data['title'], cb_price=data['cb_price'], currency=eur))
+    # Bugungi kurslar: qayta ishga tushirilsa ham har valyuta uchun kuniga bitta qator qoladi.
+    # Yangi kurslar bo'yicha barcha obyektlarning dollardagi narxi ham qayta hisoblanadi
+    ingest(get_feed(), [timezone.localdate()])
+
+
+def rebuild_map_clusters():
+    # Signal orqali o'zgartirilgan klasterlarni har kecha to'liq qayta hisoblash
+    rebuild_clusters()
+
+
+def flush_view_counts():
+    flush_views()
+
+
+def refresh_leaderboards():
+    # Nomi, rasmi kabi o'zgarishlar ham bosh sahifaga yetib kelishi uchun
+    for name in leaderboards.BOARDS:
+        leaderboards.refresh(name)
+
+
+def rebuild_autocomplete():
+    # Redis ishlamay qolgan paytda o'tkazib yuborilgan o'zgarishlarni tiklaydi
+    autocomplete.rebuild()
+
+
+def expire_upload_sessions():
+    # Tugallanmagan va uzoq vaqt yozilmagan yuklashlarni fayllari bilan o'chirish
+    uploads.expire()
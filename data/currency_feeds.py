@@ -0,0 +1,104 @@
+import json
+from collections import namedtuple
+from datetime import date, datetime
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Currency, CurrencyPrice
+from .pricing import refresh_price_usd
+from .rates import RATE_CODES, rate_table
+
+Rate = namedtuple('Rate', ('code', 'name', 'price', 'date'))
+
+CURRENCY_NAMES = {'USD': 'US Dollar', 'EUR': 'EURO', 'GBP': 'British Pound'}
+
+
+class NbuFeed:
+    """Today's rates from nbu.uz, the source of the daily cron; it has no history."""
+    url = 'https://nbu.uz/en/exchange-rates/json/'
+
+    def rates(self, day):
+        if day != timezone.localdate():
+            raise ValueError('nbu.uz only has the rates of today, use the cbu feed for other days')
+        response = requests.get(self.url, timeout=30)
+        response.raise_for_status()
+        return [Rate(entry['code'], entry['title'], entry['cb_price'], day) for entry in response.json()]
+
+
+class CbuFeed:
+    """Rates of any day from the cbu.uz archive (settings.CBU_RATES_URL)."""
+
+    def __init__(self):
+        self.session = requests.Session()
+
+    def rates(self, day):
+        response = self.session.get(f'{settings.CBU_RATES_URL}all/{day.isoformat()}/', timeout=30)
+        response.raise_for_status()
+        # A weekend or holiday answers with the rate of the last working day, under its own date
+        return [
+            Rate(entry['Ccy'], entry['CcyNm_EN'], entry['Rate'], datetime.strptime(entry['Date'], '%d.%m.%Y').date())
+            for entry in response.json()
+        ]
+
+
+class FileFeed:
+    """A JSON list of {"code", "name", "price", "date"} objects, for offline imports and tests."""
+
+    def __init__(self, path):
+        with open(path) as file:
+            self.entries = [Rate(entry['code'], entry.get('name', entry['code']), entry['price'],
+                                 date.fromisoformat(entry['date'])) for entry in json.load(file)]
+
+    def rates(self, day):
+        return [rate for rate in self.entries if rate.date == day]
+
+
+FEEDS = {
+    'nbu': NbuFeed,
+    'cbu': CbuFeed,
+}
+
+
+def get_feed(name=None):
+    """Feed by name, or the one configured in settings.CURRENCY_FEED (a name or a dotted path)."""
+    name = name or settings.CURRENCY_FEED
+    return FEEDS[name]() if name in FEEDS else import_string(name)()
+
+
+def currencies(codes=RATE_CODES):
+    found = {currency.code: currency for currency in Currency.objects.filter(code__in=codes).order_by('-id')}
+    for code in set(codes) - set(found):
+        currency, _ = Currency.objects.get_or_create(code=code, defaults={'name': CURRENCY_NAMES.get(code, code)})
+        # Currency.save() refuses more than 4 currencies
+        if currency.pk is not None:
+            found[code] = currency
+    return found
+
+
+def ingest(feed, days, codes=RATE_CODES):
+    """
+    Store the rates of `days` from `feed`: one row per currency and day, inserted or updated in bulk,
+    so running it again for the same days changes nothing. Returns the number of rows written.
+    """
+    by_code = currencies(codes)
+    rows = {}
+    for day in days:
+        for rate in feed.rates(day):
+            currency = by_code.get(rate.code)
+            if currency is not None:
+                rows[(currency.pk, rate.date)] = CurrencyPrice(
+                    code=rate.code, name=rate.name[:30], cb_price=rate.price, date=rate.date, currency=currency)
+
+    with transaction.atomic():
+        CurrencyPrice.objects.bulk_create(
+            rows.values(), batch_size=1000,
+            update_conflicts=True, unique_fields=['currency', 'date'], update_fields=['code', 'name', 'cb_price'],
+        )
+    # bulk_create sends no signals: reload the rate tables and the dollar prices explicitly
+    rate_table.invalidate()
+    refresh_price_usd()
+    return len(rows)
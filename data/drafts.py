@@ -0,0 +1,64 @@
+from django.core.cache import caches
+from django.db import transaction
+
+from . import versions
+from .geo import grid_cell
+from .models import MainData, InformativeData, FinancialData, AllData, Currency
+
+DEFAULT_CURRENCY_KEY = 'draft-default-currency:{}'
+
+
+def default_currency_id():
+    """
+    Id of the currency a new draft starts with, the first one. Cached under the version of the currencies,
+    so adding or deleting a currency picks the new default.
+    """
+    version = versions.get(versions.CURRENCY)
+    key = None if version is None else DEFAULT_CURRENCY_KEY.format(version[0])
+    currency_id = None
+    if key is not None:
+        try:
+            currency_id = caches['shared'].get(key)
+        except Exception:
+            pass
+    if currency_id is None:
+        currency_id = Currency.objects.order_by('pk').values_list('pk', flat=True).first()
+        if currency_id is not None and key is not None:
+            try:
+                caches['shared'].set(key, currency_id, None)
+            except Exception:
+                pass
+    return currency_id
+
+
+def provision_drafts(users):
+    """
+    Creates an empty draft, MainData, InformativeData, FinancialData and AllData, for each of `users`.
+    All of them in one transaction with one INSERT per table, so a failure leaves no half-built draft.
+    Returns the AllData rows.
+    """
+    users = list(users)
+    currency_id = default_currency_id()
+    main_data = [MainData(user=user) for user in users]
+    for row in main_data:
+        # What MainData.save() would do; bulk_create does not call it
+        row.geo_cell = grid_cell(row.lat, row.long)
+
+    with transaction.atomic():
+        MainData.objects.bulk_create(main_data)
+        informative_data = InformativeData.objects.bulk_create([InformativeData(user=user) for user in users])
+        financial_data = FinancialData.objects.bulk_create(
+            [FinancialData(user=user, currency_id=currency_id) for user in users])
+        all_data = AllData.objects.bulk_create([
+            AllData(user=user, main_data=main, informative_data=informative, financial_data=financial)
+            for user, main, informative, financial in zip(users, main_data, informative_data, financial_data)
+        ])
+        # The signals of a created AllData, as far as a draft needs them: it is not approved, so it has no
+        # price, map point, leaderboard place or suggestion yet, and is indexed for search on approval.
+        # It does show up in the listings of any status.
+        versions.bump_on_commit(versions.ALL_LISTINGS)
+    return all_data
+
+
+def provision_draft(user):
+    return provision_drafts([user])[0]
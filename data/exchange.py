@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+
+# Currencies shown by ExchangeRatesView, in this order
+CURRENCIES = ('USD', 'RUB', 'EUR', 'GBP', 'JPY')
+KEY = 'cbu-rates:{}'
+REFRESH_LOCK_KEY = 'cbu-rates:refreshing:{}'
+
+_executor = ThreadPoolExecutor(max_workers=2 * len(CURRENCIES), thread_name_prefix='cbu-rates')
+_lock = threading.Lock()
+# Currency code -> Future of the fetch running in this process, so concurrent requests share one
+_inflight = {}
+
+
+def fetch(code):
+    """Today's central bank rate of `code` as returned by cbu.uz, or None if it has none."""
+    response = requests.get(f'{settings.CBU_RATES_URL}{code}/', timeout=settings.CBU_RATES_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    return data[0] if data else None
+
+
+def _fetch_and_store(code):
+    data = fetch(code)
+    if data is not None:
+        # Kept well past CBU_RATES_TTL, so an outage upstream serves old rates instead of none.
+        # Without the cache the rate is still served, just fetched again next time
+        try:
+            caches['shared'].set(KEY.format(code), {'data': data, 'fetched_at': time.time()},
+                                 settings.CBU_RATES_STALE_TTL)
+        except Exception:
+            pass
+    return data
+
+
+def _submit(code):
+    with _lock:
+        future = _inflight.get(code)
+        if future is None:
+            future = _inflight[code] = _executor.submit(_fetch_and_store, code)
+            future.add_done_callback(lambda _: _inflight.pop(code, None))
+        return future
+
+
+def _refresh_in_background(code):
+    # One worker across all processes refreshes a stale rate; the others keep serving it meanwhile
+    try:
+        refresh = caches['shared'].add(REFRESH_LOCK_KEY.format(code), True, settings.CBU_RATES_TIMEOUT * 2)
+    except Exception:
+        # A stale rate could only have come from the cache, so it is back soon enough to retry then
+        return
+    if refresh:
+        _submit(code)
+
+
+def get_rates():
+    """
+    (rates, missing): the rates by currency code and the codes that could not be served.
+
+    Fresh cached rates are returned as they are. Stale ones are returned too and refreshed in the
+    background (stale-while-revalidate). Only rates missing from the cache are fetched while the
+    client waits, all of them concurrently and for at most CBU_RATES_TIMEOUT seconds.
+    """
+    try:
+        cached = caches['shared'].get_many([KEY.format(code) for code in CURRENCIES])
+    except Exception:
+        cached = {}
+
+    rates, pending = {}, {}
+    for code in CURRENCIES:
+        entry = cached.get(KEY.format(code))
+        if entry is None:
+            pending[code] = _submit(code)
+            continue
+        rates[code] = entry['data']
+        if time.time() - entry['fetched_at'] > settings.CBU_RATES_TTL:
+            _refresh_in_background(code)
+
+    if pending:
+        wait(pending.values(), timeout=settings.CBU_RATES_TIMEOUT)
+        for code, future in pending.items():
+            if future.done() and future.exception() is None and future.result() is not None:
+                rates[code] = future.result()
+
+    rates = {code: rates[code] for code in CURRENCIES if code in rates}
+    return rates, [code for code in CURRENCIES if code not in rates]
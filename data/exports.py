@@ -0,0 +1,165 @@
+import csv
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import AllData, InvestorInfo, Status
+
+# The columns one can choose from: column -> field lookup, in export order
+LISTING_COLUMNS = {
+    'id': 'id',
+    'status': 'status',
+    'date_created': 'date_created',
+    'view_count': 'view_count',
+    'top': 'top',
+    'price_usd': 'price_usd',
+    'user_email': 'user__email',
+    'enterprise_name': 'main_data__enterprise_name',
+    'legal_form': 'main_data__legal_form',
+    'category': 'main_data__category__category',
+    'area': 'main_data__location__location',
+    'lat': 'main_data__lat',
+    'long': 'main_data__long',
+    'field_of_activity': 'main_data__field_of_activity',
+    'infrastructure': 'main_data__infrastructure',
+    'project_staff': 'main_data__project_staff',
+    'product_info': 'informative_data__product_info',
+    'project_capacity': 'informative_data__project_capacity',
+    'formation_date': 'informative_data__formation_date',
+    'total_area': 'informative_data__total_area',
+    'building_area': 'informative_data__building_area',
+    'tech_equipment': 'informative_data__tech_equipment',
+    'export_share': 'financial_data__export_share',
+    'authorized_capital': 'financial_data__authorized_capital',
+    'currency': 'financial_data__currency__code',
+    'estimated_value': 'financial_data__estimated_value',
+    'investment_or_loan_amount': 'financial_data__investment_or_loan_amount',
+    'investment_direction': 'financial_data__investment_direction',
+    'major_shareholders': 'financial_data__major_shareholders',
+}
+INVESTOR_COLUMNS = {
+    'id': 'id',
+    'status': 'status',
+    'date_created': 'date_created',
+    'user_name': 'user_name',
+    'email': 'email',
+    'user_phone': 'user_phone',
+    'message': 'message',
+    'file': 'file',
+    'investor_email': 'investor__email',
+    'all_data': 'all_data_id',
+    'enterprise_name': 'all_data__main_data__enterprise_name',
+}
+# Export name -> (queryset, columns)
+EXPORTS = {
+    'listings': (AllData.objects.all, LISTING_COLUMNS),
+    'investors': (InvestorInfo.objects.all, INVESTOR_COLUMNS),
+}
+FORMATS = ('csv', 'xlsx')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# Rows fetched per round trip; on PostgreSQL iterator() reads them from a server-side cursor
+CHUNK_SIZE = 2000
+
+
+class ExportError(ValueError):
+    pass
+
+
+def rows(name, columns=None, statuses=None, date_from=None, date_to=None):
+    """
+    (header, rows) of export `name`: the selected `columns` (all by default), of the given statuses and
+    created between the dates, oldest first. The rows are produced lazily, CHUNK_SIZE at a time.
+    """
+    if name not in EXPORTS:
+        raise ExportError(f'Unknown export {name!r}, choose from {", ".join(EXPORTS)}')
+    queryset, available = EXPORTS[name]
+    columns = list(columns or available)
+    unknown = [column for column in columns if column not in available]
+    if unknown:
+        raise ExportError(f'Unknown columns {", ".join(unknown)}; available: {", ".join(available)}')
+    invalid = [status for status in statuses or () if status not in Status.values]
+    if invalid:
+        raise ExportError(f'Unknown statuses {", ".join(invalid)}; available: {", ".join(Status.values)}')
+
+    queryset = queryset()
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    # Bounds as datetimes rather than a __date lookup, so the date_created indexes are used
+    if date_from:
+        queryset = queryset.filter(date_created__gte=_start_of(date_from))
+    if date_to:
+        queryset = queryset.filter(date_created__lt=_start_of(date_to + timedelta(days=1)))
+    values = queryset.order_by('id').values_list(*[available[column] for column in columns])
+    return columns, values.iterator(chunk_size=CHUNK_SIZE)
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    value = str(value)
+    # A spreadsheet would run a cell starting with these as a formula
+    return "'" + value if value[:1] in ('=', '+', '-', '@') and not _is_number(value) else value
+
+
+def _is_number(value):
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+class _Echo:
+    """The file csv.writer writes to: each line is handed back instead of being stored."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, values):
+    """The export as CSV, one encoded line at a time; starts with a BOM so that Excel reads it as UTF-8."""
+    writer = csv.writer(_Echo())
+    yield '\ufeff'.encode() + writer.writerow(header).encode()
+    for row in values:
+        yield writer.writerow([_cell(value) for value in row]).encode()
+
+
+def _xlsx_cell(value):
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        # Excel has no time zones
+        return timezone.localtime(value).replace(tzinfo=None)
+    if value is None or isinstance(value, (int, float, Decimal, date)):
+        return value
+    return _cell(value)
+
+
+def write_xlsx(header, values, file):
+    """
+    Writes the export to `file` as XLSX. The write-only workbook keeps one row in memory at a time; the
+    format is a zip with its index at the end, so it is built in a file first and sent afterwards.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for row in values:
+        sheet.append([_xlsx_cell(value) for value in row])
+    workbook.save(file)
+
+
+def xlsx_file(header, values):
+    """The export as XLSX in a temporary file, spilled to disk past a few megabytes, positioned at its start."""
+    file = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    write_xlsx(header, values, file)
+    file.seek(0)
+    return file
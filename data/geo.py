@@ -0,0 +1,96 @@
+import math
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0
+# Fixed grid over the globe: cells are GRID_SIZE degrees on each side (about 11 km of latitude)
+GRID_SIZE = 0.1
+GRID_COLUMNS = int(round(360 / GRID_SIZE))
+# A radius spanning more grid rows than this is cheaper to answer with a plain lat/long range
+MAX_GRID_ROWS = 100
+# First radius tried by the k-nearest search, multiplied by 4 until enough points are found
+NEAREST_START_KM = 25.0
+
+
+def grid_row(lat):
+    return int(math.floor((float(lat) + 90) / GRID_SIZE))
+
+
+def grid_column(long):
+    return int(math.floor((float(long) + 180) / GRID_SIZE)) % GRID_COLUMNS
+
+
+def grid_cell(lat, long):
+    """Id of the grid cell containing the point; cells of one row have consecutive ids."""
+    return grid_row(lat) * GRID_COLUMNS + grid_column(long)
+
+
+def haversine_km(lat1, long1, lat2, long2):
+    lat1, long1, lat2, long2 = map(math.radians, (float(lat1), float(long1), float(lat2), float(long2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((long2 - long1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, long, distance_km):
+    """(min_lat, max_lat, min_long, max_long) around the circle, or None when it reaches a pole."""
+    angle = distance_km / EARTH_RADIUS_KM
+    min_lat, max_lat = lat - math.degrees(angle), lat + math.degrees(angle)
+    if min_lat <= -90 or max_lat >= 90:
+        return None
+    delta_long = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(math.radians(lat)))))
+    return min_lat, max_lat, long - delta_long, long + delta_long
+
+
+def parse_bbox(text):
+    """'min_lat,min_long,max_lat,max_long' as four floats; ValueError if malformed."""
+    min_lat, min_long, max_lat, max_long = map(float, text.split(','))
+    return min_lat, min_long, max_lat, max_long
+
+
+def nearby_filter(lat, long, distance_km, prefix='main_data__'):
+    """
+    Q restricting rows to the grid cells the circle touches: one index range per grid row.
+    Large circles fall back to a lat/long box, circles across the antimeridian to a latitude band and
+    circles around a pole are not restricted; the exact distance check afterwards keeps the result correct.
+    """
+    box = bounding_box(lat, long, distance_km)
+    if box is None:
+        return Q()
+    min_lat, max_lat, min_long, max_long = box
+    if min_long < -180 or max_long >= 180:
+        return Q(**{f'{prefix}lat__gte': min_lat, f'{prefix}lat__lte': max_lat})
+
+    first_row, last_row = grid_row(min_lat), grid_row(max_lat)
+    if last_row - first_row >= MAX_GRID_ROWS:
+        return Q(**{f'{prefix}lat__gte': min_lat, f'{prefix}lat__lte': max_lat,
+                    f'{prefix}long__gte': min_long, f'{prefix}long__lte': max_long})
+
+    first_column, last_column = grid_column(min_long), grid_column(max_long)
+    return reduce(or_, [
+        Q(**{f'{prefix}geo_cell__range': (row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column)})
+        for row in range(first_row, last_row + 1)
+    ])
+
+
+def within_radius(queryset, lat, long, distance_km):
+    """AllData rows of `queryset` inside the circle, nearest first, each with a `distance_km` attribute."""
+    results = []
+    for all_data in queryset.filter(nearby_filter(lat, long, distance_km)).select_related('main_data'):
+        all_data.distance_km = haversine_km(lat, long, all_data.main_data.lat, all_data.main_data.long)
+        if all_data.distance_km <= distance_km:
+            results.append(all_data)
+    results.sort(key=lambda all_data: (all_data.distance_km, all_data.pk))
+    return results
+
+
+def nearest(queryset, lat, long, k, max_distance_km):
+    """The `k` rows of `queryset` closest to the point, searching outwards up to `max_distance_km`."""
+    radius = min(NEAREST_START_KM, max_distance_km)
+    while True:
+        results = within_radius(queryset, lat, long, radius)
+        # Once k points lie inside the circle, nothing outside it can be closer
+        if len(results) >= k or radius >= max_distance_km:
+            return results[:k]
+        radius = min(radius * 4, max_distance_km)
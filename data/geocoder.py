@@ -0,0 +1,148 @@
+import bisect
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import versions
+from .geo import EARTH_RADIUS_KM, haversine_km
+from .models import Area
+
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+# Coordinates are rounded to this many decimals (about 11 m) before the cache lookup
+CACHE_PRECISION = 4
+# How long a worker trusts its index before comparing the Area version with the shared cache again
+CHECK_INTERVAL = 30
+
+
+def _in_ring(long, lat, ring):
+    """Ray casting; `ring` is a GeoJSON list of [long, lat] positions."""
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+        if (y1 > lat) != (y2 > lat) and long < (x2 - x1) * (lat - y1) / (y2 - y1) + x1:
+            inside = not inside
+    return inside
+
+
+class Boundaries:
+    """Polygons of a GeoJSON FeatureCollection; a feature's name is its `name` property."""
+
+    def __init__(self, path):
+        with open(path) as file:
+            features = json.load(file)['features']
+        self.polygons = []
+        for feature in features:
+            geometry = feature['geometry']
+            polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+            for polygon in polygons:
+                longs = [position[0] for position in polygon[0]]
+                lats = [position[1] for position in polygon[0]]
+                box = (min(longs), min(lats), max(longs), max(lats))
+                rings = [[tuple(position[:2]) for position in ring] for ring in polygon]
+                self.polygons.append((box, rings, feature['properties']['name']))
+
+    def locate(self, lat, long):
+        for (min_long, min_lat, max_long, max_lat), (outer, *holes), name in self.polygons:
+            if min_long <= long <= max_long and min_lat <= lat <= max_lat and _in_ring(long, lat, outer) \
+                    and not any(_in_ring(long, lat, hole) for hole in holes):
+                return name
+        return None
+
+
+class AreaIndex:
+    """Nearest Area centre: areas sorted by latitude, searched outwards from the point's latitude."""
+
+    def __init__(self, areas):
+        self.areas = sorted((float(lat), float(long), name) for name, lat, long in areas)
+        self.lats = [lat for lat, _, _ in self.areas]
+
+    def nearest(self, lat, long, max_distance_km):
+        best_name, best_distance = None, max_distance_km
+        start = bisect.bisect_left(self.lats, lat)
+        for indexes in (range(start, len(self.areas)), range(start - 1, -1, -1)):
+            for index in indexes:
+                area_lat, area_long, name = self.areas[index]
+                # No area further along can be closer than its latitude difference alone
+                if abs(area_lat - lat) * KM_PER_DEGREE_LAT > best_distance:
+                    break
+                distance = haversine_km(lat, long, area_lat, area_long)
+                if distance <= best_distance:
+                    best_name, best_distance = name, distance
+        return best_name
+
+
+class ReverseGeocoder:
+    """
+    Place name of a point without a network round trip.
+
+    With settings.GEOCODER_BOUNDARIES_FILE the name of the boundary containing the point is returned,
+    otherwise the nearest Area within GEOCODER_MAX_DISTANCE_KM. Points that resolve to nothing go to
+    Nominatim when GEOCODER_REMOTE_FALLBACK is on. Answers are kept in an LRU cache of rounded
+    coordinates; index and cache are rebuilt when the Area version (data.versions) changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._index = None
+        self._boundaries = None
+        self._cache = OrderedDict()
+
+    def _ensure_loaded(self):
+        if self._index is not None and time.monotonic() - self._checked_at < CHECK_INTERVAL:
+            return
+        with self._lock:
+            version = versions.get(versions.AREA)
+            if self._index is None or version is None or version != self._version:
+                self._index = AreaIndex(Area.objects.values_list('location', 'lat', 'long'))
+                path = getattr(settings, 'GEOCODER_BOUNDARIES_FILE', None)
+                self._boundaries = Boundaries(path) if path else None
+                self._cache.clear()
+                self._version = version
+            self._checked_at = time.monotonic()
+
+    def locate(self, lat, long):
+        """Local answer for the point, or None on a miss."""
+        self._ensure_loaded()
+        if self._boundaries is not None:
+            return self._boundaries.locate(lat, long)
+        return self._index.nearest(lat, long, settings.GEOCODER_MAX_DISTANCE_KM)
+
+    @staticmethod
+    def remote(lat, long):
+        from geopy.exc import GeopyError
+        from geopy.geocoders import Nominatim
+        try:
+            location = Nominatim(user_agent="E-Investment", timeout=settings.GEOCODER_REMOTE_TIMEOUT).reverse(
+                f"{lat}, {long}")
+        except GeopyError:
+            return None
+        return location.address if location else None
+
+    def reverse(self, lat, long):
+        """Address of the point, or None if neither the local index nor the fallback knows it."""
+        lat, long = round(float(lat), CACHE_PRECISION), round(float(long), CACHE_PRECISION)
+        self._ensure_loaded()
+        with self._lock:
+            if (lat, long) in self._cache:
+                self._cache.move_to_end((lat, long))
+                return self._cache[(lat, long)]
+
+        address = self.locate(lat, long)
+        if address is None and settings.GEOCODER_REMOTE_FALLBACK:
+            address = self.remote(lat, long)
+        if address is None:
+            # Misses are not cached: the fallback may be switched on or the areas edited
+            return None
+        with self._lock:
+            self._cache[(lat, long)] = address
+            if len(self._cache) > settings.GEOCODER_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return address
+
+
+geocoder = ReverseGeocoder()
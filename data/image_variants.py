@@ -0,0 +1,139 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Name -> bounding box; the aspect ratio is kept and smaller images are not enlarged
+SIZES = {
+    'thumb': (320, 320),
+    'medium': (1024, 1024),
+}
+# Format -> (Pillow format, extension, save options)
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = ThreadPoolExecutor(max_workers=settings.PHOTO_VARIANTS_WORKERS, thread_name_prefix='photo-variants')
+
+
+def variant_name(name, size, extension):
+    """files/object_photo/a.png -> files/object_photo/variants/a_thumb.webp"""
+    directory, filename = os.path.split(name)
+    return os.path.join(directory, 'variants', f'{os.path.splitext(filename)[0]}_{size}.{extension}')
+
+
+def render(image):
+    """{size: {format: bytes}} of a Pillow image."""
+    from PIL import ImageOps
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'L'):
+        # JPEG has no alpha channel, and one image serves both formats
+        image = image.convert('RGB')
+    rendered = {}
+    for size, box in sorted(SIZES.items(), key=lambda item: -item[1][0]):
+        # Largest first, each one shrunk from the previous: cheaper than resampling the original again
+        image = image.copy()
+        image.thumbnail(box)
+        rendered[size] = {}
+        for name, (pillow_format, _, options) in FORMATS.items():
+            output = BytesIO()
+            image.save(output, pillow_format, **options)
+            rendered[size][name] = output.getvalue()
+    return rendered
+
+
+def generate(photo):
+    """
+    Writes the variants of `photo` next to its image and stores their names in `photo.variants`,
+    {size: {format: name}}, then deletes the files of the variants they replace. A file Pillow cannot
+    read (cadastral photos may be PDFs) gets {}.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    storage = photo.image.storage
+    variants = {}
+    try:
+        with storage.open(photo.image.name) as file:
+            image = Image.open(file)
+            # A JPEG is decoded at the smallest scale still larger than the biggest variant
+            image.draft('RGB', max(SIZES.values()))
+            rendered = render(image)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as error:
+        logger.info('No variants for %s: %s', photo.image.name, error)
+    else:
+        for size, encoded in rendered.items():
+            variants[size] = {
+                name: storage.save(variant_name(photo.image.name, size, FORMATS[name][1]), ContentFile(content))
+                for name, content in encoded.items()
+            }
+
+    # update(): saving the photo would send post_save and schedule the variants once more
+    updated = type(photo).objects.filter(pk=photo.pk, image=photo.image.name).update(variants=variants)
+    if updated:
+        stale = paths(photo.variants) - paths(variants)
+    else:
+        # The image was replaced meanwhile: these variants are of the old one, its own run makes the new ones
+        stale = paths(variants)
+    for path in stale:
+        storage.delete(path)
+    photo.variants = variants
+    return variants
+
+
+def paths(variants):
+    return {path for formats in (variants or {}).values() for path in formats.values()}
+
+
+def _generate(model, pk):
+    photo = model.objects.filter(pk=pk).first()
+    if photo is not None:
+        generate(photo)
+        # The listing responses cached meanwhile still point at the original image
+        from .signals import invalidate_responses_of
+        invalidate_responses_of(informative_data_id=photo.informative_data_id)
+
+
+def _generate_in_background(model, pk):
+    close_old_connections()
+    try:
+        _generate(model, pk)
+    except Exception:
+        logger.exception('Generating the variants of %s %s failed', model.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule(photo):
+    """Generates the variants after the commit, in a worker thread unless PHOTO_VARIANTS_BACKGROUND is off."""
+    model, pk = type(photo), photo.pk
+    if settings.PHOTO_VARIANTS_BACKGROUND:
+        transaction.on_commit(lambda: _executor.submit(_generate_in_background, model, pk))
+    else:
+        transaction.on_commit(lambda: _generate(model, pk))
+
+
+def urls(photo, request):
+    """{size: {format: url}} of the variants of `photo`, or None until they are generated; absolute with a request."""
+    if not photo.variants:
+        return None
+    storage = photo.image.storage
+    absolute = request.build_absolute_uri if request is not None else str
+    return {
+        size: {name: absolute(storage.url(path)) for name, path in formats.items()}
+        for size, formats in photo.variants.items()
+    }
+
+
+def thumbnail_url(photo, format='jpeg'):
+    """Relative URL of the thumbnail of `photo`, or of the original image while there is none."""
+    if photo.variants:
+        return photo.image.storage.url(photo.variants['thumb'][format])
+    return photo.image.url
@@ -0,0 +1,180 @@
+import csv
+import io
+
+from django.db import transaction
+
+from . import autocomplete, leaderboards, versions
+from .clusters import rebuild_clusters
+from .geo import grid_cell
+from .models import MainData, InformativeData, FinancialData, AllData, Category, Area, Currency, Status
+from .pricing import refresh_price_usd
+from .search import refresh_search_vectors
+from .serializers import MainDataImportSerializer, InformativeDataImportSerializer, FinancialDataImportSerializer
+
+# Columns of MainData, InformativeData and FinancialData, and the references resolved by LookupMaps;
+# they have the names of the columns of data.exports, so an export can be imported again
+PART_SERIALIZERS = (MainDataImportSerializer, InformativeDataImportSerializer, FinancialDataImportSerializer)
+REFERENCE_COLUMNS = ('category', 'area', 'currency')
+BATCH_SIZE = 500
+
+
+def read_rows(file, filename):
+    """Dicts of the rows of a CSV or XLSX file, by the column names of its first row; empty cells are left out."""
+    if filename.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        values = workbook.active.iter_rows(values_only=True)
+        header = [str(name).strip() if name is not None else '' for name in next(values, ())]
+    else:
+        values = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+        header = [name.strip() for name in next(values, ())]
+    for row in values:
+        yield {
+            name: value.strip() if isinstance(value, str) else value
+            for name, value in zip(header, row) if name and value not in (None, '')
+        }
+
+
+def _key(value):
+    return str(value).strip().casefold()
+
+
+class LookupMaps:
+    """Category, Area and Currency ids by id, by any of their names and by code, loaded once per import."""
+
+    def __init__(self):
+        self.category = {}
+        for row in Category.objects.values('id', 'category', 'category_uz', 'category_ru', 'category_en'):
+            self.category.update({_key(name): row['id'] for name in row.values() if name not in (None, '')})
+        self.area = {}
+        for row in Area.objects.values('id', 'location', 'location_uz', 'location_ru', 'location_en'):
+            self.area.update({_key(name): row['id'] for name in row.values() if name not in (None, '')})
+        self.currency = {}
+        for row in Currency.objects.values('id', 'code'):
+            self.currency.update({_key(row['id']): row['id'], _key(row['code']): row['id']})
+
+    def resolve(self, column, value):
+        return getattr(self, column).get(_key(value))
+
+
+class ImportReport:
+    def __init__(self):
+        self.valid = 0
+        self.created = 0
+        self.approved = 0
+        # (line number, {column: [messages]})
+        self.errors = []
+
+    @property
+    def processed(self):
+        return self.valid + len(self.errors)
+
+
+def describe(errors):
+    """One line of the errors of a row, for reports."""
+    return '; '.join(f'{column}: {" ".join(map(str, messages))}' for column, messages in errors.items())
+
+
+def validate(row, maps, default_status):
+    """(attributes of each part, reference ids, status) of a row, or raises ValueError with the errors by column."""
+    errors = {}
+    parts = []
+    for serializer_class in PART_SERIALIZERS:
+        serializer = serializer_class(data={name: row[name] for name in serializer_class.Meta.fields if name in row})
+        if serializer.is_valid():
+            parts.append(serializer.validated_data)
+        else:
+            errors.update(serializer.errors)
+
+    references = {}
+    for column in REFERENCE_COLUMNS:
+        if column not in row:
+            if column == 'currency':
+                errors[column] = ['Majburiy ustun']
+            continue
+        references[column] = maps.resolve(column, row[column])
+        if references[column] is None:
+            errors[column] = [f'{row[column]!r} topilmadi']
+
+    status = row.get('status', default_status)
+    if status not in Status.values:
+        errors['status'] = [f'{", ".join(Status.values)} dan biri bo\'lishi kerak']
+    if errors:
+        raise ValueError(errors)
+    return parts, references, status
+
+
+def create(batch, user):
+    """Inserts the validated rows of `batch` with one INSERT per table; returns the AllData. Call it in a transaction."""
+    main_data, informative_data, financial_data = [], [], []
+    for (main, informative, financial), references, _ in batch:
+        row = MainData(user=user, category_id=references.get('category'), location_id=references.get('area'), **main)
+        # What MainData.save() would do; bulk_create does not call it
+        row.geo_cell = grid_cell(row.lat, row.long)
+        main_data.append(row)
+        informative_data.append(InformativeData(user=user, **informative))
+        financial_data.append(FinancialData(user=user, currency_id=references['currency'], **financial))
+
+    MainData.objects.bulk_create(main_data)
+    InformativeData.objects.bulk_create(informative_data)
+    FinancialData.objects.bulk_create(financial_data)
+    return AllData.objects.bulk_create([
+        AllData(user=user, main_data=main, informative_data=informative, financial_data=financial, status=status)
+        for main, informative, financial, (*_, status) in zip(main_data, informative_data, financial_data, batch)
+    ])
+
+
+def after_create(all_data):
+    """What the post_save signals of AllData would have done for the rows of one batch."""
+    queryset = AllData.objects.filter(pk__in=[row.pk for row in all_data])
+    refresh_price_usd(queryset.exclude(status=Status.DRAFT))
+    refresh_search_vectors(queryset)
+    for row in all_data:
+        if row.status == Status.APPROVED:
+            autocomplete.index_listing_on_commit(row.pk, row.main_data.enterprise_name)
+
+
+def import_listings(rows, user, status=Status.APPROVED, batch_size=BATCH_SIZE, dry_run=False, progress=None):
+    """
+    Creates a listing of `user` for each valid row of `rows`, as read by read_rows(). A row without a
+    status column gets `status`. Rows are validated against the maps of Category, Area and Currency
+    loaded once, and written `batch_size` at a time; an invalid row is reported and skipped, not
+    written. `progress` is called with the report after each batch.
+    """
+    maps = LookupMaps()
+    report = ImportReport()
+    batch = []
+
+    def flush():
+        if batch and not dry_run:
+            # A batch is written whole or not at all, with its prices and search vectors
+            with transaction.atomic():
+                all_data = create(batch, user)
+                after_create(all_data)
+            report.created += len(all_data)
+            report.approved += sum(row.status == Status.APPROVED for row in all_data)
+        report.valid += len(batch)
+        batch.clear()
+        if progress is not None:
+            progress(report)
+
+    # Line 1 is the header
+    for line, row in enumerate(rows, start=2):
+        try:
+            batch.append(validate(row, maps, status))
+        except ValueError as error:
+            report.errors.append((line, error.args[0]))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    if report.created:
+        versions.bump_on_commit(versions.ALL_LISTINGS)
+        if report.approved:
+            versions.bump_on_commit(versions.LISTINGS)
+            # Cheaper than adding thousands of points one by one
+            rebuild_clusters()
+            for name in leaderboards.BOARDS:
+                leaderboards.refresh(name)
+    return report
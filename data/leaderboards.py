@@ -0,0 +1,63 @@
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import AllData, Status
+
+LEADERBOARD_SIZE = 6
+KEY = 'leaderboard:{}'
+
+
+def most_viewed():
+    return AllData.objects.filter(status=Status.APPROVED).order_by('-view_count', '-id')
+
+
+def top():
+    return AllData.objects.filter(top=True, status=Status.APPROVED).order_by('-date_created', '-id')
+
+
+BOARDS = {
+    'most-viewed': most_viewed,
+    'top': top,
+}
+
+
+class _RelativeUrls:
+    """Stands in for the request while rendering, so the cached rows keep relative photo URLs."""
+
+    @staticmethod
+    def build_absolute_uri(location):
+        return location
+
+
+def render(name):
+    # Imported here: serializers import models, and signals import this module while the app loads
+    from .serializers import AlldateCategorySerializer
+    rows = BOARDS[name]().for_list()[:LEADERBOARD_SIZE]
+    return AlldateCategorySerializer(rows, many=True, context={'request': _RelativeUrls()}).data
+
+
+def refresh(name):
+    data = render(name)
+    try:
+        caches['shared'].set(KEY.format(name), data, None)
+    except Exception:
+        pass
+    return data
+
+
+def refresh_on_commit(*names):
+    transaction.on_commit(lambda: [refresh(name) for name in names])
+
+
+def get(name, request):
+    """The leaderboard from the shared cache, with the photo URLs made absolute for this request."""
+    try:
+        data = caches['shared'].get(KEY.format(name))
+    except Exception:
+        data = None
+    if data is None:
+        data = refresh(name)
+    return [
+        {**row, 'main_obj_photo': [request.build_absolute_uri(url) for url in row['main_obj_photo']]}
+        for row in data
+    ]
@@ -0,0 +1,26 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from data.currency_feeds import FEEDS, FileFeed, get_feed, ingest
+
+
+class Command(BaseCommand):
+    help = 'Store the currency rates of a range of days; days already stored are updated, not duplicated'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', type=date.fromisoformat, required=True, help='YYYY-MM-DD')
+        parser.add_argument('--to', dest='end', type=date.fromisoformat, default=date.today(),
+                            help='YYYY-MM-DD, today by default')
+        parser.add_argument('--feed', choices=sorted(FEEDS), default='cbu')
+        parser.add_argument('--file', help='Read the rates from this JSON file instead of a feed')
+
+    def handle(self, *args, start, end, feed, file, **options):
+        if start > end:
+            raise CommandError('--from is after --to')
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        try:
+            written = ingest(FileFeed(file) if file else get_feed(feed), days)
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(f'{written} rates stored for {len(days)} days'))
@@ -0,0 +1,42 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from data import exports
+
+
+def comma_separated(value):
+    return [item for item in value.split(',') if item]
+
+
+class Command(BaseCommand):
+    help = 'Export the listings or the investor applications as CSV or XLSX, reading the rows in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--file-format', choices=exports.FORMATS, default='csv')
+        parser.add_argument('--columns', type=comma_separated, help='Comma separated, all by default')
+        parser.add_argument('--status', type=comma_separated, help='Comma separated, e.g. Approved,Checking')
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help='YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help='YYYY-MM-DD')
+        parser.add_argument('--output', help='File to write, standard output by default (CSV only)')
+
+    def handle(self, *args, name, file_format, columns, status, date_from, date_to, output, **options):
+        if file_format == 'xlsx' and not output:
+            raise CommandError('XLSX needs --output')
+        try:
+            header, values = exports.rows(name, columns, status, date_from, date_to)
+        except exports.ExportError as error:
+            raise CommandError(error)
+
+        if output is None:
+            for line in exports.csv_lines(header, values):
+                self.stdout.write(line.decode(), ending='')
+            return
+        with open(output, 'wb') as file:
+            if file_format == 'xlsx':
+                exports.write_xlsx(header, values, file)
+            else:
+                for line in exports.csv_lines(header, values):
+                    file.write(line)
+        self.stderr.write(self.style.SUCCESS(f'{name} exported to {output}'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from data import versions
+from data.image_variants import generate
+from data.models import ObjectPhoto, ProductPhoto, CadastralPhoto
+
+
+class Command(BaseCommand):
+    help = 'Generate the thumbnail and medium variants of the listing photos uploaded before they existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate the variants of every photo')
+
+    def handle(self, *args, **options):
+        total = 0
+        for model in (ObjectPhoto, ProductPhoto, CadastralPhoto):
+            photos = model.objects.order_by('pk')
+            if not options['all']:
+                photos = photos.filter(variants__isnull=True)
+            generated = failed = 0
+            for photo in photos.iterator(chunk_size=200):
+                if generate(photo):
+                    generated += 1
+                else:
+                    failed += 1
+            total += generated
+            self.stdout.write(f'{model.__name__}: {generated} generated, {failed} not images')
+        if total:
+            # The cached listing responses still point at the original images
+            versions.bump(versions.LISTINGS)
+            versions.bump(versions.ALL_LISTINGS)
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from data.imports import BATCH_SIZE, describe, import_listings, read_rows
+from data.models import Status
+
+
+class Command(BaseCommand):
+    help = ('Create listings from a CSV or XLSX file with the columns of export_data; '
+            'invalid rows are reported and skipped')
+
+    def add_arguments(self, parser):
+        parser.add_argument('file')
+        parser.add_argument('--user', required=True, help='E-mail of the user the listings belong to')
+        parser.add_argument('--status', choices=Status.values, default=Status.APPROVED,
+                            help='Status of the rows without a status column')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the rows')
+
+    def handle(self, *args, file, user, status, batch_size, dry_run, **options):
+        owner = User.objects.filter(email=user).first()
+        if owner is None:
+            raise CommandError(f'No user with the e-mail {user}')
+
+        def progress(report):
+            self.stderr.write(f'{report.processed} rows read, {report.valid} valid, {len(report.errors)} invalid')
+
+        try:
+            with open(file, 'rb') as source:
+                report = import_listings(read_rows(source, file), owner, status, batch_size, dry_run, progress)
+        except OSError as error:
+            raise CommandError(error)
+
+        for line, errors in report.errors:
+            self.stdout.write(f'{line}: {describe(errors)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.created} listings created, {len(report.errors)} rows skipped' if not dry_run else
+            f'{report.valid} rows valid, {len(report.errors)} invalid'))
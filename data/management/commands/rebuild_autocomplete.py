@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from data.autocomplete import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the autocomplete prefix index from the approved listings and the categories'
+
+    def handle(self, *args, **options):
+        indexed = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{indexed} listings and categories indexed'))
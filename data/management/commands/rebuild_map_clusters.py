@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from data.clusters import rebuild_clusters
+from data.models import MapCluster
+
+
+class Command(BaseCommand):
+    help = 'Recompute the map clusters of every zoom level from the approved listings'
+
+    def handle(self, *args, **options):
+        rebuild_clusters()
+        self.stdout.write(self.style.SUCCESS(f'{MapCluster.objects.count()} clusters built'))
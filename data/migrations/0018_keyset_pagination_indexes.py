@@ -0,0 +1,29 @@
+# Generated by Django 4.2.1 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0017_intro_text_2_en_intro_text_2_ru_intro_text_2_uz'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alldata',
+            index=models.Index(fields=['status', '-date_created', '-id'], name='alldata_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alldata',
+            index=models.Index(fields=['status', '-view_count', '-id'], name='alldata_status_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alldata',
+            index=models.Index(fields=['-date_created', '-id'], name='alldata_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='investorinfo',
+            index=models.Index(fields=['-date_created', '-id'], name='investorinfo_created_idx'),
+        ),
+    ]
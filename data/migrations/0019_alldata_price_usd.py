@@ -0,0 +1,52 @@
+# Generated by Django 4.2.1 on 2026-10-18 16:54
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def fill_price_usd(apps, schema_editor):
+    AllData = apps.get_model('data', 'AllData')
+    CurrencyPrice = apps.get_model('data', 'CurrencyPrice')
+
+    rates = {}
+    for code in ('USD', 'EUR', 'GBP'):
+        rates[code] = CurrencyPrice.objects.filter(code=code).order_by('-date', '-id').values_list(
+            'cb_price', flat=True).first()
+    usd = rates['USD']
+    factors = {
+        'USD': Decimal(1),
+        'UZS': Decimal(1) / usd if usd else None,
+        'EUR': rates['EUR'] / usd if rates['EUR'] and usd else None,
+        'GBP': rates['GBP'] / usd if rates['GBP'] and usd else None,
+    }
+
+    batch = []
+    for all_data in AllData.objects.select_related('financial_data__currency').iterator(chunk_size=2000):
+        factor = factors.get(all_data.financial_data.currency.code, Decimal(1))
+        all_data.price_usd = None if factor is None else all_data.financial_data.authorized_capital * factor
+        batch.append(all_data)
+        if len(batch) == 2000:
+            AllData.objects.bulk_update(batch, ['price_usd'])
+            batch = []
+    AllData.objects.bulk_update(batch, ['price_usd'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0018_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alldata',
+            name='price_usd',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=24, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='alldata',
+            index=models.Index(fields=['status', 'price_usd'], name='alldata_status_price_idx'),
+        ),
+        migrations.RunPython(fill_price_usd, migrations.RunPython.noop),
+    ]
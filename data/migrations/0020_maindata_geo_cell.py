@@ -0,0 +1,43 @@
+# Generated by Django 4.2.1 on 2026-10-18 16:56
+
+import math
+
+from django.db import migrations, models
+
+# data.geo.grid_cell as it was when this migration was written: 0.1 degree cells, 3600 to a row
+GRID_SIZE = 0.1
+GRID_COLUMNS = 3600
+
+
+def grid_cell(lat, long):
+    row = int(math.floor((float(lat) + 90) / GRID_SIZE))
+    column = int(math.floor((float(long) + 180) / GRID_SIZE)) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def fill_geo_cell(apps, schema_editor):
+    MainData = apps.get_model('data', 'MainData')
+    batch = []
+    for main_data in MainData.objects.only('id', 'lat', 'long').iterator(chunk_size=2000):
+        main_data.geo_cell = grid_cell(main_data.lat, main_data.long)
+        batch.append(main_data)
+        if len(batch) == 2000:
+            MainData.objects.bulk_update(batch, ['geo_cell'])
+            batch = []
+    MainData.objects.bulk_update(batch, ['geo_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0019_alldata_price_usd'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='maindata',
+            name='geo_cell',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_geo_cell, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.1 on 2026-10-18 16:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0020_maindata_geo_cell'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('x', models.IntegerField()),
+                ('y', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('lat_sum', models.FloatField(default=0)),
+                ('long_sum', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='mapcluster',
+            constraint=models.UniqueConstraint(fields=('zoom', 'x', 'y'), name='mapcluster_zoom_cell_unique'),
+        ),
+    ]
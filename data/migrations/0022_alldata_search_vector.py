@@ -0,0 +1,50 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:02
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import F, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Concat
+
+
+# data.search.search_vector as it was when this migration was written
+def text(model, outer_field, *fields):
+    parts = [part for field in fields for part in (Value(' '), F(field))][1:]
+    value = Concat(*parts, output_field=TextField()) if len(parts) > 1 else F(fields[0])
+    return Subquery(model.objects.filter(pk=OuterRef(outer_field)).annotate(text=value).values('text')[:1])
+
+
+def fill_search_vector(apps, schema_editor):
+    AllData = apps.get_model('data', 'AllData')
+    MainData = apps.get_model('data', 'MainData')
+    InformativeData = apps.get_model('data', 'InformativeData')
+    AllData.objects.update(search_vector=(
+        SearchVector(text(MainData, 'main_data_id', 'enterprise_name'), weight='A', config='simple')
+        + SearchVector(text(MainData, 'main_data_id', 'field_of_activity', 'category__category_uz',
+                            'category__category_ru', 'category__category_en'), weight='B', config='simple')
+        + SearchVector(text(MainData, 'main_data_id', 'location__location_uz', 'location__location_ru',
+                            'location__location_en'), weight='C', config='simple')
+        + SearchVector(text(InformativeData, 'informative_data_id', 'product_info'), weight='D', config='simple')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0021_mapcluster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alldata',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        # Filled before the index is built
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='alldata',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='alldata_search_idx'),
+        ),
+    ]
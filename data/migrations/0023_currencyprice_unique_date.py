@@ -0,0 +1,39 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:15
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.utils.timezone
+
+
+def remove_duplicate_prices(apps, schema_editor):
+    # The old cron added a row on every run; the newest row of each currency and day is kept
+    CurrencyPrice = apps.get_model('data', 'CurrencyPrice')
+    duplicates = CurrencyPrice.objects.values('currency_id', 'date').annotate(
+        keep=Max('id'), rows=Count('id')).filter(rows__gt=1)
+    for duplicate in duplicates:
+        CurrencyPrice.objects.filter(currency_id=duplicate['currency_id'], date=duplicate['date']).exclude(
+            id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0022_alldata_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='currencyprice',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AddIndex(
+            model_name='currencyprice',
+            index=models.Index(fields=['code', '-date', '-id'], name='currencyprice_code_date_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_prices, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='currencyprice',
+            constraint=models.UniqueConstraint(fields=('currency', 'date'), name='currencyprice_currency_date_unique'),
+        ),
+    ]
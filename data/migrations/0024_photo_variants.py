@@ -0,0 +1,28 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0023_currencyprice_unique_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cadastralphoto',
+            name='variants',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='objectphoto',
+            name='variants',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='productphoto',
+            name='variants',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0025_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alldata',
+            index=models.Index(fields=['-view_count', '-id'], name='alldata_views_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0026_alldata_views_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='writing_since',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0027_uploadsession_writing_since'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewCountFlush',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch', models.CharField(max_length=36, unique=True)),
+                ('applied_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -1,3 +1,7 @@
+import uuid
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 from django.utils.timezone import now
@@ -5,6 +9,7 @@ from phonenumber_field.modelfields import PhoneNumberField
 from django.core.exceptions import ValidationError
 
 from accounts.models import User
+from .geo import grid_cell
 
 
 class Status(models.TextChoices):
@@ -35,9 +40,10 @@ class Currency(models.Model):
     name = models.CharField(max_length=30)
 
     def save(self, *args, **kwargs):
-        existing_count = AllData.objects.count()
+        # At most 4 currencies; existing ones can still be edited
+        existing_count = Currency.objects.count()
 
-        if existing_count >= 4:
+        if self._state.adding and existing_count >= 4:
             return
 
         super().save(*args, **kwargs)
@@ -50,9 +56,19 @@ class CurrencyPrice(models.Model):
     code = models.CharField(max_length=4)
     name = models.CharField(max_length=30)
     cb_price = models.DecimalField(max_digits=12, decimal_places=2)
-    date = models.DateField(auto_now=True)
+    # Day the rate is valid for; data.currency_feeds.ingest keeps one row per currency and day
+    date = models.DateField(default=timezone.localdate)
     currency = models.ForeignKey(Currency, on_delete=models.PROTECT, related_name='prices')
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='currencyprice_currency_date_unique'),
+        ]
+        indexes = [
+            # Latest rate of a code (data.rates.load_latest_rates)
+            models.Index(fields=['code', '-date', '-id'], name='currencyprice_code_date_idx'),
+        ]
+
     def __str__(self):
         return self.code
 
@@ -64,6 +80,8 @@ class MainData(models.Model):
                                  default=None)
     lat = models.DecimalField(max_digits=22, decimal_places=18, default=0)
     long = models.DecimalField(max_digits=22, decimal_places=18, default=0)
+    # data.geo grid cell of (lat, long), kept up to date by save()
+    geo_cell = models.BigIntegerField(blank=True, null=True, editable=False, db_index=True)
     field_of_activity = models.CharField(max_length=30, default='')
     infrastructure = models.CharField(max_length=30, default='')
     project_staff = models.DecimalField(max_digits=4, decimal_places=0, default=0)
@@ -76,6 +94,13 @@ class MainData(models.Model):
     def __str__(self):
         return self.enterprise_name + ' model'
 
+    def save(self, *args, **kwargs):
+        self.geo_cell = grid_cell(self.lat, self.long)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'lat', 'long'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geo_cell'}
+        return super(MainData, self).save(*args, **kwargs)
+
 
 class InformativeData(models.Model):
     product_info = models.CharField(max_length=256, default='')
@@ -96,16 +121,22 @@ class InformativeData(models.Model):
 class ProductPhoto(models.Model):
     image = models.FileField(upload_to='files/product_photo/')
     informative_data = models.ForeignKey(InformativeData, on_delete=models.CASCADE, related_name='product_photo_list')
+    # {size: {format: file name}} from data.image_variants; null until generated
+    variants = models.JSONField(null=True, blank=True, editable=False)
 
 
 class CadastralPhoto(models.Model):
     image = models.FileField(upload_to='files/cadastral_photo/')
     informative_data = models.ForeignKey(InformativeData, on_delete=models.CASCADE, related_name='cadastral_info_list')
+    # {size: {format: file name}} from data.image_variants; null until generated
+    variants = models.JSONField(null=True, blank=True, editable=False)
 
 
 class ObjectPhoto(models.Model):
     image = models.ImageField(upload_to='files/object_photo/')
     informative_data = models.ForeignKey(InformativeData, on_delete=models.CASCADE, related_name='object_foto')
+    # {size: {format: file name}} from data.image_variants; null until generated
+    variants = models.JSONField(null=True, blank=True, editable=False)
 
 
 class FinancialData(models.Model):
@@ -124,6 +155,16 @@ class FinancialData(models.Model):
         return f'{self.investment_direction} {self.major_shareholders}' + ' model'
 
 
+class AllDataQuerySet(models.QuerySet):
+    def for_list(self):
+        """Listing cards: one joined query for the rows plus one for their photos, whatever the page size."""
+        return self.select_related(
+            'main_data__category', 'main_data__location', 'informative_data',
+        ).prefetch_related(
+            models.Prefetch('informative_data__object_foto', queryset=ObjectPhoto.objects.order_by('id')),
+        ).defer('search_vector')
+
+
 class AllData(models.Model):
     main_data = models.OneToOneField(MainData, on_delete=models.CASCADE, related_name='all_data')
     informative_data = models.OneToOneField(InformativeData, on_delete=models.CASCADE, related_name='all_data')
@@ -132,12 +173,29 @@ class AllData(models.Model):
     date_created = models.DateTimeField(auto_now_add=True)
     view_count = models.IntegerField(default=0)
     top = models.BooleanField(default=False)
+    # financial_data.authorized_capital in US dollars, maintained by data.pricing.refresh_price_usd
+    price_usd = models.DecimalField(max_digits=24, decimal_places=2, blank=True, null=True, editable=False)
+    # Names, activity, product info and category/area names in all languages, maintained by data.search
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
     status = models.CharField(
         max_length=10,
         choices=Status.choices,
         default=Status.DRAFT,
     )
 
+    objects = AllDataQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # KeysetPagination orderings
+            models.Index(fields=['status', '-date_created', '-id'], name='alldata_status_created_idx'),
+            models.Index(fields=['status', '-view_count', '-id'], name='alldata_status_views_idx'),
+            models.Index(fields=['-date_created', '-id'], name='alldata_created_idx'),
+            models.Index(fields=['-view_count', '-id'], name='alldata_views_idx'),
+            models.Index(fields=['status', 'price_usd'], name='alldata_status_price_idx'),
+            GinIndex(fields=['search_vector'], name='alldata_search_idx'),
+        ]
+
     def __str__(self):
         return f'{self.main_data.enterprise_name} {self.date_created}'
 
@@ -146,6 +204,30 @@ class AllData(models.Model):
     #     return super(AllData, self).save(*args, **kwargs)
 
 
+class MapCluster(models.Model):
+    """Approved listings aggregated per map cell and zoom level, maintained by data.clusters."""
+    zoom = models.PositiveSmallIntegerField()
+    x = models.IntegerField()
+    y = models.IntegerField()
+    count = models.IntegerField(default=0)
+    lat_sum = models.FloatField(default=0)
+    long_sum = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['zoom', 'x', 'y'], name='mapcluster_zoom_cell_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.zoom}/{self.x}/{self.y}: {self.count}'
+
+
+class ViewCountFlush(models.Model):
+    """A batch of buffered views data.counters.flush_views() has applied, so that it is never applied twice."""
+    batch = models.CharField(max_length=36, unique=True)
+    applied_at = models.DateTimeField(auto_now_add=True)
+
+
 # class Investment(models.Model):
 #     export_share_product = models.DecimalField(max_digits=6, decimal_places=0, default=0)
 #     authorized_capital = models.DecimalField(max_digits=6, decimal_places=0, default=0)
@@ -178,6 +260,11 @@ class InvestorInfo(models.Model):
     # date_created = models.DateTimeField(auto_now_add=True)
     date_created = models.DateTimeField(blank=True, null=True, default=None)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date_created', '-id'], name='investorinfo_created_idx'),
+        ]
+
     def __str__(self):
         return self.user_name
 
@@ -264,3 +351,26 @@ class Card(models.Model):
 # Remove in the server all tables from models, views, serializers and cetera
 # python3 manage.py makemigrations app_name
 # python3 manage.py migrate app_name
+
+
+class UploadSession(models.Model):
+    """A resumable upload (data.uploads): the file grows chunk by chunk in UPLOAD_SESSIONS_DIR until it is attached."""
+
+    class Kind(models.TextChoices):
+        IMAGE = 'image', 'SmartNote image'
+        VIDEO = 'video', 'SmartNote video'
+        OBJECT_PHOTO = 'object_photo', 'Object photo'
+        PRODUCT_PHOTO = 'product_photo', 'Product photo'
+        CADASTRAL_PHOTO = 'cadastral_photo', 'Cadastral photo'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    # Bytes received so far; the next chunk starts here
+    offset = models.BigIntegerField(default=0)
+    # Set while a chunk is being written, so that a second request for the same offset is turned away
+    writing_since = models.DateTimeField(blank=True, null=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,160 @@
+import base64
+import json
+from datetime import date, datetime
+from functools import reduce
+from operator import and_, or_
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination: the cursor stores the sort key of the last row of the page, and the next page
+    starts with a `WHERE (key) < (cursor)` range condition instead of an OFFSET, so every page costs the same.
+
+    The sort key always ends with `id`, which makes it unique, so ties on `view_count` or `date_created` do not
+    repeat or skip rows. Each ordering must be backed by an index in the same column order.
+
+    Clients opt in by sending `cursor` or `page_size`. Without them the full list is returned, as before,
+    while `settings.DATA_LEGACY_UNPAGINATED_LISTS` is on. Endpoints without old clients set `always_paginate`.
+    """
+    always_paginate = False
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    sort_query_param = 'sort'
+    # Each has an index of AllData in the same column order, with and without a leading status
+    orderings = {
+        'date': ('-date_created', '-id'),
+        'views': ('-view_count', '-id'),
+    }
+    default_sort = 'date'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (not self.always_paginate and getattr(settings, 'DATA_LEGACY_UNPAGINATED_LISTS', True)
+                and not self.is_requested(request)):
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.sort = request.query_params.get(self.sort_query_param, self.default_sort)
+        if self.sort not in self.orderings:
+            self.sort = self.default_sort
+        self.ordering = self.orderings[self.sort]
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(position, queryset.model))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def seek_filter(self, position, model):
+        """
+        Rows strictly after `position` in `self.ordering`, expanded as (a < x) OR (a = x AND b < y) ...
+
+        That OR alone is not an index range condition: PostgreSQL would read every row before the cursor and
+        filter them out. So the expansion is ANDed with a plain bound on the leading column, `a <= x`, which
+        the index scan starts from, and deep pages cost as much as the first one.
+        """
+        branches = []
+        for index, (field, value) in enumerate(position):
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            nullable = model._meta.get_field(name).null
+            equal = [Q(**{f.lstrip('-'): v}) if v is not None else Q(**{f'{f.lstrip("-")}__isnull': True})
+                     for f, v in position[:index]]
+            if value is None:
+                # PostgreSQL sorts NULL first in DESC and last in ASC order, the same way the index does
+                beyond = Q(**{f'{name}__isnull': False}) if descending else Q(pk__in=[])
+            elif descending:
+                beyond = Q(**{f'{name}__lt': value})
+            else:
+                beyond = Q(**{f'{name}__gt': value})
+                if nullable:
+                    beyond |= Q(**{f'{name}__isnull': True})
+            branches.append(reduce(and_, equal + [beyond]))
+        seek = reduce(or_, branches)
+
+        field, value = position[0]
+        name = field.lstrip('-')
+        # Rows with NULL come after every value in ASC order, so a nullable ASC column cannot be bounded
+        if value is not None and (field.startswith('-') or not model._meta.get_field(name).null):
+            seek &= Q(**{f'{name}__lte' if field.startswith('-') else f'{name}__gte': value})
+        return seek
+
+    def encode_cursor(self, instance):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            values.append(value.isoformat() if isinstance(value, (date, datetime)) else value)
+        payload = json.dumps({'s': self.sort, 'v': values}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            if payload['s'] != self.sort or len(payload['v']) != len(self.ordering):
+                raise ValueError
+            return [
+                (field, None if value is None else model._meta.get_field(field.lstrip('-')).to_python(value))
+                for field, value in zip(self.ordering, payload['v'])
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class AlwaysKeysetPagination(KeysetPagination):
+    always_paginate = True
+
+
+class InvestorInfoKeysetPagination(KeysetPagination):
+    orderings = {
+        'date': ('-date_created', '-id'),
+    }
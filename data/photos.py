@@ -0,0 +1,27 @@
+from . import image_variants
+
+
+def add_photos(model, informative_data, images):
+    """
+    Inserts the photos of `images` in one statement. bulk_create sends no post_save, so the variants
+    are scheduled here; the caller invalidates the cached listing responses.
+    """
+    photos = model.objects.bulk_create([model(informative_data=informative_data, image=image) for image in images])
+    for photo in photos:
+        image_variants.schedule(photo)
+    return photos
+
+
+def sync_photos(model, informative_data, keep_ids, images):
+    """
+    Leaves the photos of `informative_data` whose id is in `keep_ids` as they are, deletes the others
+    in one statement and adds `images`. Returns (number deleted, photos added).
+    """
+    from .signals import invalidate_responses_of
+
+    deleted, _ = model.objects.filter(informative_data=informative_data).exclude(pk__in=keep_ids).delete()
+    added = add_photos(model, informative_data, images) if images else []
+    if added:
+        # Deleting sends post_delete, which invalidates as well; the insert does not
+        invalidate_responses_of(informative_data=informative_data)
+    return deleted, added
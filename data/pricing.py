@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+from django.db.models import Case, When, Value, F, DecimalField, ExpressionWrapper, OuterRef, Subquery
+
+from .models import AllData, FinancialData
+from .rates import rate_table
+
+PRICE_FIELD = DecimalField(max_digits=24, decimal_places=2)
+# UZS -> USD factors are around 0.00008, so they need far more places than the price itself
+FACTOR_FIELD = DecimalField(max_digits=38, decimal_places=20)
+
+
+def usd_factors(rates):
+    """
+    Multipliers that turn an amount in each currency into US dollars.
+    A factor is None when a rate it needs is missing, which leaves the price NULL.
+    """
+    usd = rates.get('USD')
+    factors = {'USD': Decimal(1), 'UZS': Decimal(1) / usd if usd else None}
+    for code in ('EUR', 'GBP'):
+        rate = rates.get(code)
+        factors[code] = rate / usd if rate and usd else None
+    return factors
+
+
+def price_usd_subquery(factors):
+    price = ExpressionWrapper(
+        F('authorized_capital') * Case(
+            *[When(currency__code=code, then=Value(factor, output_field=FACTOR_FIELD))
+              for code, factor in factors.items()],
+            default=Value(Decimal(1), output_field=FACTOR_FIELD),
+            output_field=FACTOR_FIELD,
+        ),
+        output_field=PRICE_FIELD,
+    )
+    return Subquery(
+        FinancialData.objects.filter(pk=OuterRef('financial_data_id')).annotate(price=price).values('price')[:1],
+        output_field=PRICE_FIELD,
+    )
+
+
+def refresh_price_usd(queryset=None, rates=None):
+    """Recalculate `AllData.price_usd` for `queryset` (all listings by default) in a single UPDATE."""
+    if queryset is None:
+        queryset = AllData.objects.all()
+    factors = usd_factors(rate_table.get() if rates is None else rates)
+    return queryset.update(price_usd=price_usd_subquery(factors))
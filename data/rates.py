@@ -0,0 +1,73 @@
+import threading
+import time
+from uuid import uuid4
+
+from django.core.cache import caches
+
+from .models import CurrencyPrice
+
+RATE_CODES = ('USD', 'EUR', 'GBP')
+VERSION_KEY = 'currency-rates:version'
+# How long a worker trusts its table before comparing versions with the shared cache again
+CHECK_INTERVAL = 30
+
+
+def load_latest_rates():
+    """Latest central bank price in UZS for every currency the listings can be priced in."""
+    rates = {}
+    for code in RATE_CODES:
+        rates[code] = CurrencyPrice.objects.filter(code=code).order_by('-date', '-id').values_list(
+            'cb_price', flat=True).first()
+    return rates
+
+
+class RateTable:
+    """
+    Per-process copy of the latest exchange rates.
+
+    The table is loaded from the database once and then served from memory. Every worker compares its
+    version with the one in the shared cache at most every CHECK_INTERVAL seconds; `invalidate()`
+    stores a new version there, so all workers reload on their next lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rates = None
+        self._version = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def shared_version():
+        cache = caches['shared']
+        try:
+            version = cache.get(VERSION_KEY)
+            if version is None:
+                cache.add(VERSION_KEY, uuid4().hex, None)
+                version = cache.get(VERSION_KEY)
+            return version
+        except Exception:
+            # Without the shared cache every check reloads, which is what the table replaced
+            return None
+
+    def get(self):
+        if self._rates is not None and time.monotonic() - self._checked_at < CHECK_INTERVAL:
+            return self._rates
+        with self._lock:
+            # Read the version before the rates: a concurrent update then only causes an extra reload
+            version = self.shared_version()
+            if self._rates is None or version is None or version != self._version:
+                self._rates = load_latest_rates()
+                self._version = version
+            self._checked_at = time.monotonic()
+            return self._rates
+
+    def invalidate(self):
+        try:
+            caches['shared'].set(VERSION_KEY, uuid4().hex, None)
+        except Exception:
+            pass
+        with self._lock:
+            self._rates = None
+
+
+rate_table = RateTable()
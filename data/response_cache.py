@@ -0,0 +1,53 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import translation
+from rest_framework.response import Response
+
+from . import versions
+
+
+def cache_key(request, group):
+    """Key of the response for this URL, query parameters in any order and language, under the version of `group`."""
+    version = versions.get(group)
+    if version is None:
+        return None
+    params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+    identity = repr((request.build_absolute_uri(request.path), translation.get_language(), params))
+    return f'response:{group}:{version[0]}:{hashlib.sha1(identity.encode()).hexdigest()}'
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Serves `list` to anonymous users from the shared cache.
+
+    The key contains the version of `response_cache_group`, which the signals bump after any change to the
+    listings the endpoint can show, so a changed listing is never served from the cache. Entries of old
+    versions are left to expire after DATA_RESPONSE_CACHE_TIMEOUT seconds; 0 turns the cache off.
+    """
+    response_cache_group = versions.LISTINGS
+
+    def list(self, request, *args, **kwargs):
+        key = None
+        if settings.DATA_RESPONSE_CACHE_TIMEOUT and not request.user.is_authenticated:
+            key = cache_key(request, self.response_cache_group)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+
+        cache = caches['shared']
+        try:
+            data = cache.get(key)
+        except Exception:
+            data = None
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            try:
+                cache.set(key, response.data, settings.DATA_RESPONSE_CACHE_TIMEOUT)
+            except Exception:
+                pass
+            response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,58 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import F, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Concat
+
+from .models import AllData, MainData, InformativeData
+
+# No stemming: the listings are written in Uzbek, Russian and English
+SEARCH_CONFIG = 'simple'
+# Words of the query beyond this are ignored
+MAX_TERMS = 8
+# SearchData returns the best matches only, so a common prefix does not rank the whole table into the response
+MAX_RESULTS = 100
+WORD = re.compile(r'[^\W_]+')
+
+
+def _text(model, outer_field, *fields):
+    # Related text of the updated AllData row, joined with spaces; CONCAT skips NULLs
+    parts = [part for field in fields for part in (Value(' '), F(field))][1:]
+    text = Concat(*parts, output_field=TextField()) if len(parts) > 1 else F(fields[0])
+    return Subquery(model.objects.filter(pk=OuterRef(outer_field)).annotate(text=text).values('text')[:1])
+
+
+def search_vector():
+    """Weighted tsvector of an AllData row."""
+    return (
+        SearchVector(_text(MainData, 'main_data_id', 'enterprise_name'), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(_text(MainData, 'main_data_id', 'field_of_activity', 'category__category_uz',
+                             'category__category_ru', 'category__category_en'), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(_text(MainData, 'main_data_id', 'location__location_uz', 'location__location_ru',
+                             'location__location_en'), weight='C', config=SEARCH_CONFIG)
+        + SearchVector(_text(InformativeData, 'informative_data_id', 'product_info'), weight='D',
+                       config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(queryset=None):
+    """Reindex the listings of `queryset` (all of them by default) with one UPDATE."""
+    queryset = AllData.objects.all() if queryset is None else queryset
+    return queryset.update(search_vector=search_vector())
+
+
+def parse_query(text):
+    """Prefix query matching every word of `text`, so results show up while the user is still typing."""
+    terms = WORD.findall(text.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    return SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search(queryset, text):
+    """Rows of `queryset` matching `text`, best match first."""
+    query = parse_query(text)
+    if query is None:
+        return queryset.none()
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)).order_by('-rank', '-date_created', '-id')
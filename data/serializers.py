@@ -1,15 +1,18 @@
 from rest_framework import serializers
 from accounts.models import User  # accounts app dan User modelini import qiling
 
+from django.conf import settings
 from django.core.files.base import ContentFile
 import base64
 import six
 import uuid
 
+from . import image_variants
+from .photos import sync_photos
 from .models import (
     MainData, InformativeData, FinancialData, ObjectPhoto, AllData,
     InvestorInfo, Category, Area, SmartNote, Currency, Faq, CadastralPhoto, ProductPhoto, Status, Image, Video,
-    AboutDocument, Intro, Devices, Card
+    AboutDocument, Intro, Devices, Card, UploadSession
 )
 
 
@@ -73,7 +76,9 @@ class AlldateCategorySerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request is None:
             return None
-        image_urls = [request.build_absolute_uri(photo.image.url) for photo in informative_model_photos]
+        image_urls = [
+            request.build_absolute_uri(image_variants.thumbnail_url(photo)) for photo in informative_model_photos
+        ]
         return image_urls
 
 
@@ -123,26 +128,43 @@ class Base64ImageField(serializers.ImageField):
         return extension
 
 
+class PhotoVariantsField(serializers.Field):
+    """Absolute URLs of the thumbnail and medium size of a photo, {size: {format: url}}; null until generated."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, photo):
+        return image_variants.urls(photo, self.context.get('request'))
+
+
 class ObjectPhotoSerializer(serializers.ModelSerializer):
     # image = Base64ImageField(max_length=None, use_url=True)
+    variants = PhotoVariantsField()
 
     class Meta:
         model = ObjectPhoto
-        fields = ('id', 'image',)
+        fields = ('id', 'image', 'variants')
 
 
 # Temur
 
 class CadastraInfoSerializer(serializers.ModelSerializer):
+    variants = PhotoVariantsField()
+
     class Meta:
         model = CadastralPhoto
-        fields = ('id', 'informative_data', 'image',)
+        fields = ('id', 'informative_data', 'image', 'variants')
 
 
 class ProductPhotoSerializer(serializers.ModelSerializer):
+    variants = PhotoVariantsField()
+
     class Meta:
         model = ProductPhoto
-        fields = ('id', 'informative_data', 'image',)
+        fields = ('id', 'informative_data', 'image', 'variants')
 
 
 class InformativeProDataSerializer(serializers.ModelSerializer):
@@ -164,17 +186,32 @@ class InformativeProDataSerializer(serializers.ModelSerializer):
         write_only=True
     )
 
+    # Saqlanib qoladigan rasmlar id lari: yuborilsa, ro'yxatda yo'q rasmlargina o'chiriladi
+    # va yangi fayllar qo'shiladi. Yuborilmasa, yangi fayllar eski rasmlar o'rnini egallaydi
+    keep_cadastral_info = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)
+    keep_product_photo = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)
+    keep_object_photo = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)
+
+    # Photo field -> (model, field of the ids to keep)
+    photo_fields = {
+        'cadastral_info': (CadastralPhoto, 'keep_cadastral_info'),
+        'product_photo': (ProductPhoto, 'keep_product_photo'),
+        'object_photo': (ObjectPhoto, 'keep_object_photo'),
+    }
+
     class Meta:
         model = InformativeData
         fields = ('product_info', 'project_capacity', 'total_area', 'formation_date',
                   'building_area', 'tech_equipment',
                   'cadastral_info', 'product_photo', 'object_photo',
+                  'keep_cadastral_info', 'keep_product_photo', 'keep_object_photo',
                   'object_foto', 'cadastral_info_list', 'product_photo_list')
 
     def update(self, instance, validated_data):
-        cadastral_info_data = validated_data.pop('cadastral_info', [])
-        product_photo_data = validated_data.pop('product_photo', [])
-        object_photos_data = validated_data.pop('object_photo', [])
+        photos = {
+            field: (validated_data.pop(field, None), validated_data.pop(keep_field, None))
+            for field, (_, keep_field) in self.photo_fields.items()
+        }
 
         # Obyektni yangilash
         instance.product_info = validated_data.get('product_info', instance.product_info)
@@ -185,18 +222,12 @@ class InformativeProDataSerializer(serializers.ModelSerializer):
         instance.tech_equipment = validated_data.get('tech_equipment', instance.tech_equipment)
         instance.save()
 
-        instance.cadastral_info_list.all().delete()
-        # CadastralPhoto obyektlarini yaratish va informative_data ni bog'lash
-        [CadastralPhoto.objects.create(image=image_data, informative_data=instance) for
-         image_data in cadastral_info_data]
-        instance.product_photo_list.all().delete()
-
-        [ProductPhoto.objects.create(image=photo_data, informative_data=instance) for
-         photo_data in product_photo_data]
-        instance.object_foto.all().delete()
-
-        [ObjectPhoto.objects.create(image=obhect_data, informative_data=instance) for
-         obhect_data in object_photos_data]
+        for field, (images, keep_ids) in photos.items():
+            if images is None and keep_ids is None:
+                continue  # Bu turdagi rasmlarga tegilmaydi
+            # Saqlanadigan rasmlar qayta yozilmaydi, qolganlari bitta so'rovda o'chiriladi,
+            # yangilari bitta so'rovda qo'shiladi
+            sync_photos(self.photo_fields[field][0], instance, keep_ids or [], images or [])
 
         return instance
 
@@ -319,6 +350,31 @@ class AllDataSerializer(serializers.ModelSerializer):
         }
 
 
+class PhotoUpdateSerializerMixin(serializers.Serializer):
+    """A photo of AllDataUpdateSerializer: one with an `id` is kept as it is, one with an `image` is added."""
+    id = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if 'id' not in attrs and 'image' not in attrs:
+            raise serializers.ValidationError("`id` yoki `image` yuborilishi kerak")
+        return attrs
+
+
+class ObjectPhotoUpdateSerializer(PhotoUpdateSerializerMixin, ObjectPhotoSerializer):
+    class Meta(ObjectPhotoSerializer.Meta):
+        extra_kwargs = {'image': {'required': False}}
+
+
+class ProductPhotoUpdateSerializer(PhotoUpdateSerializerMixin, ProductPhotoSerializer):
+    class Meta(ProductPhotoSerializer.Meta):
+        extra_kwargs = {'image': {'required': False}, 'informative_data': {'read_only': True}}
+
+
+class CadastralPhotoUpdateSerializer(PhotoUpdateSerializerMixin, CadastraInfoSerializer):
+    class Meta(CadastraInfoSerializer.Meta):
+        extra_kwargs = {'image': {'required': False}, 'informative_data': {'read_only': True}}
+
+
 # !!!!!!!!!!!!
 class AllDataUpdateSerializer(serializers.ModelSerializer):
     main_data = MainDataRetrieveSerializer()
@@ -327,9 +383,11 @@ class AllDataUpdateSerializer(serializers.ModelSerializer):
     status = serializers.CharField(read_only=True)  # status o'zgartirilmaydi
 
     # ✅ Yangi qo‘shilgan serializer`lar
-    product_photos = ProductPhotoSerializer(many=True, required=False, source='informative_data.product_photo_list')
-    cadastral_photos = CadastraInfoSerializer(many=True, required=False, source='informative_data.cadastral_info_list')
-    object_photos = ObjectPhotoSerializer(many=True, required=False, source='informative_data.object_foto')
+    product_photos = ProductPhotoUpdateSerializer(many=True, required=False,
+                                                  source='informative_data.product_photo_list')
+    cadastral_photos = CadastralPhotoUpdateSerializer(many=True, required=False,
+                                                      source='informative_data.cadastral_info_list')
+    object_photos = ObjectPhotoUpdateSerializer(many=True, required=False, source='informative_data.object_foto')
 
     class Meta:
         model = AllData
@@ -351,6 +409,12 @@ class AllDataUpdateSerializer(serializers.ModelSerializer):
         main_data_data = validated_data.pop('main_data', None)
         informative_data_data = validated_data.pop('informative_data', {})  # ✅ None bo‘lsa, bo‘sh dict qilib olamiz
         financial_data_data = validated_data.pop('financial_data', None)
+        # Rasmlar alohida yangilanadi: teskari bog'lanishga to'g'ridan-to'g'ri qiymat berib bo'lmaydi
+        photos = {
+            model: informative_data_data.pop(field, [])
+            for model, field in ((ProductPhoto, 'product_photo_list'), (CadastralPhoto, 'cadastral_info_list'),
+                                 (ObjectPhoto, 'object_foto'))
+        }
 
         if main_data_data:
             for attr, value in main_data_data.items():
@@ -368,26 +432,20 @@ class AllDataUpdateSerializer(serializers.ModelSerializer):
             instance.financial_data.save()
 
         # ✅ Rasmlarni yangilash
-        self.update_photos(instance.informative_data.product_photo_list,
-                           informative_data_data.get('product_photo_list', []))
-        self.update_photos(instance.informative_data.cadastral_info_list,
-                           informative_data_data.get('cadastral_info_list', []))
-        self.update_photos(instance.informative_data.object_foto, informative_data_data.get('object_foto', []))
+        for model, new_photos in photos.items():
+            self.update_photos(model, instance.informative_data, new_photos)
 
         instance.save()
         return instance
 
-    def update_photos(self, photo_queryset, new_photos):
-        """Eski rasmlarni o‘chirib, yangilarini qo‘shish."""
+    def update_photos(self, model, informative_data, new_photos):
+        """`id` li rasmlar saqlanadi, `image` lilari qo‘shiladi, ro‘yxatda yo‘qlari o‘chiriladi."""
         if not new_photos:
             return  # Agar yangi rasm bo‘lmasa, hech narsa qilmaymiz
 
-        # **Eski rasmlarni faqat yangi rasm kelsa o‘chiramiz**
-        photo_queryset.all().delete()
-
-        # **Yangilarini qo‘shish**
-        for photo_data in new_photos:
-            photo_queryset.create(**photo_data)  # ✅ ManyToMany yoki ForeignKey bo‘lsa, `create()` ishlaydi
+        keep_ids = [photo['id'] for photo in new_photos if 'id' in photo]
+        images = [photo['image'] for photo in new_photos if 'id' not in photo]
+        sync_photos(model, informative_data, keep_ids, images)
 
 
 class AllDataFilterSerializer(serializers.ModelSerializer):
@@ -405,6 +463,16 @@ class AllDataFilterSerializer(serializers.ModelSerializer):
         return object.main_data.long
 
 
+class AllDataDistanceSerializer(AllDataFilterSerializer):
+    distance = serializers.SerializerMethodField()
+
+    class Meta(AllDataFilterSerializer.Meta):
+        fields = ('id', 'lat', 'long', 'distance')
+
+    def get_distance(self, object):
+        return round(object.distance_km, 3)
+
+
 # class InvestmentDraftSerializer(serializers.Serializer):
 #     export_share_product = serializers.DecimalField(max_digits=6, decimal_places=0, default=0)
 #     authorized_capital = serializers.DecimalField(max_digits=6, decimal_places=0, default=0)
@@ -479,6 +547,7 @@ class ObjectIdAndCoordinatesSerializer(serializers.ModelSerializer):
 class AllDataListSerializer(serializers.ModelSerializer):
     enterprise_name = serializers.SerializerMethodField()
     first_photo = serializers.SerializerMethodField()
+    first_photo_webp = serializers.SerializerMethodField()
     category_name = serializers.SerializerMethodField()
     location_name = serializers.SerializerMethodField()
 
@@ -491,7 +560,8 @@ class AllDataListSerializer(serializers.ModelSerializer):
             'location_name',
             'status',
             'date_created',
-            'first_photo'
+            'first_photo',
+            'first_photo_webp',
         )
 
     def get_enterprise_name(self, object):
@@ -499,11 +569,19 @@ class AllDataListSerializer(serializers.ModelSerializer):
 
     def get_first_photo(self, obj):
         # `obj.informative_data` orqali bog'liq `ObjectPhoto` larni olish
-        first_photo = obj.informative_data.object_foto.first()
-        if first_photo:  # Agar birinchi rasm mavjud bo'lsa, uning URL ni qaytarish
-            return self.context['request'].build_absolute_uri(first_photo.image.url)
+        # Read from the prefetched list: `.first()` would issue a new query per row
+        photos = obj.informative_data.object_foto.all()
+        first_photo = photos[0] if photos else None
+        if first_photo:  # Agar birinchi rasm mavjud bo'lsa, uning kichik nusxasi URL ni qaytarish
+            return self.context['request'].build_absolute_uri(image_variants.thumbnail_url(first_photo))
         return None  # Agar hech qanday rasm bo'lmasa, `None` qaytarish
 
+    def get_first_photo_webp(self, obj):
+        photos = obj.informative_data.object_foto.all()
+        if photos and photos[0].variants:
+            return self.context['request'].build_absolute_uri(image_variants.thumbnail_url(photos[0], 'webp'))
+        return None
+
     def get_category_name(self, obj):
         category = obj.main_data.category if obj.main_data else None
         if category:
@@ -545,10 +623,11 @@ class AllDataAllUsersListSerializer(serializers.ModelSerializer):
         return object.main_data.enterprise_name
 
     def get_image(self, object):
-        image = object.informative_data.object_photos.all().first()
+        photos = object.informative_data.object_foto.all()
+        image = photos[0] if photos else None
         return_image = ''
         if image is not None:
-            return_image = image.image.url
+            return_image = image_variants.thumbnail_url(image)
 
         return return_image
 
@@ -775,11 +854,22 @@ class CategoryApiProSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
     def get_alldata(self, obj):
-        all_data_objects = AllData.objects.filter(main_data__category=obj, status=Status.APPROVED)
+        # Ro'yxatda views.attach_category_alldata barcha kategoriyalar uchun bitta so'rovda yuklaydi
+        all_data_objects = getattr(obj, 'approved_alldata', None)
+        if all_data_objects is None:
+            all_data_objects = AllData.objects.filter(
+                main_data__category=obj, status=Status.APPROVED).order_by('-date_created', '-id').for_list()
         serializer = AlldateCategorySerializer(all_data_objects, many=True, context=self.context)
         return serializer.data
 
 
+class CategoryPreviewSerializer(CategoryApiProSerializer):
+    alldata_count = serializers.IntegerField(read_only=True)
+
+    class Meta(CategoryApiProSerializer.Meta):
+        fields = ('id', 'category_uz', 'category_ru', 'category_en', 'alldata_count', 'alldata',)
+
+
 class AreaAPIDetailSerializer(serializers.ModelSerializer):
     main_data = serializers.SerializerMethodField()
 
@@ -788,7 +878,24 @@ class AreaAPIDetailSerializer(serializers.ModelSerializer):
         fields = ('id', 'location', 'lat', 'long', 'main_data',)
 
     def get_main_data(self, obj):
-        return list(obj.main_data.all().values('id', 'lat', 'long', 'location'))
+        # Ro'yxatda AreaMainAPIListView barcha hududlar uchun bitta so'rovda yuklaydi
+        main_data = getattr(obj, 'approved_main_data', None)
+        if main_data is None:
+            main_data = obj.main_data.filter(all_data__status=Status.APPROVED).values('id', 'lat', 'long', 'location')
+        return list(main_data)
+
+
+class AreaMainListSerializer(AreaAPIDetailSerializer):
+    count = serializers.IntegerField(source='approved_count', read_only=True)
+    centroid = serializers.SerializerMethodField()
+
+    class Meta(AreaAPIDetailSerializer.Meta):
+        fields = ('id', 'location', 'lat', 'long', 'count', 'centroid', 'main_data',)
+
+    def get_centroid(self, obj):
+        if not obj.approved_count:
+            return None
+        return {'lat': obj.centroid_lat, 'long': obj.centroid_long}
 
 
 class PhoneSerializer(serializers.ModelSerializer):
@@ -837,3 +944,39 @@ class CardSerializer(serializers.ModelSerializer):
     class Meta:
         model = Card
         fields = ('id', 'card', 'user', 'created_at')
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'kind', 'filename', 'size', 'offset', 'chunk_size')
+        read_only_fields = ('id', 'offset')
+
+    def get_chunk_size(self, obj):
+        # Eng katta ruxsat etilgan bo'lak hajmi
+        return settings.UPLOAD_CHUNK_MAX_SIZE
+
+
+# Jadvaldan import qilinadigan obyekt ustunlari (data.imports)
+
+class MainDataImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MainData
+        fields = ('enterprise_name', 'legal_form', 'lat', 'long', 'field_of_activity', 'infrastructure',
+                  'project_staff')
+
+
+class InformativeDataImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = InformativeData
+        fields = ('product_info', 'project_capacity', 'formation_date', 'total_area', 'building_area',
+                  'tech_equipment')
+
+
+class FinancialDataImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FinancialData
+        fields = ('export_share', 'authorized_capital', 'estimated_value', 'investment_or_loan_amount',
+                  'investment_direction', 'major_shareholders')
@@ -0,0 +1,307 @@
+from django.db import transaction
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from data import autocomplete, image_variants, leaderboards, versions
+from data.clusters import add_point, remove_point
+from data.models import (
+    AllData, MainData, InformativeData, FinancialData, ObjectPhoto, ProductPhoto, CadastralPhoto, CurrencyPrice,
+    Category, Area, Currency, Intro, AboutDocument, Faq, Status,
+)
+from data.pricing import refresh_price_usd
+from data.rates import rate_table
+from data.search import refresh_search_vectors
+
+
+@receiver(pre_save, sender=MainData)
+def forget_listing(sender, instance, **kwargs):
+    instance.__dict__.pop('_listing', None)
+
+
+def listing_of(main_data):
+    """(id, status) of the AllData of `main_data` or None, read at most once per save by all receivers."""
+    if '_listing' not in main_data.__dict__:
+        main_data._listing = AllData.objects.filter(main_data=main_data).values_list('id', 'status').first()
+    return main_data._listing
+
+
+@receiver(post_save, sender=FinancialData)
+def refresh_price_on_financial_data_save(sender, instance, **kwargs):
+    """Capital or currency may have changed, so the normalized price is recalculated."""
+    refresh_price_usd(AllData.objects.filter(financial_data=instance))
+
+
+@receiver(post_save, sender=AllData)
+def refresh_price_on_all_data_create(sender, instance, created, **kwargs):
+    # Empty drafts get their price when the owner submits FinancialData
+    if created and instance.status != Status.DRAFT:
+        refresh_price_usd(AllData.objects.filter(pk=instance.pk))
+
+
+@receiver(post_init, sender=AllData)
+def remember_map_status(sender, instance, **kwargs):
+    # __dict__ so that deferred fields are not loaded for every instance
+    instance._map_status = instance.__dict__.get('status')
+
+
+@receiver(post_init, sender=MainData)
+def remember_map_position(sender, instance, **kwargs):
+    instance._map_position = (instance.__dict__.get('lat'), instance.__dict__.get('long'))
+
+
+@receiver(post_save, sender=AllData)
+def update_map_clusters_on_status_change(sender, instance, created, **kwargs):
+    """A listing joins the map clusters when approved and leaves them when its status changes again."""
+    was_on_map = not created and instance._map_status == Status.APPROVED
+    on_map = instance.status == Status.APPROVED
+    instance._map_status = instance.status
+    if was_on_map != on_map:
+        main_data = instance.main_data
+        (add_point if on_map else remove_point)(main_data.lat, main_data.long)
+
+
+@receiver(post_save, sender=MainData)
+def update_map_clusters_on_move(sender, instance, created, **kwargs):
+    old_position, instance._map_position = instance._map_position, (instance.lat, instance.long)
+    if created or None in old_position or old_position == instance._map_position:
+        return
+    listing = listing_of(instance)
+    if listing is not None and listing[1] == Status.APPROVED:
+        remove_point(*old_position)
+        add_point(instance.lat, instance.long)
+
+
+@receiver(post_delete, sender=AllData)
+def update_map_clusters_on_delete(sender, instance, **kwargs):
+    if instance._map_status == Status.APPROVED:
+        # MainData is deleted after its AllData, so the row is still there when cascading
+        position = MainData.objects.filter(pk=instance.main_data_id).values_list('lat', 'long').first()
+        if position is not None:
+            remove_point(*position)
+
+
+@receiver(post_init, sender=AllData)
+def remember_leaderboard_state(sender, instance, **kwargs):
+    instance._leaderboard_state = (instance.__dict__.get('status') == Status.APPROVED, instance.__dict__.get('top'))
+
+
+@receiver(post_save, sender=AllData)
+def refresh_leaderboards_on_save(sender, instance, created, **kwargs):
+    """Approving, rejecting or (un)marking a listing as top changes which listings the home screen shows."""
+    was_approved, was_top = (False, False) if created else instance._leaderboard_state
+    approved = instance.status == Status.APPROVED
+    instance._leaderboard_state = (approved, instance.top)
+    boards = []
+    if was_approved != approved:
+        boards.append('most-viewed')
+    if (was_approved and was_top) != (approved and instance.top):
+        boards.append('top')
+    if boards:
+        leaderboards.refresh_on_commit(*boards)
+
+
+@receiver(post_delete, sender=AllData)
+def refresh_leaderboards_on_delete(sender, instance, **kwargs):
+    was_approved, was_top = instance._leaderboard_state
+    if was_approved:
+        leaderboards.refresh_on_commit(*(['most-viewed', 'top'] if was_top else ['most-viewed']))
+
+
+@receiver(post_save, sender=AllData)
+def index_listing(sender, instance, created, **kwargs):
+    # Reindexed again on approval so that whatever was written in bulk meanwhile is searchable too
+    if created or instance.status == Status.APPROVED:
+        refresh_search_vectors(AllData.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=MainData)
+def reindex_on_main_data_save(sender, instance, created, **kwargs):
+    # A new MainData has no AllData yet; it is indexed when the AllData is created
+    if not created:
+        refresh_search_vectors(AllData.objects.filter(main_data=instance))
+
+
+@receiver(post_save, sender=InformativeData)
+def reindex_on_informative_data_save(sender, instance, created, **kwargs):
+    if not created:
+        refresh_search_vectors(AllData.objects.filter(informative_data=instance))
+
+
+@receiver(post_save, sender=Category)
+def reindex_on_category_save(sender, instance, created, **kwargs):
+    if not created:
+        refresh_search_vectors(AllData.objects.filter(main_data__category=instance))
+
+
+@receiver(post_save, sender=Area)
+def reindex_on_area_save(sender, instance, created, **kwargs):
+    if not created:
+        refresh_search_vectors(AllData.objects.filter(main_data__location=instance))
+
+
+@receiver(post_init, sender=AllData)
+def remember_suggested(sender, instance, **kwargs):
+    instance._suggested = instance.__dict__.get('status') == Status.APPROVED
+
+
+@receiver(post_save, sender=AllData)
+def update_autocomplete_on_save(sender, instance, created, **kwargs):
+    """Only approved listings are suggested, so only approving or un-approving one changes the suggestions."""
+    was_suggested = not created and instance._suggested
+    instance._suggested = suggested = instance.status == Status.APPROVED
+    if suggested and not was_suggested:
+        autocomplete.index_listing_on_commit(instance.pk, instance.main_data.enterprise_name)
+    elif was_suggested and not suggested:
+        autocomplete.remove_listing_on_commit(instance.pk)
+
+
+@receiver(post_init, sender=MainData)
+def remember_suggested_name(sender, instance, **kwargs):
+    instance._suggested_name = instance.__dict__.get('enterprise_name')
+
+
+@receiver(post_save, sender=MainData)
+def update_autocomplete_on_rename(sender, instance, created, **kwargs):
+    old_name, instance._suggested_name = instance._suggested_name, instance.enterprise_name
+    if created or old_name == instance.enterprise_name:
+        return
+    listing = listing_of(instance)
+    if listing is not None and listing[1] == Status.APPROVED:
+        autocomplete.index_listing_on_commit(listing[0], instance.enterprise_name)
+
+
+@receiver(post_delete, sender=AllData)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    autocomplete.remove_listing_on_commit(instance.pk)
+
+
+def category_names(category):
+    return tuple(category.__dict__.get(field) for field in ('category_uz', 'category_ru', 'category_en'))
+
+
+@receiver(post_init, sender=Category)
+def remember_category_names(sender, instance, **kwargs):
+    instance._suggested_names = category_names(instance)
+
+
+@receiver(post_save, sender=Category)
+def update_autocomplete_on_category_save(sender, instance, created, **kwargs):
+    old_names, instance._suggested_names = instance._suggested_names, category_names(instance)
+    if created or old_names != instance._suggested_names:
+        autocomplete.index_category_on_commit(instance)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_from_autocomplete(sender, instance, **kwargs):
+    autocomplete.remove_category_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=CurrencyPrice)
+@receiver(post_delete, sender=CurrencyPrice)
+def invalidate_rate_table(sender, **kwargs):
+    """Every worker reloads its exchange rate table on the next lookup after the commit."""
+    # Not before: a worker reloading in between would keep the old rates under the new version
+    transaction.on_commit(rate_table.invalidate)
+
+
+REFERENCE_DATA_GROUPS = {
+    Category: versions.CATEGORY,
+    Area: versions.AREA,
+    Currency: versions.CURRENCY,
+    Intro: versions.INTRO,
+    Faq: versions.FAQ,
+    AboutDocument: versions.ABOUT,
+}
+
+
+def bump_reference_data_version(sender, **kwargs):
+    """Clients holding the old ETag get the new data on their next request."""
+    versions.bump_on_commit(REFERENCE_DATA_GROUPS[sender])
+
+
+for model in REFERENCE_DATA_GROUPS:
+    post_save.connect(bump_reference_data_version, sender=model, dispatch_uid=f'reference-version-save-{model.__name__}')
+    post_delete.connect(bump_reference_data_version, sender=model,
+                        dispatch_uid=f'reference-version-delete-{model.__name__}')
+
+
+@receiver(post_init, sender=AllData)
+def remember_cached_status(sender, instance, **kwargs):
+    instance._cached_status = instance.__dict__.get('status')
+
+
+def invalidate_listing_responses(approved):
+    """Drops the cached anonymous listing responses (data.response_cache) that may show the changed listing."""
+    versions.bump_on_commit(versions.ALL_LISTINGS)
+    if approved:
+        versions.bump_on_commit(versions.LISTINGS)
+
+
+@receiver(post_save, sender=AllData)
+def invalidate_responses_on_save(sender, instance, created, **kwargs):
+    was_approved = not created and instance._cached_status == Status.APPROVED
+    instance._cached_status = instance.status
+    invalidate_listing_responses(was_approved or instance.status == Status.APPROVED)
+
+
+@receiver(post_delete, sender=AllData)
+def invalidate_responses_on_delete(sender, instance, **kwargs):
+    invalidate_listing_responses(instance._cached_status == Status.APPROVED)
+
+
+@receiver(post_save, sender=MainData)
+def invalidate_responses_on_main_data_save(sender, instance, created, **kwargs):
+    # A new MainData has no AllData yet; the AllData invalidates when it is created
+    if created:
+        return
+    listing = listing_of(instance)
+    if listing is not None:
+        invalidate_listing_responses(listing[1] == Status.APPROVED)
+
+
+def invalidate_responses_of(**lookup):
+    status = AllData.objects.filter(**lookup).values_list('status', flat=True).first()
+    if status is not None:
+        invalidate_listing_responses(status == Status.APPROVED)
+
+
+@receiver(post_save, sender=InformativeData)
+@receiver(post_save, sender=FinancialData)
+def invalidate_responses_on_part_save(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_responses_of(**{'informative_data' if sender is InformativeData else 'financial_data': instance})
+
+
+@receiver(post_save, sender=ObjectPhoto)
+@receiver(post_delete, sender=ObjectPhoto)
+@receiver(post_save, sender=ProductPhoto)
+@receiver(post_delete, sender=ProductPhoto)
+@receiver(post_save, sender=CadastralPhoto)
+@receiver(post_delete, sender=CadastralPhoto)
+def invalidate_responses_on_photo_change(sender, instance, **kwargs):
+    invalidate_responses_of(informative_data_id=instance.informative_data_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Area)
+@receiver(post_delete, sender=Area)
+def invalidate_responses_on_name_change(sender, **kwargs):
+    invalidate_listing_responses(True)
+
+
+@receiver(post_init, sender=ObjectPhoto)
+@receiver(post_init, sender=ProductPhoto)
+@receiver(post_init, sender=CadastralPhoto)
+def remember_variant_source(sender, instance, **kwargs):
+    instance._variant_source = instance.__dict__.get('image')
+
+
+@receiver(post_save, sender=ObjectPhoto)
+@receiver(post_save, sender=ProductPhoto)
+@receiver(post_save, sender=CadastralPhoto)
+def generate_photo_variants(sender, instance, created, **kwargs):
+    """Thumbnail and medium size of a new or replaced image, generated after the commit."""
+    if created or instance.image.name != getattr(instance._variant_source, 'name', instance._variant_source):
+        instance._variant_source = instance.image.name
+        image_variants.schedule(instance)
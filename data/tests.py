@@ -1,3 +1,1248 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from utils.sql import record_queries
+from utils.testing import QueryBudgetMixin
+from .models import (
+    Status, Category, Area, Currency, CurrencyPrice, MainData, InformativeData, FinancialData, ObjectPhoto, AllData,
+    Card, MapCluster, UploadSession,
+)
+from . import autocomplete, counters, geo, leaderboards
+from .clusters import MAX_CLUSTER_ZOOM, rebuild_clusters
+from .pricing import refresh_price_usd
+from .drafts import provision_drafts
+from .geocoder import ReverseGeocoder
+from .imports import import_listings, read_rows
+from .moderation import set_status
+from .pagination import KeysetPagination
+from .image_variants import SIZES, generate
+from .rates import RateTable, rate_table
+
+
+def make_listing(user, category, area, currency, status=Status.APPROVED, photos=2, **main_data):
+    main_data.setdefault('enterprise_name', 'Enterprise')
+    main_data = MainData.objects.create(user=user, category=category, location=area, **main_data)
+    informative_data = InformativeData.objects.create(user=user)
+    financial_data = FinancialData.objects.create(user=user, currency=currency)
+    for index in range(photos):
+        ObjectPhoto.objects.create(
+            informative_data=informative_data,
+            image=SimpleUploadedFile(f'photo{index}.jpg', b'', content_type='image/jpeg'),
+        )
+    return AllData.objects.create(
+        main_data=main_data,
+        informative_data=informative_data,
+        financial_data=financial_data,
+        user=user,
+        status=status,
+    )
+
+
+def tomorrow():
+    return timezone.localdate() + timedelta(days=1)
+
+
+class ListingFixtureMixin:
+    @classmethod
+    def setUpClass(cls):
+        # The fixture photos are real files; they go to a directory of their own instead of mediafiles/
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_root_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_root_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_root_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='owner@example.com', password='secret', tin='123456789')
+        cls.currency = Currency.objects.create(code='USD', name='US Dollar')
+        cls.category = Category.objects.create(category_uz='Sanoat', category_ru='Промышленность', category_en='Industry')
+        cls.area = Area.objects.create(location_uz='Toshkent', location_ru='Ташкент', location_en='Tashkent')
+
+    def make_listings(self, count, **kwargs):
+        return [make_listing(self.user, self.category, self.area, self.currency, **kwargs) for _ in range(count)]
+
+
+@override_settings(DATA_RESPONSE_CACHE_TIMEOUT=0)
+class AllDataListQueryCountTest(ListingFixtureMixin, TestCase):
+    """Listing endpoints must cost the same number of queries for 3 rows as for 30."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(context.captured_queries), response
+
+    def assert_constant(self, url, **params):
+        self.make_listings(3)
+        small, _ = self.count_queries(url, **params)
+        self.make_listings(27)
+        large, response = self.count_queries(url, **params)
+        self.assertEqual(small, large)
+        return large, response
+
+    def test_all_data_list(self):
+        queries, response = self.assert_constant('/data/all-data/')
+        self.assertEqual(queries, 2)
+        self.assertTrue(response.json()[0]['first_photo'].endswith('.jpg'))
+        self.assertEqual(response.json()[0]['category_name']['en'], 'Industry')
+
+    def test_filter_list(self):
+        queries, _ = self.assert_constant('/data/all-data-filter-list', categories=str(self.category.pk))
+        self.assertEqual(queries, 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'full-text search needs PostgreSQL')
+    def test_search(self):
+        queries, _ = self.assert_constant('/data/search/', search='Enter')
+        self.assertEqual(queries, 2)
+
+    def test_my_data(self):
+        self.client.force_authenticate(self.user)
+        queries, _ = self.assert_constant('/data/mydata-approved/')
+        self.assertEqual(queries, 2)
+
+    def test_category_list_of_all_users(self):
+        queries, response = self.assert_constant(f'/data/custom-all-data-all-users/{self.category.pk}')
+        self.assertEqual(queries, 2)
+        self.assertTrue(response.json()[0]['image'])
+
+    def test_card_list(self):
+        self.client.force_authenticate(self.user)
+        for listing in self.make_listings(3):
+            Card.objects.create(all_data=listing, user=self.user)
+        small, _ = self.count_queries('/data/card-list/')
+        for listing in self.make_listings(27):
+            Card.objects.create(all_data=listing, user=self.user)
+        large, _ = self.count_queries('/data/card-list/')
+        self.assertEqual(small, large)
+        self.assertEqual(large, 2)
+
+
+@override_settings(DATA_RESPONSE_CACHE_TIMEOUT=0)
+class KeysetPaginationTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.listings = self.make_listings(23, photos=0)
+        for index, listing in enumerate(self.listings):
+            # Plenty of ties, so the `id` tie-breaker is exercised
+            AllData.objects.filter(pk=listing.pk).update(view_count=index % 3)
+
+    def walk(self, url, **params):
+        ids, pages = [], 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200, response.content)
+            ids += [row['id'] for row in response.json()['results']]
+            pages += 1
+            next_url = response.json()['next']
+            if next_url is None:
+                return ids, pages
+            response = self.client.get(next_url)
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get('/data/all-data/')
+        self.assertIsInstance(response.json(), list)
+        self.assertEqual(len(response.json()), 23)
+
+    def test_walk_by_date(self):
+        ids, pages = self.walk('/data/all-data/', page_size=5)
+        self.assertEqual(pages, 5)
+        expected = AllData.objects.order_by('-date_created', '-id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+
+    def test_walk_by_views(self):
+        ids, _ = self.walk('/data/all-data/', page_size=4, sort='views')
+        expected = AllData.objects.order_by('-view_count', '-id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+
+    def test_deep_page_costs_the_same(self):
+        first = self.client.get('/data/all-data/', {'page_size': 5})
+        with CaptureQueriesContext(connection) as page_one:
+            self.client.get('/data/all-data/', {'page_size': 5})
+        url = first.json()['next']
+        for _ in range(3):
+            url = self.client.get(url).json()['next']
+        with CaptureQueriesContext(connection) as deep_page:
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertEqual(len(page_one.captured_queries), len(deep_page.captured_queries))
+        self.assertNotIn('OFFSET', deep_page.captured_queries[0]['sql'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/data/all-data/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def seek_queryset(self):
+        pagination = KeysetPagination()
+        pagination.ordering = pagination.orderings['date']
+        last = AllData.objects.order_by(*pagination.ordering)[10]
+        position = [('-date_created', last.date_created), ('-id', last.id)]
+        return AllData.objects.filter(pagination.seek_filter(position, AllData)).order_by(*pagination.ordering)
+
+    def test_seek_has_leading_bound(self):
+        # Without it the OR expansion cannot be an index range condition
+        self.assertIn('"data_alldata"."date_created" <=', str(self.seek_queryset().query))
+        self.assertEqual(self.seek_queryset().count(), 12)
+
+    @skipUnless(connection.vendor == 'postgresql', 'EXPLAIN output of PostgreSQL')
+    def test_seek_is_an_index_range(self):
+        with connection.cursor() as cursor:
+            # The table is tiny; the plan should still be able to start from the cursor
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = self.seek_queryset()[:5].explain()
+        self.assertIn('alldata_created_idx', plan)
+        self.assertRegex(plan, r'Index Cond: .*date_created <=')
+
+
+class PriceUsdTest(ListingFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.eur = Currency.objects.create(code='EUR', name='Euro')
+        cls.uzs = Currency.objects.create(code='UZS', name='Sum')
+        CurrencyPrice.objects.create(code='USD', name='US Dollar', cb_price=12500, currency=cls.currency)
+        CurrencyPrice.objects.create(code='EUR', name='Euro', cb_price=13750, currency=cls.eur)
+
+    def setUp(self):
+        # The table outlives the rolled back transactions of earlier tests
+        rate_table.invalidate()
+
+    def price_listing(self, currency, capital):
+        listing = make_listing(self.user, self.category, self.area, currency, photos=0)
+        financial_data = listing.financial_data
+        financial_data.authorized_capital = capital
+        financial_data.save()
+        listing.refresh_from_db()
+        return listing
+
+    def test_price_follows_financial_data(self):
+        self.assertEqual(self.price_listing(self.eur, 1000).price_usd, Decimal('1100.00'))
+        self.assertEqual(self.price_listing(self.uzs, 25000000).price_usd, Decimal('2000.00'))
+        self.assertEqual(self.price_listing(self.currency, 700).price_usd, Decimal('700.00'))
+
+    def test_rates_refresh_reprices_everything(self):
+        listing = self.price_listing(self.eur, 1000)
+        with self.captureOnCommitCallbacks(execute=True):
+            CurrencyPrice.objects.create(code='EUR', name='Euro', cb_price=15000, currency=self.eur, date=tomorrow())
+        refresh_price_usd()
+        listing.refresh_from_db()
+        self.assertEqual(listing.price_usd, Decimal('1200.00'))
+
+    def test_filter_by_price_range(self):
+        cheap = self.price_listing(self.currency, 500)
+        expensive = self.price_listing(self.eur, 1000)
+        response = APIClient().get('/data/all-data-filter-list', {'startprice': 1000, 'endprice': 2000})
+        self.assertEqual([row['id'] for row in response.json()], [expensive.pk])
+        response = APIClient().get('/data/all-data-filter', {'startprice': 100})
+        self.assertEqual({row['id'] for row in response.json()}, {cheap.pk, expensive.pk})
+
+
+class RateTableTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        rate_table.invalidate()
+        CurrencyPrice.objects.create(code='USD', name='US Dollar', cb_price=12500, currency=self.currency)
+
+    def test_lookups_are_served_from_memory(self):
+        self.assertEqual(rate_table.get()['USD'], Decimal('12500'))
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                rate_table.get()
+
+    def test_new_prices_invalidate_the_table(self):
+        rate_table.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            CurrencyPrice.objects.create(code='USD', name='US Dollar', cb_price=12800, currency=self.currency,
+                                         date=tomorrow())
+            # Not before the commit: another worker would cache the old rates under the new version
+            self.assertEqual(rate_table.get()['USD'], Decimal('12500'))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(rate_table.get()['USD'], Decimal('12800'))
+
+    def test_other_workers_reload_after_version_change(self):
+        worker = RateTable()
+        worker.get()
+        # Another process stored new prices: only the shared version changes for this worker
+        CurrencyPrice.objects.filter(code='USD').update(cb_price=13000)
+        rate_table.invalidate()
+        worker._checked_at = 0.0
+        self.assertEqual(worker.get()['USD'], Decimal('13000'))
+
+
+class DistanceFilterTest(ListingFixtureMixin, TestCase):
+    url = '/data/all-data-by-lat-long-distance-filter'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Tashkent centre, ~30 km north-east, a box corner ~42 km away and Samarkand ~270 km away
+        self.centre = make_listing(self.user, self.category, self.area, self.currency, photos=0,
+                                   lat=Decimal('41.311'), long=Decimal('69.279'))
+        self.near = make_listing(self.user, self.category, self.area, self.currency, photos=0,
+                                 lat=Decimal('41.500'), long=Decimal('69.550'))
+        self.corner = make_listing(self.user, self.category, self.area, self.currency, photos=0,
+                                   lat=Decimal('41.580'), long=Decimal('69.630'))
+        self.far = make_listing(self.user, self.category, self.area, self.currency, photos=0,
+                                lat=Decimal('39.654'), long=Decimal('66.975'))
+
+    def test_geo_cell_follows_coordinates(self):
+        main_data = self.far.main_data
+        self.assertEqual(main_data.geo_cell, geo.grid_cell(main_data.lat, main_data.long))
+        main_data.lat, main_data.long = Decimal('41.3'), Decimal('69.2')
+        main_data.save(update_fields=['lat', 'long'])
+        main_data.refresh_from_db()
+        self.assertEqual(main_data.geo_cell, geo.grid_cell(41.3, 69.2))
+
+    def test_true_radius_ordered_by_distance(self):
+        response = self.client.get(self.url, {'lat_long': '41.311,69.279', 'distance': 35})
+        rows = response.json()
+        # The corner is inside the 35 km bounding box but outside the circle
+        self.assertEqual([row['id'] for row in rows], [self.centre.pk, self.near.pk])
+        self.assertEqual(rows[0]['distance'], 0)
+        self.assertAlmostEqual(rows[1]['distance'], 30.9, delta=0.1)
+
+    def test_only_nearby_cells_are_queried(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url, {'lat_long': '41.311,69.279', 'distance': 35})
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn('geo_cell', context.captured_queries[0]['sql'])
+
+    def test_k_nearest(self):
+        response = self.client.get(self.url, {'lat_long': '39.7,67.0', 'k': 2})
+        self.assertEqual([row['id'] for row in response.json()], [self.far.pk, self.centre.pk])
+        for k in ('many', '-2', '0', '1000', '²'):
+            with self.subTest(k=k):
+                self.assertEqual(self.client.get(self.url, {'lat_long': '39.7,67.0', 'k': k}).status_code, 400)
+
+
+class MapClusterTest(ListingFixtureMixin, TestCase):
+    url = '/data/map-clusters'
+    uzbekistan = '37.1,55.9,45.6,73.2'
+
+    def cluster_snapshot(self):
+        return sorted(MapCluster.objects.values_list('zoom', 'x', 'y', 'count'))
+
+    def test_incremental_updates_match_rebuild(self):
+        tashkent = make_listing(self.user, self.category, self.area, self.currency, photos=0,
+                                lat=Decimal('41.311'), long=Decimal('69.279'))
+        make_listing(self.user, self.category, self.area, self.currency, photos=0,
+                     lat=Decimal('39.654'), long=Decimal('66.975'))
+        make_listing(self.user, self.category, self.area, self.currency, photos=0, status=Status.CHECKING,
+                     lat=Decimal('40.1'), long=Decimal('65.3'))
+        main_data = tashkent.main_data
+        main_data.lat = Decimal('41.0')
+        main_data.save()
+        rejected = AllData.objects.get(pk=tashkent.pk)
+        rejected.status = Status.REJECTED
+        rejected.save()
+        rejected.status = Status.APPROVED
+        rejected.save()
+
+        incremental = self.cluster_snapshot()
+        rebuild_clusters()
+        self.assertEqual(incremental, self.cluster_snapshot())
+
+    def test_clusters_and_points(self):
+        for lat in ('41.30', '41.31', '41.32'):
+            make_listing(self.user, self.category, self.area, self.currency, photos=0,
+                         lat=Decimal(lat), long=Decimal('69.28'))
+        response = APIClient().get(self.url, {'bbox': self.uzbekistan, 'zoom': 5})
+        self.assertEqual([cluster['count'] for cluster in response.json()['clusters']], [3])
+        self.assertAlmostEqual(response.json()['clusters'][0]['lat'], 41.31)
+
+        response = APIClient().get(self.url, {'bbox': '41.2,69.2,41.4,69.4', 'zoom': MAX_CLUSTER_ZOOM})
+        self.assertEqual(len(response.json()['points']), 3)
+
+    def test_bad_request(self):
+        self.assertEqual(APIClient().get(self.url, {'zoom': 3}).status_code, 400)
+
+    def test_large_bbox_gets_clusters_of_a_lower_zoom(self):
+        for lat in ('41.30', '41.31', '41.32'):
+            make_listing(self.user, self.category, self.area, self.currency, photos=0,
+                         lat=Decimal(lat), long=Decimal('69.28'))
+        response = APIClient().get(self.url, {'bbox': '-80,-179,80,179', 'zoom': 10})
+        # 64 cells around the world
+        self.assertEqual(response.json()['zoom'], 4)
+        self.assertEqual([cluster['count'] for cluster in response.json()['clusters']], [3])
+
+        with mock.patch('data.clusters.MAX_MAP_POINTS', 2):
+            response = APIClient().get(self.url, {'bbox': '41.2,69.2,41.4,69.4', 'zoom': MAX_CLUSTER_ZOOM})
+        self.assertEqual((response.json()['zoom'], response.json()['points']), (MAX_CLUSTER_ZOOM - 1, []))
+        self.assertEqual(sum(cluster['count'] for cluster in response.json()['clusters']), 3)
+
+    def test_bbox_across_the_antimeridian(self):
+        fiji = make_listing(self.user, self.category, self.area, self.currency, photos=0,
+                            lat=Decimal('-17.7'), long=Decimal('179.9'))
+        make_listing(self.user, self.category, self.area, self.currency, photos=0,
+                     lat=Decimal('-17.7'), long=Decimal('-179.9'))
+        bbox = '-18,179.8,-17.5,-179.8'
+        response = APIClient().get(self.url, {'bbox': bbox, 'zoom': MAX_CLUSTER_ZOOM})
+        self.assertIn(fiji.pk, [point['id'] for point in response.json()['points']])
+        self.assertEqual(len(response.json()['points']), 2)
+        response = APIClient().get(self.url, {'bbox': bbox, 'zoom': 8})
+        self.assertEqual(sum(cluster['count'] for cluster in response.json()['clusters']), 2)
+
+
+class FakeRedis:
+    """Just the hash commands data.counters uses."""
+
+    def __init__(self):
+        self.hashes = {}
+
+    def hincrby(self, key, field, amount=1):
+        fields = self.hashes.setdefault(key, {})
+        fields[str(field).encode()] = fields.get(str(field).encode(), 0) + amount
+
+    def exists(self, key):
+        return int(key in self.hashes)
+
+    def rename(self, key, new_key):
+        if key not in self.hashes:
+            raise counters.redis.ResponseError('no such key')
+        self.hashes[new_key] = self.hashes.pop(key)
+
+    def hgetall(self, key):
+        return {field: str(value).encode() for field, value in self.hashes.get(key, {}).items()}
+
+    def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+
+    def set(self, key, value, nx=False):
+        if not (nx and key in self.hashes):
+            self.hashes[key] = value.encode()
+
+    def get(self, key):
+        return self.hashes.get(key)
+
+    def __getattr__(self, name):
+        def unavailable(*args, **kwargs):
+            raise counters.redis.ConnectionError(f'{name} is not faked')
+        return unavailable
+
+
+class ViewCounterTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        counters._client = self.redis
+        self.addCleanup(setattr, counters, '_client', None)
+
+    def test_views_are_buffered_until_flush(self):
+        first, second = self.make_listings(2, photos=0)
+        client = APIClient()
+        for _ in range(3):
+            self.assertEqual(client.get(f'/data/all-data/{first.pk}/').status_code, 200)
+        client.get(f'/data/all-data/{second.pk}/')
+
+        first.refresh_from_db()
+        self.assertEqual(first.view_count, 0)
+        self.assertEqual(counters.flush_views(), 4)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.view_count, second.view_count), (3, 1))
+        self.assertEqual(counters.flush_views(), 0)
+
+    def test_flush_is_applied_once(self):
+        listing, = self.make_listings(1, photos=0)
+        counters.record_view(listing.pk)
+        # The UPDATE commits but the hash cannot be deleted
+        with mock.patch.object(self.redis, 'delete', side_effect=counters.redis.ConnectionError):
+            with self.assertRaises(counters.redis.ConnectionError):
+                counters.flush_views()
+        self.assertEqual(counters.flush_views(), 0)
+        listing.refresh_from_db()
+        self.assertEqual(listing.view_count, 1)
+        self.assertFalse(self.redis.exists(counters.FLUSHING_KEY))
+
+    def test_falls_back_to_database_without_redis(self):
+        listing, = self.make_listings(1, photos=0)
+        counters._client = counters.redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.1)
+        self.addCleanup(setattr, counters, '_redis_down_until', 0)
+        counters.record_view(listing.pk)
+        # Redis is not tried again for a while
+        with mock.patch.object(counters._client, 'hincrby') as hincrby:
+            counters.record_view(listing.pk)
+        hincrby.assert_not_called()
+        listing.refresh_from_db()
+        self.assertEqual(listing.view_count, 2)
+
+
+# Variants inline: a worker thread cannot see the rows of the test transaction
+@override_settings(PHOTO_VARIANTS_BACKGROUND=False)
+class LeaderboardTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.client = APIClient()
+
+    def test_served_from_cache(self):
+        listings = self.make_listings(3)
+        for views, listing in zip((5, 20, 10), listings):
+            AllData.objects.filter(pk=listing.pk).update(view_count=views)
+        leaderboards.refresh('most-viewed')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/data/view-count-all-data')
+        self.assertEqual([row['id'] for row in response.data], [listings[1].pk, listings[2].pk, listings[0].pk])
+        self.assertTrue(response.data[0]['main_obj_photo'][0].startswith('http://testserver/'))
+
+    def test_refreshed_when_top_changes(self):
+        listing, = self.make_listings(1)
+        self.assertEqual(self.client.get('/data/top-all-data').data, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.top = True
+            listing.save()
+        with self.assertNumQueries(0):
+            response = self.client.get('/data/top-all-data')
+        self.assertEqual([row['id'] for row in response.data], [listing.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.status = Status.REJECTED
+            listing.save()
+        self.assertEqual(self.client.get('/data/top-all-data').data, [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'full-text search needs PostgreSQL')
+class SearchTest(ListingFixtureMixin, TestCase):
+    def search(self, text):
+        response = APIClient().get('/data/search/', {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()]
+
+    def test_ranked_multilingual_prefix_search(self):
+        by_name, = self.make_listings(1, enterprise_name='Toshkent Textile')
+        by_area, = self.make_listings(1, enterprise_name='Cotton')
+        make_listing(self.user, self.category, self.area, self.currency, status=Status.DRAFT,
+                     enterprise_name='Toshkent Draft')
+
+        # The name weighs more than the area name, drafts are not found
+        self.assertEqual(self.search('toshk'), [by_name.pk, by_area.pk])
+        self.assertCountEqual(self.search('Ташкент'), [by_name.pk, by_area.pk])
+        self.assertEqual(self.search('промышл textile'), [by_name.pk])
+        self.assertEqual(self.search('?!'), [])
+
+    def test_reindexed_on_save(self):
+        listing, = self.make_listings(1)
+        listing.main_data.enterprise_name = 'Samarqand Agro'
+        listing.main_data.save()
+        self.assertEqual(self.search('samarq'), [listing.pk])
+        self.category.category_en = 'Agriculture'
+        self.category.save()
+        self.assertEqual(self.search('agricult'), [listing.pk])
+
+
+class AutocompleteTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        counters._client = counters.redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.1)
+        self.addCleanup(setattr, counters, '_client', None)
+
+    def test_database_fallback_without_redis(self):
+        listing, = self.make_listings(1, enterprise_name='Toshkent Textile', photos=0)
+        self.make_listings(1, enterprise_name='Toshkent Draft', status=Status.DRAFT, photos=0)
+        response = APIClient().get('/data/autocomplete', {'q': 'tosh'})
+        self.assertEqual(response.json(), [{'type': 'listing', 'id': listing.pk, 'name': 'Toshkent Textile'}])
+        response = APIClient().get('/data/autocomplete', {'q': 'sano'})
+        self.assertEqual(response.json()[0]['name']['en'], 'Industry')
+
+    def test_index_is_written_after_commit_and_only_on_change(self):
+        with mock.patch.object(autocomplete, '_replace') as replace:
+            with self.captureOnCommitCallbacks() as callbacks:
+                listing, = self.make_listings(1, enterprise_name='Toshkent Textile', photos=0)
+            replace.assert_not_called()
+            for callback in callbacks:
+                callback()
+            replace.assert_called_once()
+
+            replace.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                listing.view_count = 5
+                listing.save()
+                listing.main_data.save()
+                self.category.save()
+            replace.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                listing.main_data.enterprise_name = 'Toshkent Mebel'
+                listing.main_data.save()
+            self.assertEqual(replace.call_args[0][1]['name'], 'Toshkent Mebel')
+
+
+class CategoryListTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.other = Category.objects.create(category_uz='Qishloq', category_ru='Сельское', category_en='Farming')
+        self.listings = self.make_listings(3)
+        self.make_listings(1, status=Status.DRAFT)
+        make_listing(self.user, self.other, self.area, self.currency)
+
+    def get(self, url, queries, **params):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_full_list(self):
+        categories = {category['id']: category for category in self.get('/data/category-list-api', 3)}
+        self.assertEqual(len(categories[self.category.pk]['alldata']), 3)
+        self.assertEqual(len(categories[self.other.pk]['alldata']), 1)
+
+    def test_preview(self):
+        categories = {category['id']: category for category in self.get('/data/category-list-api', 3, preview=2)}
+        first, other = categories[self.category.pk], categories[self.other.pk]
+        self.assertEqual((first['alldata_count'], other['alldata_count']), (3, 1))
+        self.assertEqual([row['id'] for row in first['alldata']], [self.listings[2].pk, self.listings[1].pk])
+        self.assertEqual(len(other['alldata']), 1)
+
+    def test_category_listings_are_paginated(self):
+        page = self.get(f'/data/category-list-api/{self.category.pk}/alldata/', 2)
+        self.assertEqual([row['id'] for row in page['results']], [listing.pk for listing in self.listings[::-1]])
+        self.assertIsNone(page['next'])
+
+
+class AreaListTest(ListingFixtureMixin, TestCase):
+    def test_approved_listings_grouped_per_area(self):
+        other = Area.objects.create(location_uz='Samarqand', location_ru='Самарканд', location_en='Samarkand')
+        Area.objects.create(location_uz='Buxoro', location_ru='Бухара', location_en='Bukhara')
+        first, second = self.make_listings(2, photos=0, lat=41, long=69)
+        AllData.objects.filter(pk=second.pk).update(status=Status.DRAFT)
+        make_listing(self.user, self.category, other, self.currency, photos=0, lat=40, long=67)
+
+        with self.assertNumQueries(2):
+            areas = APIClient().get('/data/area_main-list-api/').json()
+        self.assertEqual([area['count'] for area in areas], [1, 1, 0])
+        self.assertEqual([row['id'] for row in areas[0]['main_data']], [first.main_data_id])
+        self.assertEqual(areas[1]['centroid'], {'lat': 40.0, 'long': 67.0})
+        self.assertIsNone(areas[2]['centroid'])
+
+        areas = APIClient().get('/data/area_main-list-api/', {'bbox': '40.5,68,42,70'}).json()
+        self.assertEqual([area['id'] for area in areas], [self.area.pk])
+
+
+class ReferenceDataVersionTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.client = APIClient()
+
+    def test_not_modified_without_database_access(self):
+        response = self.client.get('/data/category-list')
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        area_etag = self.client.get('/data/area-list')['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/data/category-list', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(0):
+            response = self.client.get('/data/category-list', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.category_en = 'Manufacturing'
+            self.category.save()
+        response = self.client.get('/data/category-list', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.client.get('/data/category-list', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        # Other groups keep their version
+        self.assertEqual(self.client.get('/data/area-list', HTTP_IF_NONE_MATCH=area_etag).status_code, 304)
+
+
+# Variants inline: a worker thread cannot see the rows of the test transaction
+@override_settings(PHOTO_VARIANTS_BACKGROUND=False)
+class ResponseCacheTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.client = APIClient()
+
+    def get(self, url, queries, **params):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_anonymous_list_is_cached_until_a_listing_changes(self):
+        listing, = self.make_listings(1)
+        self.assertEqual(self.get('/data/all-data/', 2, a='1', b='2')['X-Cache'], 'MISS')
+        # Same parameters in another order
+        response = self.get('/data/all-data/', 0, b='2', a='1')
+        self.assertEqual((response['X-Cache'], len(response.json())), ('HIT', 1))
+
+        self.get('/data/all-data/', 2)
+
+        # Drafts are not shown, so they keep the cache
+        with self.captureOnCommitCallbacks(execute=True):
+            draft, = self.make_listings(1, status=Status.DRAFT)
+        self.get('/data/all-data/', 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.main_data.enterprise_name = 'Renamed'
+            listing.main_data.save()
+        self.assertEqual(self.get('/data/all-data/', 2).json()[0]['enterprise_name'], 'Renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            draft.status = Status.APPROVED
+            draft.save()
+        self.assertEqual(len(self.get('/data/all-data/', 2).json()), 2)
+
+    def test_authenticated_users_are_not_cached(self):
+        self.make_listings(1)
+        self.client.force_authenticate(self.user)
+        self.get('/data/all-data/', 2)
+        self.assertNotIn('X-Cache', self.get('/data/all-data/', 2))
+
+
+class StubCbuHandler(BaseHTTPRequestHandler):
+    """cbu.uz rates archive with GBP down."""
+    hits = []
+
+    def do_GET(self):
+        code = self.path.strip('/').split('/')[-1]
+        self.hits.append(code)
+        if code == 'GBP':
+            self.send_response(500)
+            self.end_headers()
+            return
+        body = json.dumps([{'Ccy': code, 'Rate': '12000.00'}]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ExchangeRatesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubCbuHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def setUp(self):
+        caches['shared'].clear()
+        StubCbuHandler.hits = []
+        stub_url = override_settings(CBU_RATES_URL=f'http://127.0.0.1:{self.server.server_port}/json/')
+        stub_url.enable()
+        self.addCleanup(stub_url.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='rates@example.com', password='x', tin='1'))
+
+    def test_partial_result_then_cache(self):
+        response = self.client.get('/data/exchange-rate/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()), ['USD', 'RUB', 'EUR', 'JPY'])
+        self.assertEqual(response['X-Missing-Currencies'], 'GBP')
+        self.assertCountEqual(StubCbuHandler.hits, ['USD', 'RUB', 'EUR', 'GBP', 'JPY'])
+
+        # Only the missing currency is asked again
+        StubCbuHandler.hits = []
+        self.assertEqual(self.client.get('/data/exchange-rate/')['X-Missing-Currencies'], 'GBP')
+        self.assertEqual(StubCbuHandler.hits, ['GBP'])
+
+    def test_cache_down(self):
+        shared = type(caches['shared'])
+        with mock.patch.object(shared, 'get_many', side_effect=ConnectionError), \
+                mock.patch.object(shared, 'set', side_effect=ConnectionError):
+            response = self.client.get('/data/exchange-rate/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()), ['USD', 'RUB', 'EUR', 'JPY'])
+
+
+class CurrencyIngestTest(ListingFixtureMixin, TestCase):
+    def rates_file(self, *entries):
+        file = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        self.addCleanup(os.remove, file.name)
+        json.dump([{'code': code, 'price': price, 'date': day} for code, price, day in entries], file)
+        file.close()
+        return file.name
+
+    def backfill(self, path, start, end):
+        call_command('backfill_currency_rates', '--from', start, '--to', end, '--file', path, stdout=io.StringIO())
+
+    def test_backfill_is_idempotent(self):
+        rate_table.invalidate()
+        listing = make_listing(self.user, self.category, self.area, Currency.objects.create(code='EUR', name='Euro'))
+        FinancialData.objects.filter(pk=listing.financial_data_id).update(authorized_capital=1000)
+        path = self.rates_file(('USD', '12500', '2025-01-01'), ('EUR', '13750', '2025-01-01'),
+                               ('USD', '12600', '2025-01-02'), ('EUR', '13860', '2025-01-02'),
+                               ('RUB', '130', '2025-01-02'), ('USD', '1', '2024-12-31'))
+        self.backfill(path, '2025-01-01', '2025-01-02')
+        self.backfill(path, '2025-01-01', '2025-01-02')
+
+        self.assertEqual(CurrencyPrice.objects.count(), 4)
+        self.assertEqual(rate_table.get()['EUR'], Decimal('13860'))
+        listing.refresh_from_db()
+        self.assertEqual(listing.price_usd, Decimal('1100.00'))
+
+        # A corrected rate replaces the stored one
+        self.backfill(self.rates_file(('USD', '12700', '2025-01-02')), '2025-01-02', '2025-01-02')
+        self.assertEqual(CurrencyPrice.objects.get(code='USD', date='2025-01-02').cb_price, Decimal('12700'))
+        self.assertEqual(CurrencyPrice.objects.count(), 4)
+
+
+@override_settings(GEOCODER_REMOTE_FALLBACK=False, GEOCODER_MAX_DISTANCE_KM=100)
+class GeocoderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Area.objects.create(location_uz='Toshkent', location_ru='Ташкент', location_en='Tashkent', lat=41.31, long=69.28)
+        Area.objects.create(location_uz='Samarqand', location_ru='Самарканд', location_en='Samarkand', lat=39.65,
+                            long=66.96)
+        Area.objects.create(location_uz='Nukus', location_ru='Нукус', location_en='Nukus', lat=42.46, long=59.61)
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.geocoder = ReverseGeocoder()
+
+    def test_nearest_area_and_cache(self):
+        self.assertEqual(self.geocoder.reverse(41.2, 69.1), 'Toshkent')
+        self.assertEqual(self.geocoder.reverse(39.7, 67.3), 'Samarqand')
+        self.assertEqual(self.geocoder.reverse(42.0, 60.0), 'Nukus')
+        self.assertIsNone(self.geocoder.reverse(45.0, 75.0))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.geocoder.reverse(41.20001, 69.09999), 'Toshkent')
+
+    def test_boundaries_file(self):
+        square = [[[68.5, 40.5], [70.5, 40.5], [70.5, 42.0], [68.5, 42.0], [68.5, 40.5]],
+                  [[69.0, 41.0], [69.2, 41.0], [69.2, 41.2], [69.0, 41.2], [69.0, 41.0]]]
+        with tempfile.NamedTemporaryFile('w', suffix='.geojson', delete=False) as file:
+            json.dump({'type': 'FeatureCollection', 'features': [{
+                'type': 'Feature', 'properties': {'name': 'Toshkent viloyati'},
+                'geometry': {'type': 'Polygon', 'coordinates': square},
+            }]}, file)
+        self.addCleanup(os.remove, file.name)
+
+        with override_settings(GEOCODER_BOUNDARIES_FILE=file.name):
+            self.assertEqual(self.geocoder.reverse(41.5, 70.0), 'Toshkent viloyati')
+            # Inside the hole and outside the polygon
+            self.assertIsNone(self.geocoder.reverse(41.1, 69.1))
+            self.assertIsNone(self.geocoder.reverse(39.7, 67.3))
+
+    def test_location_view(self):
+        response = APIClient().post('/data/location', {'lat': '41.30', 'long': '69.20'})
+        self.assertEqual(response.json(), 'Toshkent')
+        response = APIClient().post('/data/location', {'lat': '10', 'long': '10'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PHOTO_VARIANTS_BACKGROUND=False, DATA_RESPONSE_CACHE_TIMEOUT=0)
+class PhotoVariantsTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def upload(self, name, content):
+        listing = make_listing(self.user, self.category, self.area, self.currency, photos=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = ObjectPhoto.objects.create(informative_data=listing.informative_data,
+                                               image=SimpleUploadedFile(name, content))
+        photo.refresh_from_db()
+        return photo
+
+    def test_variants_are_generated_on_upload(self):
+        from PIL import Image
+
+        original = io.BytesIO()
+        Image.new('RGBA', (2000, 1500), (200, 30, 30, 128)).save(original, 'PNG')
+        photo = self.upload('big.png', original.getvalue())
+
+        self.assertEqual(set(photo.variants), set(SIZES))
+        for size, formats in photo.variants.items():
+            self.assertEqual(set(formats), {'webp', 'jpeg'})
+            for name in formats.values():
+                with Image.open(photo.image.storage.path(name)) as variant:
+                    self.assertEqual(max(variant.size), SIZES[size][0])
+
+        row = APIClient().get('/data/all-data/').json()[0]
+        self.assertTrue(row['first_photo'].endswith('big_thumb.jpg'))
+        self.assertTrue(row['first_photo_webp'].endswith('big_thumb.webp'))
+
+    def test_regenerating_deletes_the_old_variants(self):
+        from PIL import Image
+
+        original = io.BytesIO()
+        Image.new('RGB', (800, 600)).save(original, 'PNG')
+        photo = self.upload('small.png', original.getvalue())
+        old = [name for formats in photo.variants.values() for name in formats.values()]
+
+        generate(photo)
+        storage = photo.image.storage
+        self.assertFalse(any(storage.exists(name) for name in old))
+        self.assertTrue(all(storage.exists(name) for formats in photo.variants.values() for name in formats.values()))
+
+    def test_file_that_is_not_an_image(self):
+        photo = self.upload('plan.pdf', b'%PDF-1.4')
+        self.assertEqual(photo.variants, {})
+        self.assertTrue(APIClient().get('/data/all-data/').json()[0]['first_photo'].endswith('plan.pdf'))
+
+
+@override_settings(PHOTO_VARIANTS_BACKGROUND=False, UPLOAD_CHUNK_MAX_SIZE=4096)
+class ResumableUploadTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        self.directories = {}
+        for setting in ('MEDIA_ROOT', 'UPLOAD_SESSIONS_DIR'):
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            self.directories[setting] = directory.name
+            self.enterContext(override_settings(**{setting: directory.name}))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.listing = make_listing(self.user, self.category, self.area, self.currency, photos=0)
+
+    def put(self, session_id, content, first, size):
+        return self.client.put(f'/data/uploads/{session_id}', content, content_type='application/octet-stream',
+                               HTTP_CONTENT_RANGE=f'bytes {first}-{first + len(content) - 1}/{size}')
+
+    def test_upload_resumes_and_attaches(self):
+        from PIL import Image
+
+        photo = io.BytesIO()
+        Image.effect_noise((200, 150), 64).save(photo, 'PNG')
+        content = photo.getvalue()
+        self.assertGreater(len(content), 4096)
+
+        response = self.client.post('/data/uploads', {'kind': 'object_photo', 'filename': 'noise.png',
+                                                      'size': len(content)})
+        self.assertEqual(response.status_code, 201, response.content)
+        session_id = response.json()['id']
+
+        self.assertEqual(self.put(session_id, content[:4096], 0, len(content)).json(), {'offset': 4096})
+        # The client lost the answer and sends the first chunk again
+        response = self.put(session_id, content[:4096], 0, len(content))
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 4096))
+        self.assertEqual(self.client.get(f'/data/uploads/{session_id}')['Upload-Offset'], '4096')
+        self.assertEqual(self.put(session_id, content[:10], 4096, len(content) + 1).status_code, 416)
+
+        response = self.client.post(f'/data/uploads/{session_id}/complete',
+                                    {'informative_data': self.listing.informative_data_id})
+        self.assertEqual(response.status_code, 409)
+
+        for first in range(4096, len(content), 4096):
+            self.put(session_id, content[first:first + 4096], first, len(content))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/data/uploads/{session_id}/complete',
+                                        {'informative_data': self.listing.informative_data_id})
+        self.assertEqual(response.status_code, 201, response.content)
+        attached = ObjectPhoto.objects.get(pk=response.json()['id'])
+        self.assertEqual(attached.image.read(), content)
+        self.assertIn('thumb', attached.variants)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(self.directories['UPLOAD_SESSIONS_DIR']), [])
+
+    def test_chunk_and_owner_limits(self):
+        response = self.client.post('/data/uploads', {'kind': 'video', 'filename': 'a.mp4', 'size': 10000})
+        session_id = response.json()['id']
+        self.assertEqual(self.put(session_id, b'x' * 5000, 0, 10000).status_code, 413)
+
+        other = User.objects.create_user(email='other@example.com', password='secret', tin='987654321')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.put(session_id, b'x' * 100, 0, 10000).status_code, 404)
+
+        response = self.client.post('/data/uploads', {'kind': 'video', 'filename': 'empty.mp4', 'size': 0})
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunk_being_written_is_not_written_twice(self):
+        response = self.client.post('/data/uploads', {'kind': 'video', 'filename': 'a.mp4', 'size': 200})
+        session_id = response.json()['id']
+        UploadSession.objects.filter(pk=session_id).update(writing_since=timezone.now())
+        response = self.put(session_id, b'x' * 100, 0, 200)
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 0))
+
+        # A claim left behind by a dead worker runs out
+        UploadSession.objects.filter(pk=session_id).update(writing_since=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.put(session_id, b'x' * 100, 0, 200).json(), {'offset': 100})
+        self.assertIsNone(UploadSession.objects.get(pk=session_id).writing_since)
+
+
+def png(name='photo.png'):
+    from PIL import Image
+
+    content = io.BytesIO()
+    Image.new('RGB', (40, 30), (10, 120, 60)).save(content, 'PNG')
+    return SimpleUploadedFile(name, content.getvalue(), content_type='image/png')
+
+
+@override_settings(PHOTO_VARIANTS_BACKGROUND=False, DATA_RESPONSE_CACHE_TIMEOUT=0)
+class PhotoDiffUpdateTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        User.objects.filter(pk=self.user.pk).update(is_physic=False)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+
+    def photo_names(self, listing):
+        return dict(ObjectPhoto.objects.filter(informative_data=listing.informative_data).values_list('id', 'image'))
+
+    def test_informative_data_keeps_photos_sent_back(self):
+        listing = make_listing(self.user, self.category, self.area, self.currency, status=Status.DRAFT, photos=3)
+        before = self.photo_names(listing)
+        kept = min(before)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/data/informative-data-create', {
+                'product_info': 'Mebel', 'keep_object_photo': [kept], 'object_photo': [png()],
+            }, format='multipart')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        after = self.photo_names(listing)
+        self.assertEqual(len(after), 2)
+        self.assertEqual(after[kept], before[kept])
+        added = ObjectPhoto.objects.get(pk=max(after))
+        self.assertIn('thumb', added.variants)
+
+        # Rasmlar yuborilmasa, ular o'zgarmaydi
+        response = self.client.put('/data/informative-data-create', {'product_info': 'Oyna'}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.photo_names(listing), after)
+
+    def test_all_data_update_deletes_only_removed_photos(self):
+        listing = make_listing(self.user, self.category, self.area, self.currency, status=Status.CHECKING, photos=3)
+        kept = sorted(self.photo_names(listing))[:2]
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.put(f'/data/mydata-checking/{listing.pk}/',
+                                       {'object_photos': [{'id': pk} for pk in kept]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(sorted(self.photo_names(listing)), kept)
+        deletes = [query['sql'] for query in context.captured_queries
+                   if query['sql'].startswith('DELETE FROM "data_objectphoto"')]
+        self.assertEqual(len(deletes), 1)
+
+
+class DraftProvisioningTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+
+    def test_drafts_in_one_insert_per_table(self):
+        users = [User.objects.create_user(email=f'user{index}@example.com', password='secret', tin=f'50000000{index}')
+                 for index in range(3)]
+        provision_drafts(users[:1])
+        # The default currency now comes from the cache
+        with self.assertNumQueries(6):  # savepoint, 4 inserts, release
+            drafts = provision_drafts(users[1:])
+
+        self.assertEqual([draft.user for draft in drafts], users[1:])
+        for draft in AllData.objects.filter(user__in=users).select_related('main_data', 'financial_data'):
+            self.assertEqual(draft.status, Status.DRAFT)
+            self.assertEqual(draft.main_data.geo_cell, geo.grid_cell(0, 0))
+            self.assertEqual(draft.financial_data.currency, self.currency)
+
+    def test_submit_replaces_the_draft(self):
+        User.objects.filter(pk=self.user.pk).update(is_physic=False)
+        listing = make_listing(self.user, self.category, self.area, self.currency, status=Status.DRAFT, photos=0)
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.user.pk))
+
+        response = client.put('/data/financial-data-create-api', {
+            'export_share': '1', 'authorized_capital': '1000', 'estimated_value': '1', 'investment_or_loan_amount': '1',
+            'investment_direction': 'Sanoat', 'major_shareholders': 'Davlat', 'currency': self.currency.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        listing.refresh_from_db()
+        self.assertEqual(listing.status, Status.CHECKING)
+        self.assertEqual(AllData.objects.filter(user=self.user, status=Status.DRAFT).count(), 1)
+
+
+class ExportTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        self.make_listings(3, photos=0)
+        self.make_listings(2, status=Status.CHECKING, photos=0)
+        admin = User.objects.create_user(email='admin@example.com', password='secret', tin='111111111')
+        User.objects.filter(pk=admin.pk).update(is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=admin.pk))
+
+    def test_csv_streams_selected_columns(self):
+        response = self.client.get('/data/export/listings', {'status': 'Approved', 'columns': 'id,enterprise_name,area'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], 'id,enterprise_name,area')
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].endswith(',Enterprise,Toshkent'))
+
+        self.assertEqual(self.client.get('/data/export/listings', {'columns': 'password'}).status_code, 400)
+        self.assertEqual(APIClient().get('/data/export/listings').status_code, 401)
+
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get('/data/export/listings', {'file_format': 'xlsx', 'date_from': timezone.localdate()})
+        self.assertEqual(response.status_code, 200)
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True).active
+        rows = list(sheet.values)
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0][:3], ('id', 'status', 'date_created'))
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'investors.csv')
+            call_command('export_data', 'investors', output=path, stderr=io.StringIO())
+            with open(path, encoding='utf-8-sig') as file:
+                self.assertEqual(file.read().splitlines()[0].split(',')[:2], ['id', 'status'])
+
+
+class ListingImportTest(ListingFixtureMixin, TestCase):
+    CSV = (
+        'enterprise_name,category,area,currency,lat,long,authorized_capital,product_info,status\n'
+        'Toshkent Mebel,Промышленность,tashkent,usd,41.3,69.2,5000,Mebel,\n'
+        'Xato,Industry,Toshkent,USD,shimol,69.2,1,,\n'
+        'Noma\'lum,Qishloq xo\'jaligi,Toshkent,USD,41,69,1,,Checking\n'
+        'Tekshiruvda,Sanoat,Toshkent,USD,40,68,1,,Checking\n'
+    )
+
+    def test_valid_rows_are_created_and_invalid_reported(self):
+        reports = []
+        report = import_listings(read_rows(io.BytesIO(self.CSV.encode()), 'catalogue.csv'), self.user,
+                                 batch_size=2, progress=reports.append)
+
+        self.assertEqual((report.created, report.approved), (2, 1))
+        self.assertEqual([line for line, _ in report.errors], [3, 4])
+        self.assertIn('lat', report.errors[0][1])
+        self.assertIn('category', report.errors[1][1])
+        self.assertEqual(len(reports), 2)
+
+        listing = AllData.objects.select_related('main_data', 'informative_data', 'financial_data').get(
+            main_data__enterprise_name='Toshkent Mebel')
+        self.assertEqual(listing.status, Status.APPROVED)
+        self.assertEqual(listing.main_data.category, self.category)
+        self.assertEqual(listing.main_data.location, self.area)
+        self.assertEqual(listing.main_data.geo_cell, geo.grid_cell(Decimal('41.3'), Decimal('69.2')))
+        self.assertEqual(listing.financial_data.authorized_capital, 5000)
+        self.assertEqual(listing.informative_data.product_info, 'Mebel')
+        self.assertEqual(AllData.objects.get(main_data__enterprise_name='Tekshiruvda').status, Status.CHECKING)
+
+    def test_failed_batch_is_not_written(self):
+        with mock.patch('data.imports.refresh_price_usd', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            import_listings(read_rows(io.BytesIO(self.CSV.encode()), 'catalogue.csv'), self.user)
+        self.assertFalse(AllData.objects.exists())
+        self.assertFalse(MainData.objects.exists())
+
+    def test_dry_run_and_admin_view(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='secret', tin='111111111')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile('catalogue.csv', self.CSV.encode(), content_type='text/csv')
+        response = self.client.post('/admin/data/alldata/import/', {'file': upload, 'status': 'Approved',
+                                                                    'dry_run': 'on'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['report'].valid, 2)
+        self.assertEqual(len(response.context['errors']), 2)
+        self.assertFalse(AllData.objects.exists())
+
+
+@override_settings(PHOTO_VARIANTS_BACKGROUND=False, DATA_RESPONSE_CACHE_TIMEOUT=0)
+class AdminTest(ListingFixtureMixin, TestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='secret', tin='111111111')
+        self.client.force_login(admin)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.make_listings(2, photos=0)
+        for url in ('/admin/data/alldata/', '/admin/data/maindata/', '/admin/data/financialdata/'):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.make_listings(3, photos=0)
+            with self.assertNumQueries(len(queries)):
+                self.client.get(url)
+
+    def test_bulk_approve_and_reject(self):
+        ids = [listing.pk for listing in self.make_listings(3, photos=0, status=Status.CHECKING)]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/admin/data/alldataready/', {'action': 'approve',
+                                                                      '_selected_action': ids[:2]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(sorted(AllData.objects.filter(status=Status.APPROVED).values_list('pk', flat=True)), ids[:2])
+        self.assertEqual(MapCluster.objects.get(zoom=0).count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/data/alldata/', {'action': 'reject', '_selected_action': ids})
+        self.assertEqual(AllData.objects.filter(status=Status.REJECTED).count(), 3)
+        self.assertFalse(MapCluster.objects.exists())
+
+    def test_set_status_twice_moves_points_once(self):
+        ids = [listing.pk for listing in self.make_listings(2, photos=0, status=Status.CHECKING)]
+        queryset = AllData.objects.filter(pk__in=ids)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(set_status(queryset, Status.APPROVED), 2)
+            self.assertEqual(set_status(queryset, Status.APPROVED), 0)
+        self.assertEqual(MapCluster.objects.get(zoom=0).count, 2)
+
+
+@override_settings(PHOTO_VARIANTS_BACKGROUND=False, DATA_RESPONSE_CACHE_TIMEOUT=0)
+class QueryBudgetTest(QueryBudgetMixin, ListingFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.make_listings(5)
+
+    def test_public_urls(self):
+        for url, budget in [('/data/all-data/', 2), ('/data/all-data-filter-list', 2), ('/data/top-all-data', 1),
+                            ('/data/view-count-all-data', 2), ('/data/category-list', 1), ('/data/area-list', 1),
+                            ('/data/currency-list', 1), ('/data/faqs', 1), ('/data/intro/', 1)]:
+            with self.subTest(url):
+                self.assertQueryBudget(url, budget)
+
+    def test_owner_urls(self):
+        self.client.force_authenticate(self.user)
+        for url, budget in [('/data/mydata-approved/', 2), ('/data/card-list/', 2), ('/data/smart-note-list', 1),
+                            ('/data/investor-info-own', 1)]:
+            with self.subTest(url):
+                self.assertQueryBudget(url, budget)
+
+    def test_stats_headers_and_duplicates(self):
+        with self.assertLogs('utils.sql') as logs:
+            response = self.client.get('/data/all-data/', HTTP_X_QUERY_STATS='1')
+        self.assertEqual(json.loads(logs.records[0].getMessage())['queries'], 2)
+        self.assertEqual(response['X-Query-Count'], '2')
+        self.assertEqual(response['X-Query-Duplicates'], '0')
+        with override_settings(SQL_INSTRUMENTATION_HEADER=False):
+            self.assertNotIn('X-Query-Count', self.client.get('/data/all-data/', HTTP_X_QUERY_STATS='1'))
+
+        admin = User.objects.create_superuser(email='admin@example.com', password='secret', tin='111111111')
+        self.client.force_authenticate(admin)
+        with self.assertLogs('utils.sql') as logs, CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/data/export/listings', HTTP_X_QUERY_STATS='1')
+            self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 6)
+            response.close()
+        self.assertEqual(connection.execute_wrappers, [])
+        # The rows are read while the body is streamed; the headers could only count what came before
+        self.assertNotIn('X-Query-Count', response)
+        self.assertEqual(json.loads(logs.records[0].getMessage())['queries'], len(queries))
+        self.assertIn('ORDER BY', logs.records[0].getMessage())
+
+        with record_queries() as stats:
+            for listing in AllData.objects.all():
+                listing.main_data.enterprise_name
+        self.assertEqual(stats.count, 6)
+        self.assertEqual(stats.duplicates()[0][1], 5)
@@ -0,0 +1,166 @@
+import os
+import re
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    UploadSession, Image, Video, ObjectPhoto, ProductPhoto, CadastralPhoto, SmartNote, InformativeData,
+)
+
+# Where a finished upload goes: the model to create, its file field, and the parent it is attached to
+Target = namedtuple('Target', ('model', 'file_field', 'parent_field', 'parent_model', 'image'))
+
+TARGETS = {
+    UploadSession.Kind.IMAGE: Target(Image, 'image', 'smart_note', SmartNote, True),
+    UploadSession.Kind.VIDEO: Target(Video, 'video', 'smart_note', SmartNote, False),
+    UploadSession.Kind.OBJECT_PHOTO: Target(ObjectPhoto, 'image', 'informative_data', InformativeData, True),
+    UploadSession.Kind.PRODUCT_PHOTO: Target(ProductPhoto, 'image', 'informative_data', InformativeData, True),
+    UploadSession.Kind.CADASTRAL_PHOTO: Target(CadastralPhoto, 'image', 'informative_data', InformativeData, False),
+}
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+# Bytes copied from the request to the file at a time
+BUFFER_SIZE = 64 * 1024
+# A chunk claimed this long ago is taken to be abandoned, e.g. by a worker that died while writing it
+WRITE_CLAIM_TIMEOUT = timedelta(minutes=30)
+
+
+class UploadError(Exception):
+    """`status` is the HTTP status the views answer with; `offset` is set when the client has to resume from it."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def part_path(session):
+    return os.path.join(settings.UPLOAD_SESSIONS_DIR, f'{session.pk}.part')
+
+
+def start(user, kind, filename, size):
+    if size <= 0:
+        raise UploadError('Fayl hajmi musbat bo\'lishi kerak')
+    if size > settings.UPLOAD_SESSION_MAX_SIZE:
+        raise UploadError(f'Fayl hajmi {settings.UPLOAD_SESSION_MAX_SIZE} baytdan oshmasligi kerak', status=413)
+    session = UploadSession.objects.create(user=user, kind=kind, filename=os.path.basename(filename), size=size)
+    os.makedirs(settings.UPLOAD_SESSIONS_DIR, exist_ok=True)
+    open(part_path(session), 'wb').close()
+    return session
+
+
+def parse_content_range(header, session):
+    """(first, last) byte positions of a `Content-Range: bytes first-last/size` header."""
+    match = CONTENT_RANGE.match(header or '')
+    if match is None:
+        raise UploadError('Content-Range sarlavhasi "bytes first-last/size" ko\'rinishida bo\'lishi kerak')
+    first, last, size = map(int, match.groups())
+    if size != session.size or first > last or last >= size:
+        raise UploadError('Content-Range fayl hajmiga mos kelmaydi', status=416)
+    if last - first + 1 > settings.UPLOAD_CHUNK_MAX_SIZE:
+        raise UploadError(f'Bo\'lak hajmi {settings.UPLOAD_CHUNK_MAX_SIZE} baytdan oshmasligi kerak', status=413)
+    return first, last
+
+
+def write_chunk(session_id, user, content_range, stream):
+    """
+    Appends the chunk `stream` carries to the upload and returns the new offset.
+
+    The chunk has to start at the current offset: a client that lost track of it gets a 409 with the offset
+    to resume from. Whatever arrives before a dropped connection is kept, so a retry only sends the rest.
+    The chunk is copied to disk BUFFER_SIZE bytes at a time, never held in memory as a whole.
+
+    A slow client may take minutes to send a chunk, so no transaction or row lock is held meanwhile: the
+    chunk is claimed with one conditional UPDATE, and the new offset is written with another at the end.
+    """
+    session = UploadSession.objects.filter(pk=session_id, user=user).first()
+    if session is None:
+        raise UploadError('Yuklash topilmadi', status=404)
+    first, last = parse_content_range(content_range, session)
+
+    claimed_at = timezone.now()
+    claimed = UploadSession.objects.filter(pk=session.pk, offset=first).filter(
+        Q(writing_since__isnull=True) | Q(writing_since__lt=claimed_at - WRITE_CLAIM_TIMEOUT),
+    ).update(writing_since=claimed_at, updated_at=claimed_at)
+    if not claimed:
+        state = UploadSession.objects.filter(pk=session.pk).values_list('offset', 'writing_since').first()
+        if state is None:
+            raise UploadError('Yuklash topilmadi', status=404)
+        if state[0] != first:
+            raise UploadError('Bo\'lak joriy offsetdan boshlanishi kerak', status=409, offset=state[0])
+        raise UploadError('Bu yuklashga boshqa bo\'lak yozilmoqda', status=409, offset=state[0])
+
+    remaining = last - first + 1
+    try:
+        with open(part_path(session), 'r+b') as file:
+            file.seek(first)
+            while remaining:
+                data = stream.read(min(BUFFER_SIZE, remaining)) if stream is not None else b''
+                if not data:
+                    break
+                file.write(data)
+                remaining -= len(data)
+    finally:
+        # Also after an error, so that the upload is not left claimed and what was written is kept
+        offset = last + 1 - remaining
+        UploadSession.objects.filter(pk=session.pk, writing_since=claimed_at).update(
+            offset=offset, writing_since=None, updated_at=timezone.now())
+    return offset
+
+
+def complete(session_id, user, parent_id):
+    """Creates the Image, Video or photo of the finished upload under its parent and removes the upload."""
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().filter(pk=session_id, user=user).first()
+        if session is None:
+            raise UploadError('Yuklash topilmadi', status=404)
+        if session.offset != session.size:
+            raise UploadError('Fayl to\'liq yuklanmagan', status=409, offset=session.offset)
+
+        target = TARGETS[session.kind]
+        parent = target.parent_model.objects.filter(pk=parent_id, user=user).first()
+        if parent is None:
+            raise UploadError(f'{target.parent_field} topilmadi', status=404)
+
+        path = part_path(session)
+        if target.image:
+            from PIL import Image as PillowImage, UnidentifiedImageError
+            try:
+                with PillowImage.open(path) as image:
+                    image.verify()
+            except (UnidentifiedImageError, OSError):
+                raise UploadError('Fayl rasm emas')
+
+        attached = target.model(**{target.parent_field: parent})
+        with open(path, 'rb') as file:
+            # The storage copies the file in chunks as well
+            getattr(attached, target.file_field).save(session.filename, File(file), save=False)
+        attached.save()
+        session.delete()
+        transaction.on_commit(lambda: os.remove(path))
+    return attached
+
+
+def discard(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def expire():
+    """Removes the uploads nobody has written to for UPLOAD_SESSION_TTL seconds, with their files."""
+    stale = UploadSession.objects.filter(
+        updated_at__lt=timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL))
+    removed = 0
+    for session in stale.iterator():
+        discard(session)
+        removed += 1
+    return removed
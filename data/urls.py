@@ -14,6 +14,8 @@ from .views import (
     CategoryRetrieveView, AreaAPIDeatilView, AreaMainAPIListView, IntroView, PhoneView, UsageProcedureView, OfferView,
     UserCheckingDataViewSet, UserApprovedDataViewSet, UserRejectedDataViewSet, ViewCountAllDataView, TopAllDataView,
     DevicesView, DevicesCreateView, ExchangeRatesView, SearchData, CardListAPIView, toggle_card, AllDataMapFilterView,
+    MapClusterView, AutocompleteView, CategoryAllDataListView, UploadSessionCreateView, UploadSessionView,
+    UploadSessionCompleteView, ExportView,
 )
 
 router = DefaultRouter()
@@ -46,6 +48,7 @@ urlpatterns = [
     path('category-list-api', CategoryApiListView.as_view()),
 
     path('category-list-api/<int:pk>/', CategoryRetrieveView.as_view()),
+    path('category-list-api/<int:pk>/alldata/', CategoryAllDataListView.as_view()),
     # tushunmadim
     path('alldata-cat-list-api', AllDataCatListAPIView.as_view()),
 
@@ -62,6 +65,8 @@ urlpatterns = [
     path('all-data-filter', AllDataMapFilterView.as_view()),
     path('all-data-filter-list', AllDataFilterView.as_view()),
     path('all-data-by-lat-long-distance-filter', AllDataFilterByLatLongDistanceView.as_view()),
+    path('map-clusters', MapClusterView.as_view()),
+    path('autocomplete', AutocompleteView.as_view()),
 
     path('smart-note-delete/<pk>', SmartNoteDestroyView.as_view()),
     path('smart-note-update/<pk>', SmartNoteUpdateView.as_view()),
@@ -87,6 +92,12 @@ urlpatterns = [
     path('cards/create/<int:all_data_id>/', toggle_card, name='card-create'),
     path('card-list/', CardListAPIView.as_view(), name='card-list'),
 
+    path('uploads', UploadSessionCreateView.as_view()),
+    path('uploads/<uuid:pk>', UploadSessionView.as_view()),
+    path('uploads/<uuid:pk>/complete', UploadSessionCompleteView.as_view()),
+
+    path('export/<str:name>', ExportView.as_view()),
+
 ]
 
 urlpatterns += router.urls
@@ -0,0 +1,65 @@
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.db import transaction
+from django.views.decorators.http import condition
+
+# Reference data groups; the signals bump a group whenever one of its models is saved or deleted
+CATEGORY = 'category'
+AREA = 'area'
+CURRENCY = 'currency'
+INTRO = 'intro'
+FAQ = 'faq'
+ABOUT = 'about'
+# Approved listings, and listings of any status; see data.response_cache
+LISTINGS = 'listings'
+ALL_LISTINGS = 'all-listings'
+KEY = 'reference-version:{}'
+
+
+def get(group):
+    """(tag, modified timestamp) of the current version of `group`, or None without the shared cache."""
+    cache = caches['shared']
+    try:
+        version = cache.get(KEY.format(group))
+        if version is None:
+            cache.add(KEY.format(group), (uuid4().hex, int(time.time())), None)
+            version = cache.get(KEY.format(group))
+        return version
+    except Exception:
+        return None
+
+
+def bump(group):
+    cache = caches['shared']
+    try:
+        old = cache.get(KEY.format(group))
+        # Last-Modified has whole seconds: two versions must not share one
+        modified = int(time.time()) if old is None else max(int(time.time()), old[1] + 1)
+        cache.set(KEY.format(group), (uuid4().hex, modified), None)
+    except Exception:
+        pass
+
+
+def bump_on_commit(group):
+    # After the commit, so that nobody can read the old data under the new version
+    transaction.on_commit(lambda: bump(group))
+
+
+def conditional(group):
+    """
+    View decorator answering If-None-Match / If-Modified-Since from the version of `group` alone,
+    so a client that is up to date gets a 304 without a database query.
+    """
+
+    def etag(request, *args, **kwargs):
+        version = get(group)
+        return None if version is None else f'{group}-{version[0]}'
+
+    def last_modified(request, *args, **kwargs):
+        version = get(group)
+        return None if version is None else datetime.fromtimestamp(version[1], tz=timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
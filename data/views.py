@@ -1,26 +1,31 @@
-from django.http import Http404
+from datetime import date
+
+from django.http import Http404, StreamingHttpResponse, FileResponse
 from django.utils.timezone import now
 from rest_framework import generics, status, permissions, views, mixins, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from django.db.models import Q, Case, When, Value, F, DecimalField, Subquery
+from django.db import transaction
+from django.db.models import Q, Value, F, Prefetch, Count, Window, Avg
+from django.db.models.functions import RowNumber
 from django.utils.decorators import method_decorator
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from uuid import uuid4
 from rest_framework.views import APIView
-import requests
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from twisted.spread.jelly import class_atom
+import math
 
 from .permissions import (
     IsLegal,
 )
 from .models import (
     Status, MainData, InformativeData, FinancialData, ObjectPhoto, AllData,
-    InvestorInfo, Category, Area, SmartNote, CurrencyPrice, Currency, Faq, CadastralPhoto, AboutDocument, Intro,
-    Devices, Card,
+    InvestorInfo, Category, Area, SmartNote, Currency, Faq, CadastralPhoto, AboutDocument, Intro,
+    Devices, Card, Image, Video, ProductPhoto, UploadSession,
 )
 
 from .serializers import (
@@ -29,14 +34,30 @@ from .serializers import (
     InvestorInfoSerializer, InvestorInfoGetSerializer, InvestorInfoGetMinimumSerializer,
     AllDataListSerializer, AllDataAllUsersListSerializer, CategorySerializer,
     LocationSerializer, ApproveRejectInvestorSerializer, InvestorInfoOwnSerializer,
-    AllDataFilterSerializer, AreaSerializer, SmartNoteCreateSerializer, SmartNoteListRetrieveSerializer,
+    AllDataFilterSerializer, AllDataDistanceSerializer, AreaSerializer, SmartNoteCreateSerializer, SmartNoteListRetrieveSerializer,
     SmartNoteUpdateSerializer, CurrencySerializer, CustomIdSerializer, FaqSerializer, InformativeProDataSerializer,
     MainDataAPISerializer, AlldateCategorySerializer,
-    CategoryApiProSerializer, AreaAPIDetailSerializer, PhoneSerializer, UsageProcedureSerializer,
+    CategoryApiProSerializer, CategoryPreviewSerializer, AreaAPIDetailSerializer, AreaMainListSerializer, PhoneSerializer, UsageProcedureSerializer,
     OfferSerializer, IntroSerializer, DevicesSerializer, AllDataUpdateSerializer, CardSerializer,
+    UploadSessionSerializer, ImageSerializer, VideoSerializer, ProductPhotoSerializer, CadastraInfoSerializer,
 
 )
 
+from .pagination import KeysetPagination, AlwaysKeysetPagination, InvestorInfoKeysetPagination
+from . import geo
+from .clusters import MAX_CLUSTER_ZOOM, clusters_in_bbox, fitting_zoom, points_in_bbox
+from .counters import record_view
+from . import leaderboards
+from .search import MAX_RESULTS, search
+from . import versions
+from . import exchange
+from .geocoder import geocoder
+from .response_cache import AnonymousResponseCacheMixin
+from . import autocomplete
+from . import uploads
+from . import exports
+from .drafts import provision_draft
+
 from utils.logs import log
 
 
@@ -130,37 +151,22 @@ class FinancialDataAPIView(generics.RetrieveUpdateAPIView):
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         if serializer.is_valid():
             print("Validated data:", serializer.validated_data)
-            serializer.save()
-            all_data = AllData.objects.filter(
-                Q(user=self.request.user) &
-                Q(status=Status.DRAFT) &
-                Q(main_data__is_validated=True) &
-                Q(informative_data__is_validated=True) &
-                Q(financial_data__is_validated=True)
-            )
-            if all_data.exists():
-                all_data = all_data.first()
-                all_data.status = Status.CHECKING  # VAXTINCHALIK OZGARTRIB TUSHILGAN SINOV UCHUN
-                all_data.save()
-
-                main_data = MainData.objects.create(
-                    user=self.request.user,
-                )
-                informative_data = InformativeData.objects.create(
-                    user=self.request.user,
-                )
-
-                financial_data = FinancialData.objects.create(
-                    user=self.request.user,
-                    currency=Currency.objects.first()
-
-                )
-                AllData.objects.create(
-                    main_data=main_data,
-                    informative_data=informative_data,
-                    financial_data=financial_data,
-                    user=self.request.user
-                )
+            # Topshirish va yangi qoralama yaratish bitta tranzaksiyada: yarim qolgan qoralama bo'lmaydi
+            with transaction.atomic():
+                serializer.save()
+                # Qulflanadi: bir vaqtda kelgan ikki so'rov ikkita qoralama yaratmasligi uchun
+                all_data = AllData.objects.select_for_update(of=('self',)).filter(
+                    Q(user=self.request.user) &
+                    Q(status=Status.DRAFT) &
+                    Q(main_data__is_validated=True) &
+                    Q(informative_data__is_validated=True) &
+                    Q(financial_data__is_validated=True)
+                ).first()
+                if all_data is not None:
+                    all_data.status = Status.CHECKING  # VAXTINCHALIK OZGARTRIB TUSHILGAN SINOV UCHUN
+                    all_data.save()
+                    provision_draft(self.request.user)
+            if all_data is not None:
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             else:
                 return Response({'error': 'Not all data validated'}, status=status.HTTP_400_BAD_REQUEST)
@@ -168,23 +174,90 @@ class FinancialDataAPIView(generics.RetrieveUpdateAPIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@method_decorator(name='get', decorator=versions.conditional(versions.CATEGORY))
 class CategoryListView(generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = (permissions.AllowAny,)
 
 
+@method_decorator(name='get', decorator=versions.conditional(versions.AREA))
 class AreaListView(generics.ListAPIView):
     queryset = Area.objects.all()
     serializer_class = AreaSerializer
     permission_classes = (permissions.AllowAny,)
 
 
+MAX_CATEGORY_PREVIEW = 20
+
+
+def attach_category_alldata(categories, preview=None):
+    """
+    Approved listings of all `categories` in one query, newest first, as `category.approved_alldata`.
+    With `preview` only the first `preview` listings of each category are fetched.
+    """
+    all_data = AllData.objects.filter(status=Status.APPROVED, main_data__category__in=categories)
+    if preview is not None:
+        all_data = all_data.annotate(category_rank=Window(
+            RowNumber(), partition_by=F('main_data__category_id'), order_by=[F('date_created').desc(), F('id').desc()],
+        )).filter(category_rank__lte=preview)
+    by_category = {category.pk: [] for category in categories}
+    for row in all_data.order_by('-date_created', '-id').for_list():
+        by_category[row.main_data.category_id].append(row)
+    for category in categories:
+        category.approved_alldata = by_category[category.pk]
+    return categories
+
+
+category_preview = openapi.Parameter(
+    'preview', openapi.IN_QUERY,
+    description=f"Return listing counts and only the newest N listings of every category (N <= {MAX_CATEGORY_PREVIEW}). "
+                "The full list of a category is at category-list-api/<id>/alldata/. Example: preview=5",
+    type=openapi.TYPE_INTEGER
+)
+
+
+@method_decorator(name='get', decorator=swagger_auto_schema(manual_parameters=[
+    category_preview
+]))
 class CategoryApiListView(generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategoryApiProSerializer
     permission_classes = (permissions.AllowAny,)
 
+    def get_preview(self):
+        try:
+            return min(max(1, int(self.request.query_params['preview'])), MAX_CATEGORY_PREVIEW)
+        except (KeyError, ValueError):
+            return None
+
+    def get_serializer_class(self):
+        if self.get_preview() is not None:
+            return CategoryPreviewSerializer
+        return CategoryApiProSerializer
+
+    def get_queryset(self):
+        if self.get_preview() is not None:
+            return Category.objects.annotate(
+                alldata_count=Count('main_data__all_data', filter=Q(main_data__all_data__status=Status.APPROVED)))
+        return Category.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        # Kategoriyalar soni qancha bo'lishidan qat'iy nazar 3 ta so'rov
+        categories = attach_category_alldata(list(self.get_queryset()), self.get_preview())
+        serializer = self.get_serializer(categories, many=True)
+        return Response(serializer.data)
+
+
+class CategoryAllDataListView(generics.ListAPIView):
+    """Bitta kategoriyaning tasdiqlangan obyektlari, sahifalab"""
+    serializer_class = AlldateCategorySerializer
+    permission_classes = (permissions.AllowAny,)
+    pagination_class = AlwaysKeysetPagination
+
+    def get_queryset(self):
+        return AllData.objects.filter(main_data__category_id=self.kwargs['pk'], status=Status.APPROVED).for_list()
+
 
 class CategoryRetrieveView(generics.RetrieveAPIView):
     queryset = Category.objects.all()
@@ -197,21 +270,25 @@ class CategoryRetrieveView(generics.RetrieveAPIView):
     #     return Response(serializer.data)
 
 
-class AllDataCatListAPIView(generics.ListAPIView):
-    queryset = AllData.objects.all()
+class AllDataCatListAPIView(AnonymousResponseCacheMixin, generics.ListAPIView):
+    response_cache_group = versions.ALL_LISTINGS
+    queryset = AllData.objects.for_list()
     serializer_class = AlldateCategorySerializer
     permission_classes = (permissions.AllowAny,)
+    pagination_class = KeysetPagination
 
 
+@method_decorator(name='get', decorator=versions.conditional(versions.CURRENCY))
 class CurrencyListView(generics.ListAPIView):
     queryset = Currency.objects.all()
     serializer_class = CurrencySerializer
     permission_classes = (permissions.AllowAny,)
 
 
-class AllDataViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.RetrieveModelMixin):
+class AllDataViewSet(AnonymousResponseCacheMixin, viewsets.GenericViewSet, mixins.ListModelMixin, mixins.RetrieveModelMixin):
     queryset = AllData.objects.filter(status=Status.APPROVED)
     permission_classes = (permissions.AllowAny,)
+    pagination_class = KeysetPagination
 
     # serializer_class = AllDataSerializer
 
@@ -220,13 +297,18 @@ class AllDataViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.Retr
             return AllDataListSerializer
         return AllDataSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            return queryset.for_list()
+        return queryset
+
     def retrieve(self, request, *args, **kwargs):
         # Ma'lum bir objectni olish
         instance = self.get_object()
 
-        # Bu yerda `+1` qo'shish
-        instance.view_count += 1  # `view_count` bu sizning modelda bor bo'lishi kerak
-        instance.save()  # O'zgartirishni saqlash
+        # Ko'rishlar Redis'da yig'iladi va cron orqali bazaga yoziladi (data.counters.flush_views)
+        record_view(instance.pk)
 
         # Serializer orqali ma'lumotni qaytarish
         serializer = self.get_serializer(instance, context={'request': request})
@@ -244,7 +326,10 @@ class AllDataUserViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.
     }
 
     def get_queryset(self):
-        return AllData.objects.filter(~Q(status=Status.DRAFT) & Q(user=self.request.user))
+        queryset = AllData.objects.filter(~Q(status=Status.DRAFT) & Q(user=self.request.user))
+        if self.action == 'list':
+            return queryset.for_list()
+        return queryset
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, self.default_serializer_class)
@@ -253,6 +338,7 @@ class AllDataUserViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.
 class AllDataAllUsersViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.RetrieveModelMixin):
     queryset = AllData.objects.all()
     permission_classes = (IsLegal,)
+    pagination_class = KeysetPagination
     # serializer_class = AllDataListSerializer
     default_serializer_class = AllDataSerializer
     serializer_classes = {
@@ -261,14 +347,18 @@ class AllDataAllUsersViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mix
     }
 
     def get_queryset(self):
-        return AllData.objects.filter(Q(status=Status.APPROVED))
+        queryset = AllData.objects.filter(Q(status=Status.APPROVED))
+        if self.action == 'list':
+            return queryset.for_list()
+        return queryset
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, self.default_serializer_class)
 
 
-class CustomAlldataAllUsersListView(generics.ListAPIView):
-    queryset = AllData.objects.filter(Q(status=Status.APPROVED))
+class CustomAlldataAllUsersListView(AnonymousResponseCacheMixin, generics.ListAPIView):
+    # Rasm va nomlar bilan birga: qatorlar sonidan qat'iy nazar 2 ta so'rov
+    queryset = AllData.objects.for_list().filter(Q(status=Status.APPROVED))
     serializer_class = AllDataAllUsersListSerializer
     permission_classes = (permissions.AllowAny,)
 
@@ -346,6 +436,7 @@ user_id = openapi.Parameter(
 class AllObjectInvestorsViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.RetrieveModelMixin):
     queryset = InvestorInfo.objects.all()
     permission_classes = (IsLegal,)
+    pagination_class = InvestorInfoKeysetPagination
     # serializer_class = InvestorInfoGetSerializer
     default_serializer_class = InvestorInfoGetSerializer
     serializer_classes = {
@@ -367,12 +458,10 @@ class AllObjectInvestorsViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
 
 
 class ObjectIdAndCoordinatesViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
-    queryset = AllData.objects.filter(status=Status.APPROVED)
+    queryset = AllData.objects.filter(status=Status.APPROVED).select_related('main_data')
     permission_classes = (permissions.AllowAny,)
     serializer_class = ObjectIdAndCoordinatesSerializer
-
-
-from geopy.geocoders import Nominatim
+    pagination_class = KeysetPagination
 
 
 # Tushunarli location malumotlari
@@ -384,9 +473,11 @@ class LocationView(generics.CreateAPIView):
     def create(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
-            geolocator = Nominatim(user_agent="E-Investment")
-            location = geolocator.reverse(f"{serializer.validated_data['lat']}, {serializer.validated_data['long']}")
-            return Response(location.address)
+            # Avval mahalliy hududlar bo'yicha (data.geocoder), topilmasa Nominatim
+            address = geocoder.reverse(serializer.validated_data['lat'], serializer.validated_data['long'])
+            if address is None:
+                return Response({'error': 'Location not found'}, status=status.HTTP_404_NOT_FOUND)
+            return Response(address)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -462,39 +553,20 @@ class AllDataMapFilterView(generics.ListAPIView):
         startprice = data.get('startprice', None)
         endprice = data.get('endprice', None)
 
+        # `price_usd` kurslar yangilanganda oldindan hisoblanadi (data.pricing)
         if startprice and endprice:
-            queryset &= Q(new_price_dollar__gte=int(startprice), new_price_dollar__lte=int(endprice))
+            queryset &= Q(price_usd__gte=int(startprice), price_usd__lte=int(endprice))
         elif startprice:  # faqat startprice bo'lsa
-            queryset &= Q(new_price_dollar__gte=int(startprice))
-
-        datas = AllData.objects.annotate(
-            latest_gbp_price=Subquery(CurrencyPrice.objects.filter(code='GBP').order_by('-date').values('cb_price')[:1],
-                                      output_field=DecimalField(max_digits=18, decimal_places=2)),
-            latest_eur_price=Subquery(CurrencyPrice.objects.filter(code='EUR').order_by('-date').values('cb_price')[:1],
-                                      output_field=DecimalField(max_digits=18, decimal_places=2)),
-            latest_usd_price=Subquery(CurrencyPrice.objects.filter(code='USD').order_by('-date').values('cb_price')[:1],
-                                      output_field=DecimalField(max_digits=18, decimal_places=2)),
-        ).annotate(
-            new_price_dollar=Case(
-                When(financial_data__currency__code='GBP',
-                     then=F('financial_data__authorized_capital') * F('latest_gbp_price') / F('latest_usd_price')),
-                When(financial_data__currency__code='EUR',
-                     then=F('financial_data__authorized_capital') * F('latest_eur_price') / F('latest_usd_price')),
-                When(financial_data__currency__code='UZS',
-                     then=F('financial_data__authorized_capital') / F('latest_usd_price')),
-                When(financial_data__currency__code='USD',
-                     then=F('financial_data__authorized_capital') * F('latest_usd_price') / F('latest_usd_price')),
-                default=F('financial_data__authorized_capital'),
-                output_field=DecimalField(max_digits=18, decimal_places=2)
-            )
-        ).filter(queryset)
+            queryset &= Q(price_usd__gte=int(startprice))
+
+        datas = AllData.objects.filter(queryset).select_related('main_data')
         return datas
 
 
 @method_decorator(name='get', decorator=swagger_auto_schema(manual_parameters=[
     categories,
 ]))
-class AllDataFilterView(generics.ListAPIView):
+class AllDataFilterView(AnonymousResponseCacheMixin, generics.ListAPIView):
     serializer_class = AllDataListSerializer
     permission_classes = (permissions.AllowAny,)
 
@@ -517,38 +589,55 @@ class AllDataFilterView(generics.ListAPIView):
         startprice = data.get('startprice', None)
         endprice = data.get('endprice', None)
 
+        # `price_usd` kurslar yangilanganda oldindan hisoblanadi (data.pricing)
         if startprice and endprice:
-            queryset &= Q(new_price_dollar__gte=int(startprice), new_price_dollar__lte=int(endprice))
+            queryset &= Q(price_usd__gte=int(startprice), price_usd__lte=int(endprice))
         elif startprice:  # faqat startprice bo'lsa
-            queryset &= Q(new_price_dollar__gte=int(startprice))
-
-        datas = AllData.objects.annotate(
-            latest_gbp_price=Subquery(CurrencyPrice.objects.filter(code='GBP').order_by('-date').values('cb_price')[:1],
-                                      output_field=DecimalField(max_digits=18, decimal_places=2)),
-            latest_eur_price=Subquery(CurrencyPrice.objects.filter(code='EUR').order_by('-date').values('cb_price')[:1],
-                                      output_field=DecimalField(max_digits=18, decimal_places=2)),
-            latest_usd_price=Subquery(CurrencyPrice.objects.filter(code='USD').order_by('-date').values('cb_price')[:1],
-                                      output_field=DecimalField(max_digits=18, decimal_places=2)),
-        ).annotate(
-            new_price_dollar=Case(
-                When(financial_data__currency__code='GBP',
-                     then=F('financial_data__authorized_capital') * F('latest_gbp_price') / F('latest_usd_price')),
-                When(financial_data__currency__code='EUR',
-                     then=F('financial_data__authorized_capital') * F('latest_eur_price') / F('latest_usd_price')),
-                When(financial_data__currency__code='UZS',
-                     then=F('financial_data__authorized_capital') / F('latest_usd_price')),
-                When(financial_data__currency__code='USD',
-                     then=F('financial_data__authorized_capital') * F('latest_usd_price') / F('latest_usd_price')),
-                default=F('financial_data__authorized_capital'),
-                output_field=DecimalField(max_digits=18, decimal_places=2)
-            )
-        ).filter(queryset)
+            queryset &= Q(price_usd__gte=int(startprice))
+
+        datas = AllData.objects.filter(queryset).for_list()
         return datas
 
 
-# tastiqdan otgan
+bbox = openapi.Parameter(
+    'bbox', openapi.IN_QUERY, required=True,
+    description="Visible map area: min_lat,min_long,max_lat,max_long; min_long > max_long crosses the antimeridian. "
+                "Example: bbox=37.1,55.9,45.6,73.2",
+    type=openapi.TYPE_STRING
+)
+zoom = openapi.Parameter(
+    'zoom', openapi.IN_QUERY, required=True,
+    description=f"Map zoom level. From zoom {MAX_CLUSTER_ZOOM} individual objects are returned instead of clusters. "
+                f"The response has the zoom actually used, lower for an area too large for the requested one",
+    type=openapi.TYPE_INTEGER
+)
 
-import math
+
+@method_decorator(name='get', decorator=swagger_auto_schema(manual_parameters=[
+    bbox, zoom
+]))
+class MapClusterView(APIView):
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            min_lat, min_long, max_lat, max_long = geo.parse_bbox(request.query_params['bbox'])
+            zoom = max(0, int(request.query_params['zoom']))
+        except (KeyError, ValueError):
+            return Response({'error': 'bbox=min_lat,min_long,max_lat,max_long and zoom are required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if zoom >= MAX_CLUSTER_ZOOM:
+            points = points_in_bbox(min_lat, min_long, max_lat, max_long)
+            if points is not None:
+                return Response({'zoom': zoom, 'clusters': [], 'points': points})
+        # A bbox too large for its zoom gets the clusters of a lower one, so the response stays small
+        zoom = fitting_zoom(min_lat, min_long, max_lat, max_long, zoom)
+        return Response({'zoom': zoom, 'clusters': clusters_in_bbox(min_lat, min_long, max_lat, max_long, zoom),
+                         'points': []})
+
+
+# tastiqdan otgan
 
 lat_long = openapi.Parameter(
     'lat_long', openapi.IN_QUERY,
@@ -560,41 +649,49 @@ distance_km = openapi.Parameter(
     description="Filter objects by radius in km from latitude and longitude. Example: distance=10. Default distance 50 km",
     type=openapi.TYPE_STRING
 )
+MAX_NEAREST_K = 100
+nearest_k = openapi.Parameter(
+    'k', openapi.IN_QUERY,
+    description=f"Return only the k nearest objects, 1 to {MAX_NEAREST_K}. Without `distance` the whole map is "
+                f"searched. Example: k=5",
+    type=openapi.TYPE_INTEGER
+)
 
 
 # tastiqdan otgan
 
 @method_decorator(name='get', decorator=swagger_auto_schema(manual_parameters=[
-    lat_long, distance_km
+    lat_long, distance_km, nearest_k
 ]))
 class AllDataFilterByLatLongDistanceView(generics.ListAPIView):
-    serializer_class = AllDataFilterSerializer
+    serializer_class = AllDataDistanceSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
         data = self.request.GET.dict()
-        queryset = Q(status=Status.APPROVED)
+        queryset = AllData.objects.filter(status=Status.APPROVED)
 
         distance = 50.0
-        earth_radius = 6371.0
+        # Yer sharining qarama-qarshi nuqtasigacha bo'lgan masofa
+        max_distance = math.pi * geo.EARTH_RADIUS_KM
         if 'distance' in data:
-            distance = float(data['distance']) if distance <= earth_radius else earth_radius
+            distance = min(float(data['distance']), max_distance)
 
         if 'lat_long' in data:
             lat_long_list = data['lat_long'].split(',')
             if len(lat_long_list) == 2:
                 lat = float(lat_long_list[0])
                 long = float(lat_long_list[1])
-                max_lat = lat + math.degrees(distance / earth_radius)
-                min_lat = lat - math.degrees(distance / earth_radius)
-                max_long = long + math.degrees(math.asin(distance / earth_radius) / math.cos(math.radians(lat)))
-                min_long = long - math.degrees(math.asin(distance / earth_radius) / math.cos(math.radians(lat)))
-                # log(f'min_lat: {min_lat} max_lat: {max_lat} min_long: {min_long} max_long: {max_long}')
-                queryset &= Q(main_data__lat__gte=min_lat)
-                queryset &= Q(main_data__lat__lte=max_lat)
-                queryset &= Q(main_data__long__gte=min_long)
-                queryset &= Q(main_data__long__lte=max_long)
-                return AllData.objects.filter(queryset)
+                # Natijalar yaqinidan uzog'iga qarab tartiblanadi
+                if 'k' in data:
+                    try:
+                        k = int(data['k'])
+                    except ValueError:
+                        k = 0
+                    if not 1 <= k <= MAX_NEAREST_K:
+                        raise ValidationError({'k': f'1 dan {MAX_NEAREST_K} gacha butun son bo\'lishi kerak'})
+                    return geo.nearest(queryset, lat, long, k, distance if 'distance' in data else max_distance)
+                return geo.within_radius(queryset, lat, long, distance)
             else:
                 return []
         return []
@@ -777,6 +874,7 @@ class SmartNoteUpdateView(generics.CreateAPIView):
         serializer.save()  # Serializer orqali yangilash
 
 
+@method_decorator(name='get', decorator=versions.conditional(versions.FAQ))
 class FaqRetriveView(generics.ListAPIView):
     queryset = Faq.objects.all()
     serializer_class = FaqSerializer
@@ -801,12 +899,52 @@ class AreaAPIDeatilView(generics.RetrieveAPIView):
     permission_classes = (permissions.AllowAny,)
 
 
+area_bbox = openapi.Parameter(
+    'bbox', openapi.IN_QUERY,
+    description="Only listings inside min_lat,min_long,max_lat,max_long, and only the areas that have some. "
+                "Example: bbox=37.1,55.9,45.6,73.2",
+    type=openapi.TYPE_STRING
+)
+
+
+@method_decorator(name='get', decorator=swagger_auto_schema(manual_parameters=[
+    area_bbox
+]))
 class AreaMainAPIListView(generics.ListAPIView):
     queryset = Area.objects.all()
-    serializer_class = AreaAPIDetailSerializer
+    serializer_class = AreaMainListSerializer
     permission_classes = (permissions.AllowAny,)
 
-
+    def list(self, request, *args, **kwargs):
+        # Faqat tasdiqlangan obyektlar; hududlar soni qancha bo'lishidan qat'iy nazar 2 ta so'rov
+        listings = {'all_data__status': Status.APPROVED}
+        if 'bbox' in request.query_params:
+            try:
+                min_lat, min_long, max_lat, max_long = geo.parse_bbox(request.query_params['bbox'])
+            except ValueError:
+                return Response({'error': 'bbox=min_lat,min_long,max_lat,max_long'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            listings.update(lat__range=(min_lat, max_lat), long__range=(min_long, max_long))
+
+        main_data = {}
+        for row in MainData.objects.filter(location__isnull=False, **listings).values('id', 'lat', 'long', 'location'):
+            main_data.setdefault(row['location'], []).append(row)
+
+        in_area = Q(**{f'main_data__{lookup}': value for lookup, value in listings.items()})
+        areas = Area.objects.annotate(
+            approved_count=Count('main_data', filter=in_area),
+            centroid_lat=Avg('main_data__lat', filter=in_area),
+            centroid_long=Avg('main_data__long', filter=in_area),
+        ).order_by('id')
+        if 'bbox' in request.query_params:
+            areas = areas.filter(pk__in=list(main_data))
+        areas = list(areas)
+        for area in areas:
+            area.approved_main_data = main_data.get(area.pk, [])
+        return Response(self.get_serializer(areas, many=True).data)
+
+
+@method_decorator(name='get', decorator=versions.conditional(versions.ABOUT))
 class PhoneView(APIView):
     def get(self, request, *args, **kwargs):
         try:
@@ -818,6 +956,7 @@ class PhoneView(APIView):
             return Response({"detail": "No objects available."}, status=status.HTTP_404_NOT_FOUND)
 
 
+@method_decorator(name='get', decorator=versions.conditional(versions.ABOUT))
 class UsageProcedureView(APIView):
     def get(self, request, *args, **kwargs):
         try:
@@ -829,6 +968,7 @@ class UsageProcedureView(APIView):
             return Response({"detail": "No objects available."}, status=status.HTTP_404_NOT_FOUND)
 
 
+@method_decorator(name='get', decorator=versions.conditional(versions.ABOUT))
 class OfferView(APIView):
     def get(self, request, *args, **kwargs):
         try:
@@ -840,6 +980,7 @@ class OfferView(APIView):
             return Response({"detail": "No objects available."}, status=status.HTTP_404_NOT_FOUND)
 
 
+@method_decorator(name='get', decorator=versions.conditional(versions.INTRO))
 class IntroView(APIView):
     def get(self, request, *args, **kwargs):
         try:
@@ -866,7 +1007,10 @@ class UserCheckingDataViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mi
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
-        return AllData.objects.filter(user=self.request.user, status=Status.CHECKING).order_by('-date_created')
+        queryset = AllData.objects.filter(user=self.request.user, status=Status.CHECKING).order_by('-date_created')
+        if self.action == 'list':
+            return queryset.for_list()
+        return queryset
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, self.default_serializer_class)
@@ -894,7 +1038,10 @@ class UserApprovedDataViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mi
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
-        return AllData.objects.filter(user=self.request.user, status=Status.APPROVED).order_by('-date_created')
+        queryset = AllData.objects.filter(user=self.request.user, status=Status.APPROVED).order_by('-date_created')
+        if self.action == 'list':
+            return queryset.for_list()
+        return queryset
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, self.default_serializer_class)
@@ -910,7 +1057,10 @@ class UserRejectedDataViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mi
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
-        return AllData.objects.filter(user=self.request.user, status=Status.REJECTED).order_by('-date_created')
+        queryset = AllData.objects.filter(user=self.request.user, status=Status.REJECTED).order_by('-date_created')
+        if self.action == 'list':
+            return queryset.for_list()
+        return queryset
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, self.default_serializer_class)
@@ -920,16 +1070,17 @@ class ViewCountAllDataView(generics.ListAPIView):
     queryset = AllData.objects.all()
     serializer_class = AlldateCategorySerializer
 
-    def get_queryset(self):
-        return AllData.objects.filter(status=Status.APPROVED).order_by('-view_count')[:6]
+    def list(self, request, *args, **kwargs):
+        # Oldindan hisoblangan ro'yxat (data.leaderboards), bazaga murojaat qilinmaydi
+        return Response(leaderboards.get('most-viewed', request))
 
 
 class TopAllDataView(generics.ListAPIView):
     queryset = AllData.objects.all()
     serializer_class = AlldateCategorySerializer
 
-    def get_queryset(self):
-        return AllData.objects.filter(top=True, status=Status.APPROVED)[:6]
+    def list(self, request, *args, **kwargs):
+        return Response(leaderboards.get('top', request))
 
 
 class DevicesView(generics.ListAPIView):
@@ -972,29 +1123,51 @@ class DevicesCreateView(generics.CreateAPIView):
 
 class ExchangeRatesView(APIView):
     def get(self, request):
-        currencies = ["USD", "RUB", "EUR", "GBP", "JPY"]  # Kerakli valyutalar
-        base_url = "https://cbu.uz/uz/arkhiv-kursov-valyut/json/"
+        # Kurslar umumiy keshdan olinadi, yetishmaganlari cbu.uz'dan parallel so'raladi (data.exchange)
+        exchange_rates, missing = exchange.get_rates()
+        if not exchange_rates:
+            return Response({"error": "cbu.uz API'dan kurslarni olib bo‘lmadi"}, status=status.HTTP_502_BAD_GATEWAY)
 
-        exchange_rates = {}  # Natijani saqlash uchun dictionary
+        response = Response(exchange_rates)
+        if missing:
+            # Ba'zi valyutalar olinmadi: qolganlari qaytariladi
+            response['X-Missing-Currencies'] = ','.join(missing)
+        return response
 
-        try:
-            for currency in currencies:
-                response = requests.get(f"{base_url}{currency}/")
-                response.raise_for_status()  # Xatoliklarni tekshirish
-                data = response.json()
 
-                if data:
-                    exchange_rates[currency] = data[0]  # Valyuta ma'lumotlarini saqlash
+# 14-02-2025 Search
 
-            return Response(exchange_rates)  # Hammasini qaytarish
+autocomplete_q = openapi.Parameter(
+    'q', openapi.IN_QUERY, required=True,
+    description="Beginning of an enterprise name or category, any word of it. Example: q=tosh",
+    type=openapi.TYPE_STRING
+)
+autocomplete_limit = openapi.Parameter(
+    'limit', openapi.IN_QUERY,
+    description=f"Number of suggestions, {autocomplete.DEFAULT_LIMIT} by default and {autocomplete.MAX_LIMIT} at most",
+    type=openapi.TYPE_INTEGER
+)
 
-        except requests.exceptions.RequestException as e:
-            return Response({"error": f"API so‘rovida xatolik: {str(e)}"}, status=500)
 
-        return Response({"error": "Ma'lumot topilmadi"}, status=404)
+@method_decorator(name='get', decorator=swagger_auto_schema(manual_parameters=[
+    autocomplete_q, autocomplete_limit
+]))
+class AutocompleteView(APIView):
+    """Qidiruv maydoni uchun yengil takliflar: faqat id va nom (data.autocomplete)"""
+    permission_classes = (permissions.AllowAny,)
 
+    def get(self, request, *args, **kwargs):
+        prefix = request.query_params.get('q', '')
+        try:
+            limit = min(max(1, int(request.query_params.get('limit', autocomplete.DEFAULT_LIMIT))),
+                        autocomplete.MAX_LIMIT)
+        except ValueError:
+            limit = autocomplete.DEFAULT_LIMIT
+        try:
+            return Response(autocomplete.suggest(prefix, limit))
+        except autocomplete.redis.RedisError:
+            return Response(autocomplete.suggest_from_database(prefix, limit))
 
-# 14-02-2025 Search
 
 class SearchData(generics.ListAPIView):
     queryset = AllData.objects.all()
@@ -1005,8 +1178,8 @@ class SearchData(generics.ListAPIView):
     def get_queryset(self):
         search_query = self.request.query_params.get("search", '').strip()
         if search_query:
-            return AllData.objects.filter(main_data__enterprise_name__icontains=search_query,
-                                          status=Status.APPROVED).order_by('-date_created')
+            # To'liq matnli qidiruv (data.search), eng mos natijalar birinchi
+            return search(AllData.objects.filter(status=Status.APPROVED).for_list(), search_query)[:MAX_RESULTS]
         return AllData.objects.none()
 
 
@@ -1034,4 +1207,138 @@ class CardListAPIView(generics.ListAPIView):
 
     def get_queryset(self):
         """Foydalanuvchining qo‘shgan `Card` obyektlarini chiqarish"""
-        return Card.objects.filter(user=self.request.user).order_by('-created_at')
+        return Card.objects.filter(user=self.request.user).select_related(
+            'all_data__main_data__category', 'all_data__main_data__location', 'all_data__informative_data',
+        ).prefetch_related(
+            Prefetch('all_data__informative_data__object_foto', queryset=ObjectPhoto.objects.order_by('id')),
+        ).order_by('-created_at')
+
+
+# Bo'laklab, uzilgan joyidan davom ettirib yuklash (data.uploads)
+
+UPLOADED_SERIALIZERS = {
+    Image: ImageSerializer,
+    Video: VideoSerializer,
+    ObjectPhoto: ObjectPhotoSerializer,
+    ProductPhoto: ProductPhotoSerializer,
+    CadastralPhoto: CadastraInfoSerializer,
+}
+
+
+def upload_error_response(error):
+    data = {'error': str(error)}
+    response = Response(data, status=error.status)
+    if error.offset is not None:
+        data['offset'] = error.offset
+        response['Upload-Offset'] = error.offset
+    return response
+
+
+class UploadSessionCreateView(generics.CreateAPIView):
+    """
+    Starts a resumable upload of a SmartNote image or video or a listing photo. The file is then sent
+    with PUT uploads/<id> in chunks of at most `chunk_size` bytes, each with a
+    `Content-Range: bytes first-last/size` header, and attached with POST uploads/<id>/complete.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            session = uploads.start(request.user, **serializer.validated_data)
+        except uploads.UploadError as error:
+            return upload_error_response(error)
+        return Response(self.get_serializer(session).data, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionView(APIView):
+    """GET: how much of the file has arrived. PUT: the next chunk, as the raw request body. DELETE: cancel."""
+    permission_classes = (IsAuthenticated,)
+    # The chunk is streamed to disk by data.uploads, never parsed into memory
+    parser_classes = ()
+
+    def get(self, request, pk):
+        session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+        return Response(UploadSessionSerializer(session).data, headers={'Upload-Offset': session.offset})
+
+    def put(self, request, pk):
+        try:
+            offset = uploads.write_chunk(pk, request.user, request.META.get('HTTP_CONTENT_RANGE'), request.stream)
+        except uploads.UploadError as error:
+            return upload_error_response(error)
+        return Response({'offset': offset}, headers={'Upload-Offset': offset})
+
+    def delete(self, request, pk):
+        session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+        uploads.discard(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionCompleteView(APIView):
+    """Attaches the finished file to the SmartNote (`smart_note`) or InformativeData (`informative_data`) given."""
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, pk):
+        session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+        parent_id = request.data.get(uploads.TARGETS[session.kind].parent_field)
+        try:
+            attached = uploads.complete(pk, request.user, parent_id)
+        except uploads.UploadError as error:
+            return upload_error_response(error)
+        serializer = UPLOADED_SERIALIZERS[type(attached)](attached, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+# Tahlilchilar uchun eksport (data.exports)
+
+def comma_separated(value):
+    return [item for item in (value or '').split(',') if item]
+
+
+export_parameters = [
+    openapi.Parameter('file_format', openapi.IN_QUERY, description="csv (default) or xlsx", type=openapi.TYPE_STRING),
+    openapi.Parameter('columns', openapi.IN_QUERY, description="Comma separated columns, all by default",
+                      type=openapi.TYPE_STRING),
+    openapi.Parameter('status', openapi.IN_QUERY, description="Comma separated statuses, e.g. Approved,Checking",
+                      type=openapi.TYPE_STRING),
+    openapi.Parameter('date_from', openapi.IN_QUERY, description="Created on or after, YYYY-MM-DD",
+                      type=openapi.TYPE_STRING),
+    openapi.Parameter('date_to', openapi.IN_QUERY, description="Created on or before, YYYY-MM-DD",
+                      type=openapi.TYPE_STRING),
+]
+
+
+@method_decorator(name='get', decorator=swagger_auto_schema(manual_parameters=export_parameters))
+class ExportView(APIView):
+    """
+    The listings (`listings`) or the investor applications (`investors`) as a file, for admins.
+    The rows are read from the database in chunks and written to the response as they arrive.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, name):
+        params = request.query_params
+        file_format = params.get('file_format', 'csv')
+        if file_format not in exports.FORMATS:
+            return Response({'error': f"file_format must be one of {', '.join(exports.FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            date_from = date.fromisoformat(params['date_from']) if params.get('date_from') else None
+            date_to = date.fromisoformat(params['date_to']) if params.get('date_to') else None
+        except ValueError:
+            return Response({'error': 'Dates must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            header, values = exports.rows(name, comma_separated(params.get('columns')),
+                                          comma_separated(params.get('status')), date_from, date_to)
+        except exports.ExportError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        filename = f'{name}-{now():%Y%m%d-%H%M}.{file_format}'
+        if file_format == 'xlsx':
+            return FileResponse(exports.xlsx_file(header, values), as_attachment=True, filename=filename,
+                                content_type=exports.CONTENT_TYPES['xlsx'])
+        response = StreamingHttpResponse(exports.csv_lines(header, values), content_type=exports.CONTENT_TYPES['csv'])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
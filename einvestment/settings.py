@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'phonenumber_field',
@@ -67,6 +68,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that the session and authentication queries are counted too
+    'utils.middleware.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -113,11 +116,19 @@ CHANNEL_LAYERS = {
     },
 }
 
+REDIS_URL = config('REDIS_URL', default='redis://redis:6379')
+
 SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'  # Sessiyalarni cache yoki database-da saqlash
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    # Barcha worker'lar uchun umumiy cache (kurslar versiyasi va h.k.)
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'{REDIS_URL}/1',
+        'KEY_PREFIX': 'einvestment',
+    },
 }
 
 CORS_ORIGIN_ALLOW_ALL = False
@@ -134,6 +145,8 @@ CORS_ORIGIN_WHITELIST = [
     'https://e-investment.uz',
     'http://e-investment.uz',
 ]
+# So that browser clients can read what utils.middleware.QueryStatsMiddleware reports
+CORS_EXPOSE_HEADERS = ['X-Query-Count', 'X-Query-Time-Ms', 'X-Query-Duplicates', 'Server-Timing']
 CSRF_TRUSTED_ORIGINS = [
     'https://api.e-investment.uz',
     'https://165.227.132.247',
@@ -161,8 +174,10 @@ DATABASES = {
     }
 }
 
-FILE_UPLOAD_MAX_MEMORY_SIZE = 209715200  # 200 MB (baytlarda)
-DATA_UPLOAD_MAX_MEMORY_SIZE = 209715200  # 200 MB
+# Larger files are streamed to a temporary file instead of being held in memory; big videos and photos
+# should use the resumable uploads below
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5 MB (baytlarda)
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10 MB, fayllarsiz so'rov tanasi
 
 MESSAGE_TAGS = {
     'error': 'danger',  # Xato xabarlari uchun bootstrap xatolari
@@ -252,6 +267,53 @@ REST_FRAMEWORK = {
     )
 }
 
+# Listing endpoints paginate only when the client sends `cursor` or `page_size`.
+# Set to False once all clients understand the paginated response.
+DATA_LEGACY_UNPAGINATED_LISTS = config('DATA_LEGACY_UNPAGINATED_LISTS', default=True, cast=bool)
+# Source of the stored currency rates (data.currency_feeds): 'nbu', 'cbu' or a dotted path to a feed class
+CURRENCY_FEED = config('CURRENCY_FEED', default='nbu')
+# LocationView reverse geocoding (data.geocoder): a GeoJSON file of named boundaries, or else the nearest Area
+# within GEOCODER_MAX_DISTANCE_KM; Nominatim is only asked about points neither of them resolves
+GEOCODER_BOUNDARIES_FILE = config('GEOCODER_BOUNDARIES_FILE', default='') or None
+GEOCODER_MAX_DISTANCE_KM = config('GEOCODER_MAX_DISTANCE_KM', default=100, cast=float)
+GEOCODER_REMOTE_FALLBACK = config('GEOCODER_REMOTE_FALLBACK', default=True, cast=bool)
+GEOCODER_REMOTE_TIMEOUT = config('GEOCODER_REMOTE_TIMEOUT', default=3, cast=float)
+GEOCODER_CACHE_SIZE = config('GEOCODER_CACHE_SIZE', default=10000, cast=int)
+# Central bank rates of ExchangeRatesView (data.exchange): fresh for CBU_RATES_TTL seconds,
+# then served while being refreshed until CBU_RATES_STALE_TTL
+CBU_RATES_URL = config('CBU_RATES_URL', default='https://cbu.uz/uz/arkhiv-kursov-valyut/json/')
+CBU_RATES_TIMEOUT = config('CBU_RATES_TIMEOUT', default=3, cast=float)
+CBU_RATES_TTL = config('CBU_RATES_TTL', default=600, cast=int)
+CBU_RATES_STALE_TTL = config('CBU_RATES_STALE_TTL', default=2 * 24 * 3600, cast=int)
+# Thumbnail and medium WebP/JPEG variants of the listing photos (data.image_variants), generated after upload
+# by PHOTO_VARIANTS_WORKERS threads; with PHOTO_VARIANTS_BACKGROUND off they are generated before the response
+PHOTO_VARIANTS_BACKGROUND = config('PHOTO_VARIANTS_BACKGROUND', default=True, cast=bool)
+PHOTO_VARIANTS_WORKERS = config('PHOTO_VARIANTS_WORKERS', default=2, cast=int)
+# Resumable chunked uploads (data.uploads): partial files live in UPLOAD_SESSIONS_DIR until attached,
+# uploads idle for UPLOAD_SESSION_TTL seconds are removed by the cron
+UPLOAD_SESSIONS_DIR = config('UPLOAD_SESSIONS_DIR', default=f'{BASE_DIR}/uploads')
+UPLOAD_SESSION_MAX_SIZE = config('UPLOAD_SESSION_MAX_SIZE', default=200 * 1024 * 1024, cast=int)
+UPLOAD_CHUNK_MAX_SIZE = config('UPLOAD_CHUNK_MAX_SIZE', default=8 * 1024 * 1024, cast=int)
+UPLOAD_SESSION_TTL = config('UPLOAD_SESSION_TTL', default=24 * 3600, cast=int)
+# Anonymous listing responses in the shared cache (data.response_cache); changes invalidate them earlier
+DATA_RESPONSE_CACHE_TIMEOUT = config('DATA_RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+# Per-request SQL counts, time, repeated and slowest statements (utils.middleware): for every request, or
+# only for those sending `X-Query-Stats: 1` while SQL_INSTRUMENTATION_HEADER is on
+SQL_INSTRUMENTATION = config('SQL_INSTRUMENTATION', default=False, cast=bool)
+SQL_INSTRUMENTATION_HEADER = config('SQL_INSTRUMENTATION_HEADER', default=DEBUG, cast=bool)
+SQL_INSTRUMENTATION_WARN_QUERIES = config('SQL_INSTRUMENTATION_WARN_QUERIES', default=50, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'utils.sql': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 AUTHENTICATION_BACKENDS = (
     'social_core.backends.google.GoogleOAuth2',
     'drf_social_oauth2.backends.DjangoOAuth2',
@@ -293,5 +355,10 @@ SIMPLE_JWT = {
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 CRONJOBS = [
-    ('0 10 * * *', 'data.cron.my_scheduled_currency')
+    ('0 10 * * *', 'data.cron.my_scheduled_currency'),
+    ('30 3 * * *', 'data.cron.rebuild_map_clusters'),
+    ('* * * * *', 'data.cron.flush_view_counts'),
+    ('*/10 * * * *', 'data.cron.refresh_leaderboards'),
+    ('45 3 * * *', 'data.cron.rebuild_autocomplete'),
+    ('15 * * * *', 'data.cron.expire_upload_sessions'),
 ]
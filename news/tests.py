@@ -1,3 +1,16 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from utils.testing import QueryBudgetMixin
+from .models import News
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_news_urls(self):
+        news = [News.objects.create(title_uz=f'Yangilik {index}', body_uz='Matn') for index in range(5)]
+        for url, budget in [('/news/news/', 1), (f'/news/news/{news[0].pk}/', 1)]:
+            with self.subTest(url):
+                self.assertQueryBudget(url, budget)
@@ -0,0 +1,43 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Below this many rows an exact COUNT(*) is cheap enough
+ESTIMATE_THRESHOLD = 100_000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for the admin changelists of large tables. An unfiltered list is counted from PostgreSQL's
+    statistics (pg_class.reltuples, kept up to date by autovacuum) instead of a COUNT(*) over the whole
+    table. Filtered lists, small tables and other databases are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = self.estimated_count()
+        if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+            return estimate
+        return super().count
+
+    def estimated_count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is None or query.where or query.distinct or query.combinator:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)',
+                           [connection.ops.quote_name(queryset.model._meta.db_table)])
+            row = cursor.fetchone()
+        # -1 until the table is analyzed for the first time
+        return row[0] if row is not None and row[0] >= 0 else None
+
+
+class LargeTableAdminMixin:
+    """Changelist settings of a ModelAdmin over a table too large to count on every page."""
+    paginator = EstimatedCountPaginator
+    # "x of y selected" needs a second COUNT(*) of the whole table
+    show_full_result_count = False
@@ -0,0 +1,86 @@
+import json
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+
+from .sql import record_queries
+
+logger = logging.getLogger('utils.sql')
+
+
+class RecordedStream:
+    """The streaming content of a response, calling `on_close` once the server closes the response."""
+
+    def __init__(self, content, on_close):
+        self.content = iter(content)
+        self.on_close = on_close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.content)
+
+    def close(self):
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+
+class QueryStatsMiddleware:
+    """
+    Records the SQL of a request when SQL_INSTRUMENTATION is on, or when the client sends `X-Query-Stats: 1`
+    and SQL_INSTRUMENTATION_HEADER allows it. The count and time go to the response headers; they and the
+    repeated and slowest statements go to the `utils.sql` log as one JSON line, a warning past
+    SQL_INSTRUMENTATION_WARN_QUERIES queries.
+
+    A streaming response (the exports) runs most of its queries while the body is sent, after the headers:
+    it is recorded until the response is closed and only logged, without the headers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def enabled(self, request):
+        return settings.SQL_INSTRUMENTATION or (
+            settings.SQL_INSTRUMENTATION_HEADER and request.headers.get('X-Query-Stats') == '1')
+
+    def __call__(self, request):
+        if not self.enabled(request):
+            return self.get_response(request)
+
+        recording = ExitStack()
+        stats = recording.enter_context(record_queries())
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            recording.close()
+            raise
+
+        if response.streaming and not getattr(response, 'is_async', False):
+            def finish():
+                recording.close()
+                self.log(request, response, stats.summary())
+
+            response.streaming_content = RecordedStream(response.streaming_content, finish)
+            return response
+
+        recording.close()
+        summary = stats.summary()
+        response['X-Query-Count'] = summary['queries']
+        response['X-Query-Time-Ms'] = summary['time_ms']
+        # Queries that repeat an earlier statement with other values
+        response['X-Query-Duplicates'] = sum(duplicate['count'] - 1 for duplicate in summary['duplicates'])
+        response['Server-Timing'] = f'db;dur={summary["time_ms"]};desc="{summary["queries"]} queries"'
+        self.log(request, response, summary)
+        return response
+
+    def log(self, request, response, summary):
+        level = logging.WARNING if summary['queries'] > settings.SQL_INSTRUMENTATION_WARN_QUERIES else logging.INFO
+        logger.log(level, json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **summary,
+        }, ensure_ascii=False))
@@ -0,0 +1,68 @@
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+# String and number literals, then lists of placeholders; what is left is the shape of the statement
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r'\(\?(?:, ?\?)*\)')
+
+
+def fingerprint(sql):
+    """`sql` without its values, so that the same statement run for different rows has the same fingerprint."""
+    sql = LITERALS.sub('?', sql.replace('%s', '?'))
+    return PLACEHOLDER_LISTS.sub('(...)', ' '.join(sql.split()))
+
+
+class QueryStats:
+    """
+    The statements run while recording (record_queries), with their durations. Installed as a
+    connection.execute_wrapper, so it sees every query of the thread without DEBUG.
+    """
+
+    def __init__(self):
+        # (sql, seconds)
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self):
+        """(fingerprint, times run) of the statements run more than once, most repeated first: N+1 suspects."""
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return [(sql, times) for sql, times in counts.most_common() if times > 1]
+
+    def slowest(self, limit=5):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:limit]
+
+    def summary(self, slowest=5):
+        return {
+            'queries': self.count,
+            'time_ms': round(self.total_time * 1000, 2),
+            'duplicates': [{'sql': sql, 'count': times} for sql, times in self.duplicates()],
+            'slowest': [{'sql': sql, 'time_ms': round(duration * 1000, 2)} for sql, duration in self.slowest(slowest)],
+        }
+
+
+@contextmanager
+def record_queries(using=None):
+    """Records the queries run on the database `using` (all of them by default) inside the block."""
+    stats = QueryStats()
+    with ExitStack() as stack:
+        for connection in [connections[using]] if using else connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        yield stats
@@ -0,0 +1,16 @@
+from .sql import record_queries
+
+
+class QueryBudgetMixin:
+    """For TestCases: a URL must not run more queries than its budget, whatever the data behind it."""
+
+    def assertQueryBudget(self, url, budget, method='get', data=None, client=None, status=200, **extra):
+        client = client or self.client
+        with record_queries() as stats:
+            response = getattr(client, method)(url, data, **extra)
+        self.assertEqual(response.status_code, status, getattr(response, 'content', b'')[:500])
+        if stats.count > budget:
+            repeated = ''.join(f'\n  {times}x {sql}' for sql, times in stats.duplicates())
+            self.fail(f'{method.upper()} {url} ran {stats.count} queries, over its budget of {budget}.'
+                      f'{" Repeated:" + repeated if repeated else ""}')
+        return response